@@ -0,0 +1,186 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from .settings import settings
+
+# Методы, которые не меняют данные
+_READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Вес нового замера в скользящем среднем времени обработки
+_EWMA_ALPHA = 0.2
+
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Класс маршрута для admission control; None — запрос не ограничивается."""
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if path.startswith("/api/admin/"):
+        return "admin"
+    if path.startswith("/api/prompts") or path.startswith("/api/bundle"):
+        if method in _READ_METHODS:
+            return "read"
+        # Рендер и отметки использования — чтения по сути (без записи в prompts)
+        if method == "POST" and (path.endswith("/render") or path.endswith("/usage")):
+            return "read"
+        return "write"
+    return None
+
+
+class ClassLimiter:
+    """
+    Ограничитель параллельных запросов одного класса: не больше limit одновременно,
+    не больше queue_size ожидающих, ожидание не дольше timeout. Работает в одном event loop.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.max_queued = 0
+        self.avg_service_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Занять слот; False — запрос нужно отклонить (очередь полна или истёк срок ожидания)."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.shed_queue_full += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        try:
+            await asyncio.wait([waiter], timeout=self.timeout)
+        except asyncio.CancelledError:
+            # Клиент ушёл: если слот уже передан — возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._remove_waiter(waiter)
+            raise
+        if waiter.done():
+            self.admitted += 1
+            return True
+        waiter.cancel()
+        self._remove_waiter(waiter)
+        self.shed_timeout += 1
+        return False
+
+    def _remove_waiter(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        if service_time is not None:
+            self.avg_service_time += _EWMA_ALPHA * (service_time - self.avg_service_time)
+        # Слот передаётся первому ожидающему без уменьшения active
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Оценка, через сколько секунд очередь рассосётся."""
+        estimate = self.avg_service_time * (len(self._waiters) + 1) / max(self.limit, 1)
+        return max(1, math.ceil(estimate))
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "timeout_seconds": self.timeout,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "avg_service_ms": round(self.avg_service_time * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """Набор ограничителей по классам маршрутов (auth, read, write, admin)."""
+
+    def __init__(self):
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        self.limiters: Dict[str, ClassLimiter] = {
+            "auth": ClassLimiter("auth", settings.ADMISSION_AUTH_CONCURRENCY, settings.ADMISSION_AUTH_QUEUE, timeout),
+            "read": ClassLimiter("read", settings.ADMISSION_READ_CONCURRENCY, settings.ADMISSION_READ_QUEUE, timeout),
+            "write": ClassLimiter("write", settings.ADMISSION_WRITE_CONCURRENCY, settings.ADMISSION_WRITE_QUEUE, timeout),
+            "admin": ClassLimiter("admin", settings.ADMISSION_ADMIN_CONCURRENCY, settings.ADMISSION_ADMIN_QUEUE, timeout),
+        }
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+# Глобальный контроллер (один на процесс)
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware admission control: при перегрузке запросы быстро получают
+    503 с Retry-After вместо того, чтобы копиться в очереди к SQLite.
+    Подключается последним (внешним), чтобы отклонять запросы до проверки сессии в БД.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = classify_request(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.limiters[route_class]
+        if not await limiter.acquire():
+            await self._reject(send, limiter)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+    @staticmethod
+    async def _reject(send, limiter: ClassLimiter) -> None:
+        body = b'{"detail":"Server is overloaded, retry later"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(limiter.retry_after()).encode("ascii")),
+                (b"x-admission-class", limiter.name.encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
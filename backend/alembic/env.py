@@ -27,7 +27,7 @@ if str(backend_dir) not in sys.path:
 
 from backend.db import Base
 # Импортируем все модели для autogenerate
-from backend.models import User, Session, Prompt, PromptVersion  # noqa
+from backend.models import User, Session, Prompt, PromptVersion, PromptUsage, CatalogState, PromptSection, ContentStats  # noqa
 
 target_metadata = Base.metadata
 
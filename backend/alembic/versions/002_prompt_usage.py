@@ -0,0 +1,37 @@
+"""prompt usage aggregates
+
+Revision ID: 002_prompt_usage
+Revises: 001_initial
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '002_prompt_usage'
+down_revision: Union[str, None] = '001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('prompt_usage',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('view_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('copy_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'prompt_id')
+    )
+    op.create_index(op.f('ix_prompt_usage_prompt_id'), 'prompt_usage', ['prompt_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prompt_usage_prompt_id'), table_name='prompt_usage')
+    op.drop_table('prompt_usage')
@@ -0,0 +1,31 @@
+"""prompt catalog generation counter
+
+Revision ID: 003_catalog_generation
+Revises: 002_prompt_usage
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003_catalog_generation'
+down_revision: Union[str, None] = '002_prompt_usage'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    catalog_state = op.create_table('prompt_catalog_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('generation', sa.Integer(), nullable=False, server_default='0'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(catalog_state, [{'id': 1, 'generation': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('prompt_catalog_state')
@@ -0,0 +1,27 @@
+"""prompt revision counter
+
+Revision ID: 004_prompt_revision
+Revises: 003_catalog_generation
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '004_prompt_revision'
+down_revision: Union[str, None] = '003_catalog_generation'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('prompts', sa.Column('revision', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.drop_column('revision')
@@ -0,0 +1,90 @@
+"""prompt version stats and (prompt_id, version) index
+
+Revision ID: 005_version_stats
+Revises: 004_prompt_revision
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+import difflib
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '005_version_stats'
+down_revision: Union[str, None] = '004_prompt_revision'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+prompt_versions = sa.table(
+    'prompt_versions',
+    sa.column('id', sa.Integer()),
+    sa.column('prompt_id', sa.Integer()),
+    sa.column('version', sa.Integer()),
+    sa.column('content', sa.Text()),
+    sa.column('content_length', sa.Integer()),
+    sa.column('content_hash', sa.String()),
+    sa.column('lines_added', sa.Integer()),
+    sa.column('lines_removed', sa.Integer()),
+)
+
+
+def _diffstat(old, new):
+    new_lines = new.splitlines()
+    if old is None:
+        return len(new_lines), 0
+    added = removed = 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old.splitlines(), new_lines).get_opcodes():
+        if tag in ('replace', 'delete'):
+            removed += i2 - i1
+        if tag in ('replace', 'insert'):
+            added += j2 - j1
+    return added, removed
+
+
+def upgrade() -> None:
+    op.add_column('prompt_versions', sa.Column('content_length', sa.Integer(), nullable=True))
+    op.add_column('prompt_versions', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('prompt_versions', sa.Column('lines_added', sa.Integer(), nullable=True))
+    op.add_column('prompt_versions', sa.Column('lines_removed', sa.Integer(), nullable=True))
+    op.create_index('ix_prompt_versions_prompt_id_version', 'prompt_versions', ['prompt_id', 'version'], unique=False)
+    # Составной индекс покрывает запросы по prompt_id — одиночный больше не нужен
+    op.drop_index(op.f('ix_prompt_versions_prompt_id'), table_name='prompt_versions')
+
+    # Заполняем метаданные существующих версий (по промпту, в порядке версий)
+    bind = op.get_bind()
+    prompt_ids = [row[0] for row in bind.execute(sa.select(prompt_versions.c.prompt_id).distinct())]
+    for prompt_id in prompt_ids:
+        rows = bind.execute(
+            sa.select(prompt_versions.c.id, prompt_versions.c.content)
+            .where(prompt_versions.c.prompt_id == prompt_id)
+            .order_by(prompt_versions.c.version)
+        ).all()
+        previous = None
+        for version_id, content in rows:
+            added, removed = _diffstat(previous, content)
+            bind.execute(
+                prompt_versions.update()
+                .where(prompt_versions.c.id == version_id)
+                .values(
+                    content_length=len(content),
+                    content_hash=hashlib.sha256(content.encode('utf-8')).hexdigest(),
+                    lines_added=added,
+                    lines_removed=removed,
+                )
+            )
+            previous = content
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_prompt_versions_prompt_id'), 'prompt_versions', ['prompt_id'], unique=False)
+    op.drop_index('ix_prompt_versions_prompt_id_version', table_name='prompt_versions')
+    with op.batch_alter_table('prompt_versions') as batch_op:
+        batch_op.drop_column('lines_removed')
+        batch_op.drop_column('lines_added')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('content_length')
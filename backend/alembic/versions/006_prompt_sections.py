@@ -0,0 +1,50 @@
+"""prompt sections outline
+
+Revision ID: 006_prompt_sections
+Revises: 005_version_stats
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.outline import extract_outline
+
+
+# revision identifiers, used by Alembic.
+revision: str = '006_prompt_sections'
+down_revision: Union[str, None] = '005_version_stats'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    prompt_sections = op.create_table('prompt_sections',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('level', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=512), nullable=False),
+    sa.Column('anchor', sa.String(length=512), nullable=False),
+    sa.Column('line', sa.Integer(), nullable=False),
+    sa.Column('start_byte', sa.Integer(), nullable=False),
+    sa.Column('end_byte', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_prompt_sections_prompt_id_anchor', 'prompt_sections', ['prompt_id', 'anchor'], unique=False)
+
+    # Строим оглавление для существующих промптов
+    prompts = sa.table('prompts', sa.column('id', sa.Integer()), sa.column('text', sa.Text()))
+    bind = op.get_bind()
+    for prompt_id, text in bind.execute(sa.select(prompts.c.id, prompts.c.text)).all():
+        rows = [dict(section._asdict(), prompt_id=prompt_id) for section in extract_outline(text)]
+        if rows:
+            op.bulk_insert(prompt_sections, rows)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_prompt_sections_prompt_id_anchor', table_name='prompt_sections')
+    op.drop_table('prompt_sections')
@@ -0,0 +1,42 @@
+"""prompt minhash signature
+
+Revision ID: 007_prompt_minhash
+Revises: 006_prompt_sections
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.minhash import minhash_signature
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007_prompt_minhash'
+down_revision: Union[str, None] = '006_prompt_sections'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('prompts', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+
+    # Считаем подписи для существующих промптов
+    prompts = sa.table(
+        'prompts',
+        sa.column('id', sa.Integer()),
+        sa.column('text', sa.Text()),
+        sa.column('minhash', sa.LargeBinary()),
+    )
+    bind = op.get_bind()
+    for prompt_id, text in bind.execute(sa.select(prompts.c.id, prompts.c.text)).all():
+        bind.execute(
+            prompts.update().where(prompts.c.id == prompt_id).values(minhash=minhash_signature(text))
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.drop_column('minhash')
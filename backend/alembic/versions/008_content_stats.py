@@ -0,0 +1,64 @@
+"""content stats per content hash
+
+Revision ID: 008_content_stats
+Revises: 007_prompt_minhash
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.utils import content_hash, text_stats
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008_content_stats'
+down_revision: Union[str, None] = '007_prompt_minhash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    content_stats = op.create_table('content_stats',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('char_count', sa.Integer(), nullable=False),
+    sa.Column('word_count', sa.Integer(), nullable=False),
+    sa.Column('token_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.add_column('prompts', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_prompts_content_hash'), 'prompts', ['content_hash'], unique=False)
+
+    # Хэши и статистика для текущих текстов промптов и всех версий
+    prompts = sa.table(
+        'prompts',
+        sa.column('id', sa.Integer()),
+        sa.column('text', sa.Text()),
+        sa.column('content_hash', sa.String()),
+    )
+    prompt_versions = sa.table(
+        'prompt_versions',
+        sa.column('content', sa.Text()),
+        sa.column('content_hash', sa.String()),
+    )
+    bind = op.get_bind()
+    stats = {}
+    for prompt_id, text in bind.execute(sa.select(prompts.c.id, prompts.c.text)).all():
+        digest = content_hash(text)
+        bind.execute(prompts.update().where(prompts.c.id == prompt_id).values(content_hash=digest))
+        if digest not in stats:
+            stats[digest] = dict(text_stats(text), content_hash=digest)
+    for digest, text in bind.execute(sa.select(prompt_versions.c.content_hash, prompt_versions.c.content)).all():
+        if digest and digest not in stats:
+            stats[digest] = dict(text_stats(text), content_hash=digest)
+    if stats:
+        op.bulk_insert(content_stats, list(stats.values()))
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prompts_content_hash'), table_name='prompts')
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.drop_column('content_hash')
+    op.drop_table('content_stats')
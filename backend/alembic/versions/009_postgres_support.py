@@ -0,0 +1,49 @@
+"""bigint telegram_id and postgres full-text index
+
+Revision ID: 009_postgres_support
+Revises: 008_content_stats
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '009_postgres_support'
+down_revision: Union[str, None] = '008_content_stats'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Выражение должно совпадать с crud.prompt_tsvector(), иначе планировщик не использует индекс
+FTS_INDEX_SQL = (
+    "CREATE INDEX ix_prompts_fts ON prompts "
+    "USING gin (to_tsvector('simple', name || ' ' || text))"
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # В SQLite INTEGER и так 64-битный — пересоздавать таблицу users незачем
+    if bind.dialect.name == 'sqlite':
+        return
+    op.alter_column(
+        'users', 'telegram_id',
+        existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False,
+    )
+    if bind.dialect.name == 'postgresql':
+        op.execute(FTS_INDEX_SQL)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        return
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_prompts_fts")
+    op.alter_column(
+        'users', 'telegram_id',
+        existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False,
+    )
@@ -0,0 +1,37 @@
+"""indexes for hot queries found by query audit
+
+Revision ID: 010_query_indexes
+Revises: 009_postgres_support
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '010_query_indexes'
+down_revision: Union[str, None] = '009_postgres_support'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Список промптов: сортировка по имени и фильтр по папке (python -m backend.query_audit)
+    op.create_index(op.f('ix_prompts_name'), 'prompts', ['name'], unique=False)
+    op.create_index('ix_prompts_folder_name', 'prompts', ['folder', 'name'], unique=False)
+    # password_auth ищет пользователя по username, админка сортирует по created_at
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=False)
+    op.create_index(op.f('ix_users_created_at'), 'users', ['created_at'], unique=False)
+    # Оглавление промпта по порядку разделов
+    op.create_index('ix_prompt_sections_prompt_id_position', 'prompt_sections', ['prompt_id', 'position'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_prompt_sections_prompt_id_position', table_name='prompt_sections')
+    op.drop_index(op.f('ix_users_created_at'), table_name='users')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index('ix_prompts_folder_name', table_name='prompts')
+    op.drop_index(op.f('ix_prompts_name'), table_name='prompts')
@@ -0,0 +1,31 @@
+"""index for point-in-time prompt version lookups
+
+Revision ID: 011_version_as_of_index
+Revises: 010_query_indexes
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011_version_as_of_index'
+down_revision: Union[str, None] = '010_query_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия промпта на момент as_of: последняя по created_at не позже as_of.
+    # INCLUDE (id) — index-only scan в PostgreSQL; в SQLite rowid и так входит в индекс
+    op.create_index(
+        'ix_prompt_versions_prompt_id_created_at', 'prompt_versions', ['prompt_id', 'created_at'],
+        unique=False, postgresql_include=['id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_prompt_versions_prompt_id_created_at', table_name='prompt_versions')
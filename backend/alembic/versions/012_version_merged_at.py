@@ -0,0 +1,28 @@
+"""merged_at for coalesced prompt versions
+
+Revision ID: 012_version_merged_at
+Revises: 011_version_as_of_index
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '012_version_merged_at'
+down_revision: Union[str, None] = '011_version_as_of_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Объединение сохранений больше не сдвигает created_at версии — время объединения отдельно
+    op.add_column('prompt_versions', sa.Column('merged_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('prompt_versions') as batch_op:
+        batch_op.drop_column('merged_at')
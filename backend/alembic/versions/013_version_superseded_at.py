@@ -0,0 +1,34 @@
+"""one prompt_versions row per save; superseded_at instead of merged_at
+
+Revision ID: 013_version_superseded_at
+Revises: 012_version_merged_at
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '013_version_superseded_at'
+down_revision: Union[str, None] = '012_version_merged_at'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Объединённые сохранения больше не перезаписывают версию: каждое — своя строка,
+    # промежуточные помечаются superseded_at и скрыты из истории
+    with op.batch_alter_table('prompt_versions') as batch_op:
+        batch_op.add_column(sa.Column('superseded_at', sa.DateTime(), nullable=True))
+        batch_op.drop_column('merged_at')
+
+
+def downgrade() -> None:
+    # Старая схема хранит одну строку на номер версии: промежуточные сохранения удаляются
+    op.execute('DELETE FROM prompt_versions WHERE superseded_at IS NOT NULL')
+    with op.batch_alter_table('prompt_versions') as batch_op:
+        batch_op.add_column(sa.Column('merged_at', sa.DateTime(), nullable=True))
+        batch_op.drop_column('superseded_at')
@@ -0,0 +1,208 @@
+"""
+Сборка фронтенда для раздачи из backend: имена файлов с хэшем содержимого,
+заранее сжатые варианты (gzip, brotli — если установлен пакет brotli) и index.html
+с переписанными ссылками, import map и подсказками modulepreload.
+
+ES-модули ссылаются друг на друга циклически (router.js <-> events.js <-> ui.js),
+поэтому хэши в import-пути не вшиваются: каждый модуль получает хэш своего
+содержимого, а import map в index.html сопоставляет исходные URL хэшированным.
+
+CLI:
+    python -m backend.assets [--out DIR]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .settings import settings
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость
+    brotli = None
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STATIC_PREFIX = "/static/"
+MANIFEST_NAME = "manifest.json"
+
+# Что собирается (пути относительно корня репозитория)
+ASSET_PATTERNS = ("main.js", "styles.css", "frontend/js/*.js", "assets/*")
+INDEX_NAME = "index.html"
+VERSION_NAME = "version.json"
+ENTRY_MODULE = "main.js"
+
+# Сжимаются только текстовые форматы и только если это экономит байты
+_COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json"}
+_HASH_LENGTH = 10
+
+_STATIC_IMPORT_RE = re.compile(r"""^\s*import\s+(?:[^'";]*?\s+from\s+)?['"]([^'"]+)['"]""", re.MULTILINE)
+_HTML_REF_RE = re.compile(r"""(\s(?:src|href)=")([^"]+)(")""")
+# Объявление кодировки: должно оставаться в первых 1024 байтах документа
+_META_CHARSET_RE = re.compile(r"<meta\s+charset=[^>]*>", re.IGNORECASE)
+_CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def default_dist_dir() -> Path:
+    return Path(settings.FRONTEND_DIST_DIR) if settings.FRONTEND_DIST_DIR else REPO_ROOT / "dist"
+
+
+def _hashed_name(relative: str, data: bytes) -> str:
+    path = Path(relative)
+    digest = hashlib.sha256(data).hexdigest()[:_HASH_LENGTH]
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+
+def _write_variants(path: Path, data: bytes) -> List[str]:
+    """Записать файл и его сжатые варианты; возвращает список кодировок."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    encodings = []
+    if path.suffix not in _COMPRESSIBLE:
+        return encodings
+    # mtime=0 — одинаковый результат при повторной сборке
+    gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gzipped) < len(data):
+        path.with_name(path.name + ".gz").write_bytes(gzipped)
+        encodings.append("gzip")
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            path.with_name(path.name + ".br").write_bytes(compressed)
+            encodings.append("br")
+    return encodings
+
+
+def _module_graph(sources: Dict[str, bytes], entry: str) -> List[str]:
+    """Статически импортируемые модули, достижимые из entry (для modulepreload)."""
+    seen: List[str] = []
+    pending = [entry]
+    while pending:
+        current = pending.pop(0)
+        if current in seen or current not in sources:
+            continue
+        seen.append(current)
+        base = Path(current).parent.as_posix()
+        for specifier in _STATIC_IMPORT_RE.findall(sources[current].decode("utf-8")):
+            if specifier.startswith("."):
+                pending.append(_normalize(f"{base}/{specifier}"))
+    return seen
+
+
+def _normalize(relative: str) -> str:
+    parts: List[str] = []
+    for part in relative.split("/"):
+        if part in ("", "."):
+            continue
+        if part == "..":
+            if parts:
+                parts.pop()
+            continue
+        parts.append(part)
+    return "/".join(parts)
+
+
+def _rewrite_css(text: str, relative: str, mapping: Dict[str, str]) -> str:
+    base = Path(relative).parent.as_posix()
+
+    def replace(match: re.Match) -> str:
+        target = match.group(2)
+        if target.startswith(("data:", "http:", "https:", "/", "#")):
+            return match.group(0)
+        resolved = _normalize(f"{base}/{target}")
+        if resolved not in mapping:
+            return match.group(0)
+        return f"url({match.group(1)}{STATIC_PREFIX}{mapping[resolved]}{match.group(1)})"
+
+    return _CSS_URL_RE.sub(replace, text)
+
+
+def build_assets(source_dir: Path = REPO_ROOT, out_dir: Optional[Path] = None) -> dict:
+    """Собрать фронтенд в out_dir и вернуть манифест."""
+    out_dir = out_dir or default_dist_dir()
+    static_dir = out_dir / "static"
+    if static_dir.exists():
+        shutil.rmtree(static_dir)
+
+    sources: Dict[str, bytes] = {}
+    for pattern in ASSET_PATTERNS:
+        for path in sorted(source_dir.glob(pattern)):
+            if path.is_file():
+                sources[path.relative_to(source_dir).as_posix()] = path.read_bytes()
+
+    # CSS может ссылаться на картинки: сначала хэшируем всё, кроме CSS, потом CSS с переписанными url()
+    mapping: Dict[str, str] = {}
+    for relative, data in sources.items():
+        if not relative.endswith(".css"):
+            mapping[relative] = _hashed_name(relative, data)
+    for relative, data in sources.items():
+        if relative.endswith(".css"):
+            sources[relative] = _rewrite_css(data.decode("utf-8"), relative, mapping).encode("utf-8")
+            mapping[relative] = _hashed_name(relative, sources[relative])
+
+    files = {}
+    for relative, data in sources.items():
+        encodings = _write_variants(static_dir / mapping[relative], data)
+        files[relative] = {"path": mapping[relative], "size": len(data), "encodings": encodings}
+
+    preload = [mapping[module] for module in _module_graph(sources, ENTRY_MODULE)]
+    import_map = {
+        "imports": {
+            f"{STATIC_PREFIX}{relative}": f"{STATIC_PREFIX}{hashed}"
+            for relative, hashed in mapping.items()
+            if relative.endswith(".js")
+        }
+    }
+
+    version_path = source_dir / VERSION_NAME
+    version = json.loads(version_path.read_text("utf-8")).get("version") if version_path.exists() else None
+
+    index = (source_dir / INDEX_NAME).read_text("utf-8")
+    index = _HTML_REF_RE.sub(
+        lambda match: (
+            f"{match.group(1)}{STATIC_PREFIX}{mapping[_normalize(match.group(2))]}{match.group(3)}"
+            if _normalize(match.group(2)) in mapping and not match.group(2).startswith(("http:", "https:", "//"))
+            else match.group(0)
+        ),
+        index,
+    )
+    head_extra = [f'<script type="importmap">{json.dumps(import_map, ensure_ascii=False)}</script>']
+    if version:
+        head_extra.append(f'<meta name="app-version" content="{version}">')
+    head_extra.extend(f'<link rel="modulepreload" href="{STATIC_PREFIX}{path}">' for path in preload)
+    # import map должен стоять до первого модульного скрипта, а <meta charset> — в первых
+    # 1024 байтах: вставляем сразу после <meta charset> (или в начало <head>, если его нет)
+    anchor = _META_CHARSET_RE.search(index)
+    position = anchor.end() if anchor else index.index("<head>") + len("<head>")
+    index = index[:position] + "\n  " + "\n  ".join(head_extra) + index[position:]
+
+    encodings = _write_variants(out_dir / INDEX_NAME, index.encode("utf-8"))
+    if version_path.exists():
+        _write_variants(out_dir / VERSION_NAME, version_path.read_bytes())
+
+    manifest = {
+        "version": version,
+        "files": files,
+        "preload": preload,
+        "stylesheets": [mapping[relative] for relative in sources if relative.endswith(".css")],
+        "index_encodings": encodings,
+    }
+    (out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), "utf-8")
+    return manifest
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Собрать фронтенд с хэшированными и сжатыми файлами")
+    parser.add_argument("--out", type=Path, default=None, help="каталог сборки (по умолчанию FRONTEND_DIST_DIR)")
+    args = parser.parse_args(argv)
+    manifest = build_assets(out_dir=args.out)
+    total = sum(item["size"] for item in manifest["files"].values())
+    print(f"Собрано файлов: {len(manifest['files'])}, {total} байт; brotli: {'да' if brotli else 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
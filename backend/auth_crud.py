@@ -5,7 +5,9 @@ from typing import Optional
 from sqlalchemy.orm import Session
 
 from .models import User, Session as SessionModel
+from .session_tokens import encode_session_token, revocation_registry, signed_tokens_enabled
 from .settings import settings
+from .write_buffer import write_buffer
 
 
 def get_user_by_telegram_id(db: Session, telegram_id: int) -> Optional[User]:
@@ -18,6 +20,7 @@ def create_user(
     username: Optional[str] = None,
     first_name: Optional[str] = None,
     last_name: Optional[str] = None,
+    commit: bool = True,
 ) -> User:
     db_user = User(
         telegram_id=telegram_id,
@@ -30,19 +33,29 @@ def create_user(
         last_login_at=datetime.utcnow(),
     )
     db.add(db_user)
+    if not commit:
+        db.flush()
+        return db_user
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
 def update_user_login_time(db: Session, user: User) -> User:
-    user.last_login_at = datetime.utcnow()
-    db.commit()
-    db.refresh(user)
+    """
+    Зафиксировать время входа. Запись в users.last_login_at отложенная:
+    значение попадает в БД со следующим flush буфера (write_buffer).
+    """
+    write_buffer.record_login(user.id)
     return user
 
 
-def create_session(db: Session, user_id: int, expires_in_days: int | None = None) -> SessionModel:
+def create_session(
+    db: Session,
+    user_id: int,
+    expires_in_days: int | None = None,
+    commit: bool = True,
+) -> SessionModel:
     if expires_in_days is None:
         expires_in_days = settings.SESSION_EXPIRES_DAYS
     token = secrets.token_urlsafe(32)
@@ -54,6 +67,13 @@ def create_session(db: Session, user_id: int, expires_in_days: int | None = None
         expires_at=expires_at,
     )
     db.add(db_session)
+    if signed_tokens_enabled():
+        # id сессии нужен для подписи: получаем его через flush и заменяем токен
+        db.flush()
+        db_session.token = encode_session_token(user_id, db_session.id, expires_at)
+    if not commit:
+        db.flush()
+        return db_session
     db.commit()
     db.refresh(db_session)
     return db_session
@@ -78,5 +98,6 @@ def revoke_session(db: Session, token: str) -> bool:
     
     session.revoked_at = datetime.utcnow()
     db.commit()
+    revocation_registry.mark_revoked(session.id, session.expires_at)
     return True
 
@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import tempfile
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import or_
+
+from .db import ReadSessionLocal, engine
+from .models import Prompt, PromptVersion
+from .settings import settings
+
+# Размер блока при чтении снимка и gzip-сжатии
+_CHUNK_SIZE = 1 << 16
+# Пачка строк при выгрузке инкрементального снимка
+_EXPORT_BATCH = 500
+
+
+class BackupNotSupported(Exception):
+    """Онлайн-бэкап доступен только для SQLite."""
+
+
+def sqlite_database_path() -> str:
+    if engine.dialect.name != "sqlite" or not engine.url.database:
+        raise BackupNotSupported("Online backup is only supported for file-based SQLite databases")
+    return engine.url.database
+
+
+def create_snapshot() -> str:
+    """
+    Снять согласованную копию базы через SQLite online backup API.
+    Копирование идёт шагами по BACKUP_PAGES_PER_STEP страниц с паузой между шагами:
+    блокировка чтения держится только на время шага, писатели не ждут весь бэкап.
+    Возвращает путь к временному файлу (удаляет вызывающий).
+    """
+    source_path = sqlite_database_path()
+    fd, snapshot_path = tempfile.mkstemp(prefix="prompts-backup-", suffix=".db")
+    os.close(fd)
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(
+            target,
+            pages=settings.BACKUP_PAGES_PER_STEP,
+            sleep=settings.BACKUP_STEP_SLEEP_SECONDS,
+        )
+    except Exception:
+        target.close()
+        os.remove(snapshot_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    return snapshot_path
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Сжать поток байт в формат gzip по мере чтения."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_snapshot_file(path: str) -> Iterator[bytes]:
+    """Прочитать файл снимка блоками и удалить его после отдачи (или обрыва соединения)."""
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def _prompt_record(prompt: Prompt) -> dict:
+    return {
+        "type": "prompt",
+        "id": prompt.id,
+        "slug": prompt.slug,
+        "name": prompt.name,
+        "text": prompt.text,
+        "folder": prompt.folder,
+        "tags": prompt.tags,
+        "importance": prompt.importance,
+        "revision": prompt.revision,
+        "created_at": prompt.created_at.isoformat(),
+        "updated_at": prompt.updated_at.isoformat(),
+    }
+
+
+def _version_record(version: PromptVersion) -> dict:
+    return {
+        "type": "version",
+        "id": version.id,
+        "prompt_id": version.prompt_id,
+        "version": version.version,
+        "title": version.title,
+        "content": version.content,
+        "created_at": version.created_at.isoformat(),
+        "superseded_at": version.superseded_at.isoformat() if version.superseded_at else None,
+        "updated_by_user_id": version.updated_by_user_id,
+    }
+
+
+def iter_incremental_export(since: datetime, snapshot_at: datetime) -> Iterator[bytes]:
+    """
+    NDJSON с промптами и версиями, изменёнными начиная с since, и полным списком id
+    промптов (чтобы при восстановлении удалить отсутствующие).
+
+    Нижняя граница берётся с запасом в секунду: updated_at из func.now() хранится без долей
+    секунды, а SQLite сравнивает даты как строки. Повторно выгруженные строки при
+    восстановлении просто перезаписываются.
+    Сессия открывается внутри генератора: выгрузка идёт уже после ответа роутера.
+    """
+    def line(record: dict) -> bytes:
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    lower_bound = since - timedelta(seconds=1)
+    db = ReadSessionLocal()
+    try:
+        yield line({
+            "type": "header",
+            "since": since.isoformat(),
+            "snapshot_at": snapshot_at.isoformat(),
+        })
+
+        prompts = (
+            db.query(Prompt)
+            .filter(Prompt.updated_at >= lower_bound)
+            .order_by(Prompt.id)
+            .yield_per(_EXPORT_BATCH)
+        )
+        for prompt in prompts:
+            yield line(_prompt_record(prompt))
+
+        versions = (
+            db.query(PromptVersion)
+            # Старая строка меняется, когда следующее сохранение объединяется с ней (superseded_at)
+            .filter(or_(PromptVersion.created_at >= lower_bound, PromptVersion.superseded_at >= lower_bound))
+            .order_by(PromptVersion.id)
+            .yield_per(_EXPORT_BATCH)
+        )
+        for version in versions:
+            yield line(_version_record(version))
+
+        prompt_ids = [prompt_id for (prompt_id,) in db.query(Prompt.id).order_by(Prompt.id)]
+        yield line({"type": "prompt_ids", "ids": prompt_ids})
+    finally:
+        db.close()
+
+
+def snapshot_timestamp() -> datetime:
+    """
+    Момент снимка, округлённый вниз до секунды (как хранится updated_at):
+    его передают как since в следующий инкрементальный бэкап.
+    """
+    return datetime.utcnow().replace(microsecond=0)
@@ -0,0 +1,254 @@
+"""
+Сборка read-only бандла библиотеки промптов для офлайн-потребителей.
+
+Бандл — один файл SQLite: таблица prompts (уникальный индекс по slug) и таблица
+manifest. Хэш манифеста зависит только от содержимого промптов, поэтому клиент
+скачивает новый бандл, только если хэш изменился. Читатель — autookk_client.PromptBundle.
+
+CLI:
+    python -m backend.bundle prompts.sqlite
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from .catalog import CatalogEntry, prompt_catalog
+from .settings import settings
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_MEDIA_TYPE = "application/vnd.sqlite3"
+# Сколько последних бандлов оставлять на диске (старый может ещё отдаваться другим воркером)
+_KEEP_BUNDLES = 2
+
+_SCHEMA = """
+CREATE TABLE manifest (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE prompts (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    folder TEXT,
+    tags TEXT,
+    importance TEXT,
+    revision INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    token_count INTEGER,
+    text TEXT NOT NULL
+);
+CREATE INDEX ix_prompts_folder ON prompts (folder);
+"""
+
+
+class BundleInfo(NamedTuple):
+    hash: str  # хэш манифеста (содержимого промптов)
+    path: str
+    size: int
+    sha256: str  # хэш самого файла — для проверки скачивания
+    prompt_count: int
+    generated_at: str
+
+    def manifest(self) -> dict:
+        return {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "hash": self.hash,
+            "size": self.size,
+            "sha256": self.sha256,
+            "prompt_count": self.prompt_count,
+            "generated_at": self.generated_at,
+        }
+
+
+def manifest_hash(entries: Sequence[CatalogEntry]) -> str:
+    """Хэш содержимого библиотеки: slug, хэш текста и метаданные каждого промпта."""
+    digest = hashlib.sha256(f"autookk-bundle-v{BUNDLE_FORMAT_VERSION}\n".encode("utf-8"))
+    for entry in sorted(entries, key=lambda item: item.slug):
+        for value in (entry.slug, entry.content_hash, entry.name, entry.folder, entry.tags, entry.importance, entry.revision):
+            digest.update(str(value).encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_bundle_info(path: str) -> BundleInfo:
+    """Прочитать манифест готового файла бандла."""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        manifest = dict(connection.execute("SELECT key, value FROM manifest"))
+    finally:
+        connection.close()
+    return BundleInfo(
+        hash=manifest["hash"],
+        path=path,
+        size=os.path.getsize(path),
+        sha256=_file_sha256(path),
+        prompt_count=int(manifest["prompt_count"]),
+        generated_at=manifest["generated_at"],
+    )
+
+
+def _library_timestamp(entries: Sequence[CatalogEntry]) -> str:
+    """
+    Момент последнего изменения библиотеки — generated_at бандла. Берётся из данных,
+    а не из часов: один и тот же набор промптов всегда даёт побайтно одинаковый файл.
+    """
+    latest = max((entry.updated_at for entry in entries), default=datetime(1970, 1, 1))
+    return latest.replace(microsecond=0).isoformat() + "Z"
+
+
+def write_bundle(
+    entries: Sequence[CatalogEntry],
+    path: str,
+    digest: Optional[str] = None,
+    overwrite: bool = True,
+) -> BundleInfo:
+    """
+    Записать бандл атомарно через временный файл. overwrite=False — файл публикуется
+    только если его ещё нет (os.link); если другой воркер успел раньше, возвращается
+    манифест уже опубликованного файла.
+    """
+    digest = digest or manifest_hash(entries)
+    generated_at = _library_timestamp(entries)
+    entries = sorted(entries, key=lambda entry: entry.id)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute("PRAGMA page_size = 4096")
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.executescript(_SCHEMA)
+        connection.executemany(
+            "INSERT INTO prompts (id, slug, name, folder, tags, importance, revision, updated_at, content_hash, token_count, text)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    entry.id, entry.slug, entry.name, entry.folder, entry.tags, entry.importance,
+                    entry.revision, entry.updated_at.isoformat(), entry.content_hash, entry.token_count, entry.text,
+                )
+                for entry in entries
+            ),
+        )
+        connection.executemany(
+            "INSERT INTO manifest (key, value) VALUES (?, ?)",
+            [
+                ("format_version", str(BUNDLE_FORMAT_VERSION)),
+                ("hash", digest),
+                ("prompt_count", str(len(entries))),
+                ("generated_at", generated_at),
+            ],
+        )
+        connection.commit()
+        # Компактный файл без свободных страниц
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+    if not overwrite:
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+        return read_bundle_info(path)
+
+    os.replace(tmp_path, path)
+    return BundleInfo(
+        hash=digest,
+        path=path,
+        size=os.path.getsize(path),
+        sha256=_file_sha256(path),
+        prompt_count=len(entries),
+        generated_at=generated_at,
+    )
+
+
+class BundlePublisher:
+    """
+    Текущий бандл библиотеки в каталоге BUNDLE_DIR. Пересобирается, только когда
+    меняется хэш манифеста; файлы называются по хэшу, поэтому воркеры не мешают друг другу.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._source: Optional[List[CatalogEntry]] = None
+        self._info: Optional[BundleInfo] = None
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"prompts-{digest[:16]}.sqlite")
+
+    def _cleanup(self, current: str) -> None:
+        paths = sorted(
+            glob.glob(os.path.join(self.directory, "prompts-*.sqlite")),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        for path in paths[_KEEP_BUNDLES:]:
+            if path != current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def current(self, db: Session) -> BundleInfo:
+        entries = prompt_catalog.entries(db)
+        with self._lock:
+            # Каталог заменяет список целиком при изменениях — тот же объект значит те же данные
+            if entries is self._source and self._info is not None and os.path.exists(self._info.path):
+                return self._info
+
+            digest = manifest_hash(entries)
+            if self._info is None or self._info.hash != digest or not os.path.exists(self._info.path):
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(digest)
+                if os.path.exists(path):
+                    self._info = read_bundle_info(path)
+                else:
+                    self._info = write_bundle(entries, path, digest, overwrite=False)
+                    self._cleanup(path)
+            self._source = entries
+            return self._info
+
+
+# Глобальный публикатор бандлов (один на процесс)
+bundle_publisher = BundlePublisher(settings.BUNDLE_DIR)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from .db import ReadSessionLocal
+
+    parser = argparse.ArgumentParser(description="Собрать read-only бандл промптов (SQLite)")
+    parser.add_argument("output", help="путь к файлу бандла")
+    args = parser.parse_args(argv)
+
+    db = ReadSessionLocal()
+    try:
+        info = write_bundle(prompt_catalog.entries(db), args.output)
+    finally:
+        db.close()
+    print(json.dumps(info.manifest(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .models import CatalogState, ContentStats, Prompt
+from .utils import content_hash
+
+# Размер пачки id в IN (...) при догрузке изменённых промптов
+_RELOAD_CHUNK = 500
+
+
+def _entry_etag(prompt: Prompt) -> str:
+    digest = hashlib.sha1()
+    for value in (prompt.slug, prompt.name, prompt.text, prompt.folder, prompt.tags, prompt.importance, prompt.revision, prompt.updated_at):
+        digest.update(str(value).encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """Неизменяемый снимок промпта в каталоге (совместим с PromptOut через from_attributes)."""
+    id: int
+    slug: str
+    name: str
+    text: str
+    folder: Optional[str]
+    tags: Optional[str]
+    importance: Optional[str]
+    revision: int
+    created_at: datetime
+    updated_at: datetime
+    # Предвычисленные ключи для поиска без учёта регистра (в т.ч. кириллица)
+    search_name: str = field(repr=False, compare=False, default="")
+    search_text: str = field(repr=False, compare=False, default="")
+    # ETag содержимого (updated_at хранится с точностью до секунды, поэтому хэш)
+    etag: str = field(repr=False, compare=False, default="")
+    # MinHash-подпись текста (Prompt.minhash), см. backend/minhash.py
+    minhash: Optional[bytes] = field(repr=False, compare=False, default=None)
+    # SHA-256 текста (Prompt.content_hash)
+    content_hash: str = field(repr=False, compare=False, default="")
+    # Из content_stats по хэшу текста (None, если статистика ещё не посчитана)
+    char_count: Optional[int] = None
+    word_count: Optional[int] = None
+    token_count: Optional[int] = None
+
+    @cached_property
+    def raw(self) -> bytes:
+        """Текст в UTF-8 (для выдачи диапазонов байт); вычисляется при первом обращении."""
+        return self.text.encode("utf-8")
+
+    @classmethod
+    def from_prompt(cls, prompt: Prompt, stats: Optional[ContentStats] = None) -> "CatalogEntry":
+        return cls(
+            id=prompt.id,
+            slug=prompt.slug,
+            name=prompt.name,
+            text=prompt.text,
+            folder=prompt.folder,
+            tags=prompt.tags,
+            importance=prompt.importance,
+            revision=prompt.revision,
+            created_at=prompt.created_at,
+            updated_at=prompt.updated_at,
+            search_name=prompt.name.casefold(),
+            search_text=prompt.text.casefold(),
+            etag=_entry_etag(prompt),
+            minhash=prompt.minhash,
+            content_hash=prompt.content_hash or content_hash(prompt.text),
+            char_count=stats.char_count if stats else None,
+            word_count=stats.word_count if stats else None,
+            token_count=stats.token_count if stats else None,
+        )
+
+
+# Подписчик получает (обновлённые записи, удалённые записи)
+CatalogListener = Callable[[List[CatalogEntry], List[CatalogEntry]], None]
+
+
+class PromptCatalog:
+    """
+    In-process каталог промптов для чтения без обращения к таблице prompts.
+
+    Перед каждым чтением сверяется счётчик prompt_catalog_state.generation
+    (один запрос по первичному ключу). Если другой воркер что-то записал,
+    каталог догружает только изменённые строки: новые id, строки с другим
+    updated_at или revision и строки не старше прошлого максимума updated_at
+    (updated_at хранится с точностью до секунды).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._watermark: Optional[datetime] = None
+        self._entries: Dict[int, CatalogEntry] = {}
+        self._by_slug: Dict[str, CatalogEntry] = {}
+        self._by_folder: Dict[str, List[CatalogEntry]] = {}
+        self._ordered: List[CatalogEntry] = []
+        self._listeners: List[CatalogListener] = []
+
+    def add_listener(self, listener: CatalogListener) -> None:
+        """Подписаться на изменения каталога (вызывается под блокировкой каталога)."""
+        self._listeners.append(listener)
+
+    def _current_generation(self, db: Session) -> int:
+        generation = db.query(CatalogState.generation).filter(CatalogState.id == 1).scalar()
+        return generation or 0
+
+    def sync(self, db: Session) -> None:
+        """Привести каталог в соответствие с БД, если счётчик поколений изменился."""
+        generation = self._current_generation(db)
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            self._reload(db, generation)
+
+    def _reload(self, db: Session, generation: int) -> None:
+        stamps = {
+            prompt_id: (updated_at, revision)
+            for prompt_id, updated_at, revision in db.query(Prompt.id, Prompt.updated_at, Prompt.revision)
+        }
+
+        changed_ids = [
+            prompt_id
+            for prompt_id, (updated_at, revision) in stamps.items()
+            if prompt_id not in self._entries
+            or self._entries[prompt_id].updated_at != updated_at
+            or self._entries[prompt_id].revision != revision
+            or (self._watermark is not None and updated_at >= self._watermark)
+        ]
+        removed = [entry for prompt_id, entry in self._entries.items() if prompt_id not in stamps]
+
+        upserted: List[CatalogEntry] = []
+        for start in range(0, len(changed_ids), _RELOAD_CHUNK):
+            chunk = changed_ids[start:start + _RELOAD_CHUNK]
+            rows = (
+                db.query(Prompt, ContentStats)
+                .outerjoin(ContentStats, ContentStats.content_hash == Prompt.content_hash)
+                .filter(Prompt.id.in_(chunk))
+            )
+            for prompt, stats in rows:
+                entry = CatalogEntry.from_prompt(prompt, stats)
+                if self._entries.get(entry.id) != entry:
+                    upserted.append(entry)
+
+        if upserted or removed or self._generation is None:
+            entries = dict(self._entries)
+            for entry in removed:
+                entries.pop(entry.id, None)
+            for entry in upserted:
+                entries[entry.id] = entry
+            self._rebuild_indexes(entries)
+            for listener in self._listeners:
+                listener(upserted, removed)
+
+        self._watermark = max((updated_at for updated_at, _ in stamps.values()), default=None)
+        self._generation = generation
+
+    def _rebuild_indexes(self, entries: Dict[int, CatalogEntry]) -> None:
+        ordered = sorted(entries.values(), key=lambda entry: (entry.name, entry.id))
+        by_folder: Dict[str, List[CatalogEntry]] = {}
+        for entry in ordered:
+            if entry.folder:
+                by_folder.setdefault(entry.folder, []).append(entry)
+        # Каждая структура заменяется целиком: читатели без блокировки видят согласованный снимок
+        self._entries = entries
+        self._by_slug = {entry.slug: entry for entry in ordered}
+        self._by_folder = by_folder
+        self._ordered = ordered
+
+    def get(self, db: Session, slug: str) -> Optional[CatalogEntry]:
+        self.sync(db)
+        return self._by_slug.get(slug)
+
+    def lookup(self, slug: str) -> Optional[CatalogEntry]:
+        """Поиск по slug в текущем снимке, без сверки с БД."""
+        return self._by_slug.get(slug)
+
+    def entries(self, db: Session) -> List[CatalogEntry]:
+        """Все промпты, отсортированные по имени."""
+        self.sync(db)
+        return self._ordered
+
+    def list_prompts(
+        self,
+        db: Session,
+        folder: Optional[str] = None,
+        search: Optional[str] = None,
+        min_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ) -> List[CatalogEntry]:
+        """То же, что crud.list_prompts, но из памяти; плюс фильтр по приблизительному числу токенов."""
+        self.sync(db)
+        entries = self._by_folder.get(folder, []) if folder else self._ordered
+
+        if search:
+            needle = search.casefold()
+            entries = [
+                entry for entry in entries
+                if needle in entry.search_name or needle in entry.search_text
+            ]
+
+        if min_tokens is not None or max_tokens is not None:
+            entries = [
+                entry for entry in entries
+                if entry.token_count is not None
+                and (min_tokens is None or entry.token_count >= min_tokens)
+                and (max_tokens is None or entry.token_count <= max_tokens)
+            ]
+
+        return list(entries)
+
+
+# Глобальный каталог (один на процесс)
+prompt_catalog = PromptCatalog()
@@ -1,17 +1,62 @@
-from typing import List, Optional
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Set, Tuple
 
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from sqlalchemy import func, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased
 
-from .models import Prompt, PromptVersion
-from .schemas import PromptCreate, PromptUpdate
-from .utils import slugify
+from .minhash import minhash_signature
+from .models import CatalogState, ContentStats, Prompt, PromptSection, PromptUsage, PromptVersion
+from .outline import extract_outline
+from .schemas import PromptCreate, PromptPatch, PromptUpdate
+from .settings import settings
+from .task_queue import task_queue
+from .templating import template_cache
+from .text_patch import apply_text_ops, apply_unified_diff
+from .utils import content_hash, diffstat, slugify, text_stats
 
 
 def get_prompt_by_slug(db: Session, slug: str) -> Optional[Prompt]:
     return db.query(Prompt).filter(Prompt.slug == slug).first()
 
 
+# Конфигурация полнотекстового поиска PostgreSQL: 'simple' без стемминга — одинаково
+# для русского и английского текста
+FULL_TEXT_CONFIG = "'simple'"
+
+
+def supports_full_text_search(db: Session) -> bool:
+    """Есть ли в БД полнотекстовый поиск с GIN-индексом (миграция 009, только PostgreSQL)."""
+    return db.bind.dialect.name == "postgresql"
+
+
+def prompt_tsvector():
+    """
+    tsvector по имени и тексту промпта. Конфигурация и разделитель — литералы, а не
+    параметры: выражение должно совпадать с индексом ix_prompts_fts.
+    """
+    return func.to_tsvector(
+        literal_column(FULL_TEXT_CONFIG), Prompt.name + literal_column("' '") + Prompt.text
+    )
+
+
+def _prefix_tsquery(search: str) -> Optional[str]:
+    """Запрос tsquery: все слова поиска как префиксы ('про изв' -> 'про:* & изв:*')."""
+    words = re.findall(r"\w+", search.casefold())
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+def _search_filter(db: Session, search: str):
+    tsquery = _prefix_tsquery(search) if supports_full_text_search(db) else None
+    if tsquery:
+        return prompt_tsvector().op("@@")(func.to_tsquery(literal_column(FULL_TEXT_CONFIG), tsquery))
+    # SQLite (и поиск без слов): подстрока без индекса
+    like_pattern = f"%{search}%"
+    return or_(Prompt.name.ilike(like_pattern), Prompt.text.ilike(like_pattern))
+
+
 def list_prompts(
     db: Session, folder: Optional[str] = None, search: Optional[str] = None
 ) -> List[Prompt]:
@@ -21,14 +66,159 @@ def list_prompts(
         query = query.filter(Prompt.folder == folder)
 
     if search:
-        like_pattern = f"%{search}%"
-        query = query.filter(
-            or_(Prompt.name.ilike(like_pattern), Prompt.text.ilike(like_pattern))
-        )
+        query = query.filter(_search_filter(db, search))
 
     return query.order_by(Prompt.name.asc()).all()
 
 
+def search_prompt_ids(db: Session, search: str) -> Optional[Set[int]]:
+    """
+    Id промптов, найденных полнотекстовым поиском по GIN-индексу.
+    None — полнотекстовый поиск недоступен (SQLite) или в запросе нет слов.
+    """
+    if not supports_full_text_search(db) or not _prefix_tsquery(search):
+        return None
+    rows = db.query(Prompt.id).filter(_search_filter(db, search)).all()
+    return {row.id for row in rows}
+
+
+def _version_as_of_id(prompt_id, as_of: datetime):
+    """
+    Коррелированный подзапрос: id последней версии промпта, сохранённой не позже as_of.
+    Выполняется по индексу (prompt_id, created_at) без обращения к таблице версий.
+    """
+    # Псевдоним: внешний запрос тоже выбирает из prompt_versions, коррелировать нужно только prompt_id
+    candidate = aliased(PromptVersion)
+    return (
+        select(candidate.id)
+        .where(candidate.prompt_id == prompt_id, candidate.created_at <= as_of)
+        .order_by(candidate.created_at.desc(), candidate.id.desc())
+        .limit(1)
+        .correlate_except(candidate)
+        .scalar_subquery()
+    )
+
+
+def _prompts_as_of_query(db: Session, as_of: datetime):
+    return db.query(Prompt, PromptVersion).join(
+        PromptVersion, PromptVersion.id == _version_as_of_id(Prompt.id, as_of)
+    )
+
+
+def get_prompt_as_of(db: Session, slug: str, as_of: datetime) -> Optional[Tuple[Prompt, PromptVersion]]:
+    """Промпт и его версия на момент as_of (одним запросом). None — промпта нет или тогда ещё не было версий."""
+    return _prompts_as_of_query(db, as_of).filter(Prompt.slug == slug).first()
+
+
+def list_prompts_as_of(
+    db: Session,
+    as_of: datetime,
+    folder: Optional[str] = None,
+    slugs: Optional[Sequence[str]] = None,
+) -> List[Tuple[Prompt, PromptVersion]]:
+    """
+    Снимок библиотеки на момент as_of: для каждого промпта — последняя версия не позже as_of
+    (одним запросом). Промпты, у которых тогда ещё не было версий, не попадают в снимок.
+    """
+    query = _prompts_as_of_query(db, as_of)
+    if folder:
+        query = query.filter(Prompt.folder == folder)
+    if slugs:
+        # Поиск по индексу slug; сортировать несколько строк проще в памяти, чем временным B-деревом
+        rows = query.filter(Prompt.slug.in_(slugs)).all()
+        return sorted(rows, key=lambda row: row[0].name)
+    return query.order_by(Prompt.name.asc()).all()
+
+
+def _bump_catalog_generation(db: Session) -> None:
+    """
+    Отметить изменение таблицы prompts для in-memory каталогов всех воркеров.
+    Выполняется в той же транзакции, что и сама запись.
+    """
+    db.execute(
+        update(CatalogState)
+        .where(CatalogState.id == 1)
+        .values(generation=CatalogState.generation + 1)
+    )
+
+
+def _ensure_content_stats(db: Session, digest: str, text: str) -> None:
+    """Посчитать размер и токены текста, если для этого хэша их ещё нет (в текущей транзакции)."""
+    if db.get(ContentStats, digest) is not None:
+        return
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    db.execute(
+        insert(ContentStats)
+        .values(content_hash=digest, **text_stats(text))
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+
+
+def _store_text_metadata(db: Session, prompt: Prompt) -> None:
+    """
+    Производные от текста данные: хэш со статистикой и MinHash (их читает in-memory
+    каталог) и оглавление. Пишутся в той же транзакции, что и текст: байтовые смещения
+    разделов должны всегда соответствовать текущему тексту.
+    """
+    prompt.content_hash = content_hash(prompt.text)
+    _ensure_content_stats(db, prompt.content_hash, prompt.text)
+    prompt.minhash = minhash_signature(prompt.text)
+    _store_sections(db, prompt)
+
+
+def _store_sections(db: Session, prompt: Prompt) -> None:
+    """Пересобрать оглавление промпта (в текущей транзакции)."""
+    db.query(PromptSection).filter(PromptSection.prompt_id == prompt.id).delete(synchronize_session=False)
+    db.add_all(
+        PromptSection(prompt_id=prompt.id, **section._asdict())
+        for section in extract_outline(prompt.text)
+    )
+
+
+def fill_version_diffstat(db: Session, version_id: int) -> None:
+    """Посчитать diffstat версии относительно предыдущей в истории (отложенная задача)."""
+    version = db.get(PromptVersion, version_id)
+    if version is None:
+        return  # версию удалили (вместе с промптом или ретеншном) раньше, чем до неё дошла очередь
+    previous = (
+        db.query(PromptVersion.content)
+        .filter(
+            PromptVersion.prompt_id == version.prompt_id,
+            PromptVersion.version < version.version,
+            PromptVersion.superseded_at.is_(None),
+        )
+        .order_by(PromptVersion.version.desc())
+        .first()
+    )
+    version.lines_added, version.lines_removed = diffstat(previous.content if previous else None, version.content)
+    db.commit()
+
+
+def _defer_derived_work(version: PromptVersion) -> None:
+    """
+    Поставить в очередь задач производную работу после записи: diffstat версии.
+    Ключ — id промпта, поэтому задачи одного промпта выполняются по порядку сохранений.
+    """
+    task_queue.submit_db("version_diffstat", fill_version_diffstat, version.id, key=version.prompt_id)
+
+
+def get_prompt_sections(db: Session, prompt_id: int) -> List[PromptSection]:
+    return (
+        db.query(PromptSection)
+        .filter(PromptSection.prompt_id == prompt_id)
+        .order_by(PromptSection.position)
+        .all()
+    )
+
+
+def get_prompt_section(db: Session, prompt_id: int, anchor: str) -> Optional[PromptSection]:
+    return (
+        db.query(PromptSection)
+        .filter(PromptSection.prompt_id == prompt_id, PromptSection.anchor == anchor)
+        .first()
+    )
+
+
 def _generate_unique_slug(db: Session, base_slug: str) -> str:
     """
     Generate a unique slug by appending -2, -3, ... if needed.
@@ -54,65 +244,155 @@ def create_prompt(db: Session, data: PromptCreate, user_id: int | None = None) -
         importance=data.importance or "normal",
     )
     db.add(db_prompt)
+    db.flush()
+    _store_text_metadata(db, db_prompt)
+    version = create_prompt_version(db, db_prompt, user_id)
+    _bump_catalog_generation(db)
     db.commit()
     db.refresh(db_prompt)
     
-    # Создаем первую версию
-    create_prompt_version(db, db_prompt, user_id)
+    # diffstat первой версии — в фоне
+    _defer_derived_work(version)
     
     return db_prompt
 
 
-def update_prompt(db: Session, slug: str, data: PromptUpdate, user_id: int | None = None) -> Optional[Prompt]:
+class PromptConflictError(Exception):
+    """Промпт изменился после ревизии, на которую опирается запрос."""
+
+    def __init__(self, current_revision: int):
+        super().__init__(f"Prompt was modified (current revision {current_revision})")
+        self.current_revision = current_revision
+
+
+def update_prompt(
+    db: Session,
+    slug: str,
+    data: PromptUpdate,
+    user_id: int | None = None,
+    expected_revision: int | None = None,
+) -> Optional[Prompt]:
     db_prompt = get_prompt_by_slug(db, slug)
     if not db_prompt:
         return None
 
+    # Увеличиваем revision атомарно; с expected_revision — только если промпт не менялся
+    query = db.query(Prompt).filter(Prompt.id == db_prompt.id)
+    if expected_revision is not None:
+        query = query.filter(Prompt.revision == expected_revision)
+    if not query.update({Prompt.revision: Prompt.revision + 1}, synchronize_session=False):
+        db.rollback()
+        db.refresh(db_prompt)
+        raise PromptConflictError(db_prompt.revision)
+
     update_data = data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_prompt, field, value)
 
+    if "text" in update_data:
+        _store_text_metadata(db, db_prompt)
+    version = create_prompt_version(db, db_prompt, user_id)
+    _bump_catalog_generation(db)
     db.commit()
     db.refresh(db_prompt)
+    # Скомпилированный шаблон и все шаблоны, включающие этот промпт, устарели
+    template_cache.invalidate(slug)
     
-    # Создаем новую версию после обновления
-    create_prompt_version(db, db_prompt, user_id)
+    # diffstat новой версии — в фоне
+    _defer_derived_work(version)
     
     return db_prompt
 
 
+def patch_prompt(db: Session, slug: str, data: PromptPatch, user_id: int | None = None) -> Optional[Prompt]:
+    """
+    Обновить промпт патчем относительно base_revision.
+    Бросает PromptConflictError, если промпт уже изменён, и PatchError, если патч не применяется.
+    """
+    db_prompt = get_prompt_by_slug(db, slug)
+    if not db_prompt:
+        return None
+    if db_prompt.revision != data.base_revision:
+        raise PromptConflictError(db_prompt.revision)
+
+    fields = data.dict(exclude_unset=True, exclude={"base_revision", "ops", "diff"})
+    if data.ops:
+        fields["text"] = apply_text_ops(db_prompt.text, [(op.start, op.end, op.text) for op in data.ops])
+    elif data.diff is not None:
+        fields["text"] = apply_unified_diff(db_prompt.text, data.diff)
+
+    return update_prompt(
+        db, slug, PromptUpdate(**fields), user_id=user_id, expected_revision=data.base_revision
+    )
+
+
 def delete_prompt(db: Session, slug: str) -> bool:
     db_prompt = get_prompt_by_slug(db, slug)
     if not db_prompt:
         return False
 
+    # Зависимые строки — в той же транзакции: в PostgreSQL внешние ключи проверяются
+    for model in (PromptSection, PromptVersion, PromptUsage):
+        db.query(model).filter(model.prompt_id == db_prompt.id).delete(synchronize_session=False)
     db.delete(db_prompt)
+    _bump_catalog_generation(db)
     db.commit()
+    template_cache.invalidate(slug)
     return True
 
 
+def _fill_version_stats(db: Session, version: PromptVersion) -> None:
+    """
+    Размер и хэш версии — считаются один раз при записи; diffstat — отложенно
+    (fill_version_diffstat). Символы/слова/токены — один раз на уникальный хэш (content_stats).
+    """
+    version.content_length = len(version.content)
+    version.content_hash = content_hash(version.content)
+    _ensure_content_stats(db, version.content_hash, version.content)
+
+
 def create_prompt_version(db: Session, prompt: Prompt, user_id: int | None) -> PromptVersion:
     """
-    Создает новую версию промпта.
+    Создает новую версию промпта в транзакции вызывающего (без COMMIT): сохранение
+    промпта и его версия фиксируются вместе.
+
+    Если название и текст не изменились — новая версия не создаётся.
+    Каждое сохранение — отдельная строка, которая потом не меняется, поэтому чтение
+    as_of возвращает ровно тот текст, что действовал в тот момент. Объединение частых
+    сохранений — только в истории: если предыдущее сохранение того же пользователя
+    было не ранее чем VERSION_COALESCE_SECONDS назад, новое получает тот же номер
+    версии, а предыдущее помечается superseded_at и из истории скрывается.
     """
+    saved_at = datetime.utcnow()
     last_version = (
         db.query(PromptVersion)
         .filter(PromptVersion.prompt_id == prompt.id)
-        .order_by(PromptVersion.version.desc())
+        .order_by(PromptVersion.version.desc(), PromptVersion.id.desc())
         .first()
     )
+    if last_version and last_version.title == prompt.name and last_version.content == prompt.text:
+        return last_version
+
     next_version = (last_version.version + 1) if last_version else 1
+    if (
+        last_version
+        and user_id is not None
+        and last_version.updated_by_user_id == user_id
+        and settings.VERSION_COALESCE_SECONDS > 0
+        and last_version.created_at >= saved_at - timedelta(seconds=settings.VERSION_COALESCE_SECONDS)
+    ):
+        last_version.superseded_at = saved_at
+        next_version = last_version.version
 
     version = PromptVersion(
         prompt_id=prompt.id,
         version=next_version,
         title=prompt.name,
         content=prompt.text,
+        created_at=saved_at,
         updated_by_user_id=user_id,
     )
+    _fill_version_stats(db, version)
     db.add(version)
-    db.commit()
-    db.refresh(version)
+    db.flush()
     return version
-
-
@@ -1,13 +1,89 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
 from .settings import settings
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def is_sqlite(database_url: str) -> bool:
+    return make_url(database_url).get_backend_name() == "sqlite"
+
+
+def _engine_options(database_url: str) -> dict:
+    """Параметры движка под диалект: SQLite — один файл, PostgreSQL — пул соединений."""
+    if is_sqlite(database_url):
+        # Соединение SQLite используется из потоков пула FastAPI;
+        # timeout — ожидание блокировки записи (busy_timeout)
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}}
+    # QueuePool: несколько воркеров и узлов делят одну БД, поэтому пул ограничен
+    # и соединения проверяются перед выдачей (после рестарта/failover сервера)
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _read_only_url(database_url: str):
+    """URL read-only соединений SQLite (mode=ro); None — для БД в памяти."""
+    url = make_url(database_url)
+    if not url.database or url.database == ":memory:" or url.database.startswith("file:"):
+        return None
+    return url.set(database=f"file:{url.database}", query={"mode": "ro", "uri": "true"})
+
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+
+
+def _set_wal(dbapi_connection, connection_record):
+    # WAL: читатели не блокируют писателя и видят последнее закоммиченное состояние
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+if is_sqlite(settings.DATABASE_URL):
+    event.listen(engine, "connect", _set_wal)
+
+    # Соединение потока-писателя (db_writer): одно на процесс
+    writer_engine = create_engine(
+        settings.DATABASE_URL, pool_size=1, max_overflow=0, **_engine_options(settings.DATABASE_URL)
+    )
+
+    @event.listens_for(writer_engine, "connect")
+    def _writer_on_connect(dbapi_connection, connection_record):
+        # Рецепт SQLAlchemy для pysqlite: драйвер сам не открывает транзакции,
+        # иначе SAVEPOINT (по одной на задание в пачке) работают неправильно
+        dbapi_connection.isolation_level = None
+        _set_wal(dbapi_connection, connection_record)
+
+    @event.listens_for(writer_engine, "begin")
+    def _writer_on_begin(conn):
+        # Блокировка записи берётся сразу: повышение блокировки посреди транзакции
+        # дало бы SQLITE_BUSY без ожидания busy_timeout
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+else:
+    writer_engine = engine
+
+_read_url = _read_only_url(settings.DATABASE_URL) if is_sqlite(settings.DATABASE_URL) else None
+if _read_url is not None:
+    # Отдельный пул read-only соединений: чтения не конкурируют за блокировку записи
+    read_engine = create_engine(
+        _read_url,
+        connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS},
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+else:
+    # PostgreSQL и SQLite в памяти: одно подключение для чтения и записи
+    read_engine = engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -21,4 +97,10 @@ def get_db() -> Session:
         db.close()
 
 
-
+def get_read_db() -> Session:
+    """Dependency: сессия только для чтения (read-only пул SQLite). Запись — через db_writer."""
+    db: Session = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, is_sqlite, writer_engine
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Job:
+    __slots__ = ("func", "args", "kwargs", "future")
+
+    def __init__(self, func: Callable[..., Any], args: tuple, kwargs: dict):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+
+def _run_in_session(func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    """Выполнить func(db, ...) в отдельной транзакции (писатель не запущен)."""
+    db: Session = SessionLocal(expire_on_commit=False)
+    try:
+        result = func(db, *args, **kwargs)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class DatabaseWriter:
+    """
+    Единственный писатель SQLite: все записи из роутеров, очереди задач и буфера
+    счётчиков выполняются в одном потоке.
+
+    Поток забирает из очереди все накопившиеся задания (до max_batch) и выполняет их
+    в одной транзакции — один fsync на пачку вместо одного на запрос. Каждое задание
+    получает свою сессию поверх SAVEPOINT (join_transaction_mode="create_savepoint"):
+    db.commit() внутри crud фиксирует только savepoint, ошибка задания откатывает
+    только его изменения. Результат возвращается вызывающему после COMMIT всей пачки.
+    expire_on_commit=False — возвращённые ORM-объекты читаются без обращения к БД.
+
+    Не запущен (CLI, миграции, PostgreSQL) — задание выполняется сразу в вызывающем потоке.
+    """
+
+    def __init__(self, max_batch: int, batch_window: float):
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._connection = None  # соединение текущей пачки (только в потоке писателя)
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.jobs = 0
+        self.failed_jobs = 0
+        self.failed_batches = 0
+        self.max_batch_seen = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None or not is_sqlite(settings.DATABASE_URL) or not settings.SQLITE_SINGLE_WRITER:
+            return
+        # Первое соединение переводит БД в WAL до того, как откроются read-only соединения
+        with writer_engine.connect():
+            pass
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Выполнить уже поставленные задания и остановить поток."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Поставить func(db, *args, **kwargs) в очередь; Future завершится после COMMIT."""
+        job = _Job(func, args, kwargs)
+        if self._thread is None or threading.current_thread() is self._thread:
+            self._execute_inline(job)
+        else:
+            self._queue.put(job)
+        return job.future
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Выполнить запись и дождаться результата (из синхронного кода и threadpool)."""
+        return self.submit(func, *args, **kwargs).result()
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """То же, что call, для async-эндпоинтов: event loop не блокируется."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def _execute_inline(self, job: _Job) -> None:
+        try:
+            if self._connection is not None and threading.current_thread() is self._thread:
+                # Вложенная запись из задания (например, очередь задач выполняет задачу сразу):
+                # своя savepoint в текущей пачке, иначе второе соединение ждало бы само себя
+                result = self._run_job(self._connection, job)
+            else:
+                result = _run_in_session(job.func, job.args, job.kwargs)
+        except BaseException as exc:
+            job.future.set_exception(exc)
+        else:
+            job.future.set_result(result)
+
+    @staticmethod
+    def _run_job(connection, job: _Job) -> Any:
+        db = Session(
+            bind=connection,
+            join_transaction_mode="create_savepoint",
+            autoflush=False,
+            expire_on_commit=False,
+        )
+        try:
+            result = job.func(db, *job.args, **job.kwargs)
+            db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _collect(self, first: _Job) -> List[Any]:
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            stop = batch[-1] is _STOP
+            jobs = [job for job in batch if job is not _STOP]
+            self._run_batch(jobs)
+            if stop:
+                return
+
+    def _run_batch(self, jobs: List[_Job]) -> None:
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            with writer_engine.connect() as connection:
+                transaction = connection.begin()
+                self._connection = connection
+                try:
+                    for job in jobs:
+                        try:
+                            outcomes.append((job, self._run_job(connection, job), None))
+                        except Exception as exc:
+                            outcomes.append((job, None, exc))
+                finally:
+                    self._connection = None
+                transaction.commit()
+        except Exception as exc:
+            logger.exception("Не удалось записать пачку из %s заданий", len(jobs))
+            with self._stats_lock:
+                self.failed_batches += 1
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            return
+        finally:
+            with self._stats_lock:
+                self.batches += 1
+                self.jobs += len(jobs)
+                self.max_batch_seen = max(self.max_batch_seen, len(jobs))
+                self.busy_seconds += time.perf_counter() - started
+
+        failed = 0
+        for job, result, exc in outcomes:
+            if exc is not None:
+                failed += 1
+                job.future.set_exception(exc)
+            else:
+                job.future.set_result(result)
+        if failed:
+            with self._stats_lock:
+                self.failed_jobs += failed
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "running": self.running,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "jobs": self.jobs,
+                "failed_jobs": self.failed_jobs,
+                "failed_batches": self.failed_batches,
+                "avg_batch": round(self.jobs / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch_seen,
+                "busy_seconds": round(self.busy_seconds, 3),
+            }
+
+
+# Глобальный писатель БД (один на процесс)
+db_writer = DatabaseWriter(
+    max_batch=settings.DB_WRITER_MAX_BATCH,
+    batch_window=settings.DB_WRITER_BATCH_WINDOW_SECONDS,
+)
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы задержки (мс); последняя корзина — всё, что больше
+_HISTOGRAM_BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Сколько разных стеков-нарушителей хранить
+_MAX_OFFENDERS = 50
+
+
+def _format_stack(frame) -> Tuple[str, ...]:
+    """Стек от корня к листу в виде 'file:line in func'."""
+    lines = []
+    while frame is not None:
+        code = frame.f_code
+        lines.append(f"{code.co_filename}:{frame.f_lineno} in {code.co_name}")
+        frame = frame.f_back
+    lines.reverse()
+    return tuple(lines)
+
+
+class _Offender:
+    __slots__ = ("stack", "task", "count", "max_lag", "total_lag", "last_seen")
+
+    def __init__(self, stack: Tuple[str, ...], task: Optional[str]):
+        self.stack = stack
+        self.task = task
+        self.count = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_seen: Optional[datetime] = None
+
+
+class LoopLagWatchdog:
+    """
+    Сторожевой поток задержки event loop.
+
+    Раз в interval ставит в loop пустой колбэк (call_soon_threadsafe) и измеряет,
+    через сколько он выполнился. Если колбэк не выполнился за threshold, значит loop
+    занят синхронным кодом: снимается стек потока loop и текущая задача — это и есть
+    блокирующий вызов (синхронный запрос к БД, bcrypt и т.п. внутри async def).
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._histogram = [0] * (len(_HISTOGRAM_BOUNDS_MS) + 1)
+        self._samples = 0
+        self._max_lag = 0.0
+        self._stalls = 0
+        self._offenders: Dict[Tuple[str, ...], _Offender] = {}
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Запустить наблюдение; вызывается из потока event loop."""
+        if self._thread is not None:
+            return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _capture(self) -> Tuple[Tuple[str, ...], Optional[str]]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = _format_stack(frame) if frame is not None else ()
+        task_name = None
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is not None:
+            coro = task.get_coro()
+            task_name = f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+        return stack, task_name
+
+    def _record(self, lag: float, offender: Optional[Tuple[Tuple[str, ...], Optional[str]]]) -> None:
+        lag_ms = lag * 1000
+        bucket = next(
+            (index for index, bound in enumerate(_HISTOGRAM_BOUNDS_MS) if lag_ms <= bound),
+            len(_HISTOGRAM_BOUNDS_MS),
+        )
+        with self._lock:
+            self._samples += 1
+            self._histogram[bucket] += 1
+            self._max_lag = max(self._max_lag, lag)
+            if offender is None:
+                return
+            self._stalls += 1
+            stack, task_name = offender
+            entry = self._offenders.get(stack)
+            if entry is None:
+                if len(self._offenders) >= _MAX_OFFENDERS:
+                    # Вытесняем самый редкий стек
+                    rarest = min(self._offenders, key=lambda key: self._offenders[key].count)
+                    del self._offenders[rarest]
+                entry = self._offenders[stack] = _Offender(stack, task_name)
+            entry.count += 1
+            entry.max_lag = max(entry.max_lag, lag)
+            entry.total_lag += lag
+            entry.last_seen = datetime.utcnow()
+        logger.warning(
+            "Event loop заблокирован на %.0f мс: %s", lag_ms, stack[-1] if stack else task_name
+        )
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            executed = threading.Event()
+            ran_at: List[float] = []
+
+            def mark() -> None:
+                ran_at.append(time.perf_counter())
+                executed.set()
+
+            scheduled = time.perf_counter()
+            try:
+                self._loop.call_soon_threadsafe(mark)
+            except RuntimeError:
+                return  # loop закрыт
+
+            offender = None
+            if not executed.wait(self.threshold):
+                offender = self._capture()
+                while not executed.wait(self.interval):
+                    if self._stop.is_set() or self._loop.is_closed():
+                        return
+            self._record(ran_at[0] - scheduled, offender)
+
+    def report(self, top: int = 20) -> dict:
+        with self._lock:
+            offenders = sorted(self._offenders.values(), key=lambda item: item.total_lag, reverse=True)[:top]
+            histogram = [
+                {"le_ms": bound, "count": count}
+                for bound, count in zip(_HISTOGRAM_BOUNDS_MS + (None,), self._histogram)
+            ]
+            return {
+                "running": self._thread is not None,
+                "interval_ms": self.interval * 1000,
+                "threshold_ms": self.threshold * 1000,
+                "samples": self._samples,
+                "stalls": self._stalls,
+                "max_lag_ms": round(self._max_lag * 1000, 3),
+                "histogram": histogram,
+                "offenders": [
+                    {
+                        "task": item.task,
+                        "count": item.count,
+                        "max_lag_ms": round(item.max_lag * 1000, 3),
+                        "total_lag_ms": round(item.total_lag * 1000, 3),
+                        "last_seen": item.last_seen.isoformat() if item.last_seen else None,
+                        "stack": list(item.stack),
+                    }
+                    for item in offenders
+                ],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reset_stats()
+
+
+# Глобальный сторож event loop (один на процесс)
+loop_watchdog = LoopLagWatchdog(
+    interval=settings.LOOP_WATCHDOG_INTERVAL_SECONDS,
+    threshold=settings.LOOP_LAG_THRESHOLD_SECONDS,
+)
@@ -1,46 +1,29 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from .admission import AdmissionControlMiddleware
 from .db import Base
+from .db_writer import db_writer
+from .loop_watchdog import loop_watchdog
 from .middleware import AuthMiddleware
+from .profiler import ProfilerMiddleware
 from .rate_limit import RateLimitMiddleware
-from .routers import admin, auth, prompts
+from .routers import admin, auth, bundle, frontend, prompts
 from .settings import settings
+from .task_queue import task_queue
+from .version_retention import version_compactor
+from .write_buffer import write_buffer
 
 # Загружаем переменные окружения из .env
 load_dotenv()
 
-app = FastAPI(title="autookk backend", version="1.0.0")
-
-# CORS middleware (должен быть первым)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.get_allowed_origins(),
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
-)
-
-# Rate limiting middleware
-if settings.RATE_LIMIT_ENABLED:
-    app.add_middleware(
-        RateLimitMiddleware,
-        enabled=settings.RATE_LIMIT_ENABLED,
-    )
-
-# Подключаем middleware авторизации
-app.add_middleware(AuthMiddleware)
-
-# Подключаем роутеры
-app.include_router(auth.router)
-app.include_router(admin.router)
-app.include_router(prompts.router)
-
 
-@app.on_event("startup")
-def on_startup() -> None:
-    """Инициализация приложения при старте."""
+def _migrate_existing_users() -> None:
+    """Миграция данных существующих пользователей при старте."""
     # Примечание: создание таблиц теперь выполняется через Alembic миграции
     # Не используем Base.metadata.create_all() - это делается через alembic upgrade head
     
@@ -97,6 +80,74 @@ def on_startup() -> None:
         db.close()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка приложения: фоновые потоки, очередь задач, сторож event loop."""
+    _migrate_existing_users()
+    # Единственный писатель SQLite: запускается первым и останавливается последним,
+    # остальные фоновые потоки пишут через него
+    db_writer.start()
+    # Фоновая запись буферизованных счётчиков
+    write_buffer.start()
+    # Фоновое прореживание истории версий
+    version_compactor.start()
+    # Очередь производной работы после записи (версии промптов)
+    task_queue.start()
+    # Сторож задержки event loop (lifespan выполняется в потоке loop)
+    if settings.LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start(asyncio.get_running_loop())
+    try:
+        yield
+    finally:
+        loop_watchdog.stop()
+        # Дожидаемся отложенных задач в отдельном потоке, чтобы не блокировать loop
+        await asyncio.to_thread(task_queue.drain, settings.TASK_QUEUE_DRAIN_TIMEOUT_SECONDS)
+        version_compactor.stop()
+        write_buffer.stop()
+        db_writer.stop()
+
+
+app = FastAPI(title="autookk backend", version="1.0.0", lifespan=lifespan)
+
+# CORS middleware (должен быть первым)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=settings.get_allowed_origins(),
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+    # Курсор следующей страницы истории версий
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Rate limiting middleware
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        enabled=settings.RATE_LIMIT_ENABLED,
+    )
+
+# Профилирование по запросу администратора: добавляется раньше AuthMiddleware,
+# поэтому выполняется внутри неё и видит request.state.user
+app.add_middleware(ProfilerMiddleware)
+
+# Подключаем middleware авторизации
+app.add_middleware(AuthMiddleware)
+
+# Admission control добавляется последним — внешний слой: при перегрузке запрос
+# отклоняется до проверки сессии в БД
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+
+# Подключаем роутеры
+app.include_router(auth.router)
+app.include_router(admin.router)
+app.include_router(prompts.router)
+app.include_router(bundle.router)
+# Собранный фронтенд (/, /static/...) — последним, после API
+app.include_router(frontend.router)
+
+
 @app.get("/api/health")
 def health() -> dict:
     """Проверка здоровья приложения."""
@@ -6,7 +6,8 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
 from .auth_crud import get_session_by_token
-from .db import SessionLocal
+from .db import ReadSessionLocal
+from .session_tokens import decode_session_token, is_signed_token, revocation_registry
 from .settings import settings
 
 
@@ -26,7 +27,10 @@ class AuthMiddleware(BaseHTTPMiddleware):
         "/openapi.json",
         "/redoc",
         "/version.json",
+        "/static/",
     ]
+    # Страница фронтенда (сравнение на точное совпадение: "/" — префикс любого пути)
+    PUBLIC_PAGES = {"/", "/index.html"}
     
     async def dispatch(self, request: Request, call_next):
         # Проверяем, нужна ли авторизация для этого роута
@@ -34,7 +38,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         method = request.method
         
         # Публичные роуты (всегда доступны, не требуют проверки токена)
-        is_public = any(path.startswith(route) for route in self.PUBLIC_ROUTES)
+        is_public = path in self.PUBLIC_PAGES or any(path.startswith(route) for route in self.PUBLIC_ROUTES)
         
         if is_public:
             return await call_next(request)
@@ -52,8 +56,31 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 media_type="application/json"
             )
         
+        # Подписанный токен проверяем без БД: подпись, срок и in-memory реестр отзывов
+        if is_signed_token(session_token):
+            claims = decode_session_token(session_token)
+            if claims is None:
+                return Response(
+                    content='{"detail":"Invalid or expired session"}',
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    media_type="application/json"
+                )
+            revocation_registry.maybe_refresh()
+            if revocation_registry.is_revoked(claims.session_id):
+                return Response(
+                    content='{"detail":"Invalid or expired session"}',
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    media_type="application/json"
+                )
+            user = revocation_registry.get_user(claims.user_id)
+            if user is not None:
+                request.state.user = user
+                request.state.session = claims
+                return await call_next(request)
+            # Пользователя ещё нет в снимке (создан другим воркером) — проверяем через БД
+        
         # Проверяем сессию в БД
-        db = SessionLocal()
+        db = ReadSessionLocal()
         try:
             session = get_session_by_token(db, session_token)
             if not session:
@@ -0,0 +1,195 @@
+import threading
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .catalog import CatalogEntry, prompt_catalog
+
+# 128 хэш-функций = 32 полосы LSH по 4 строки: пары с Jaccard ~0.5 становятся
+# кандидатами с вероятностью ~0.87, с Jaccard ~0.2 — ~0.05
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_WORDS = 3
+
+# Простое число больше 2^32: (a * h + b) mod p для 32-битных хэшей шинглов
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# Параметры перестановок фиксированы: подписи, сохранённые в БД, остаются сравнимыми
+_rng = np.random.RandomState(20261019)
+_PERM_A = _rng.randint(1, 2**31 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_PERM_B = _rng.randint(0, 2**31 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+# Ограничение памяти на матрицу перестановок (NUM_PERM x chunk)
+_SHINGLE_CHUNK = 4096
+
+
+class SimilarPrompt(NamedTuple):
+    id: int
+    slug: str
+    name: str
+    folder: Optional[str]
+    similarity: float
+
+
+class DuplicateGroup(NamedTuple):
+    similarity: float  # минимальное сходство среди найденных пар группы
+    # у каждого промпта — максимальное сходство с другим промптом группы
+    prompts: List[SimilarPrompt]
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """32-битные хэши словесных шинглов (по SHINGLE_WORDS слов) нормализованного текста."""
+    words = text.casefold().split()
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+    )
+
+
+def minhash_signature(text: str) -> bytes:
+    """MinHash-подпись текста: NUM_PERM значений uint32 (сохраняется в Prompt.minhash)."""
+    hashes = _shingle_hashes(text)
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(hashes), _SHINGLE_CHUNK):
+        chunk = hashes[start:start + _SHINGLE_CHUNK]
+        permuted = (np.outer(_PERM_A, chunk) + _PERM_B[:, None]) % _PRIME & _MAX_HASH
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype("<u4").tobytes()
+
+
+def _signature_array(entry: CatalogEntry) -> np.ndarray:
+    data = entry.minhash if entry.minhash else minhash_signature(entry.text)
+    return np.frombuffer(data, dtype="<u4")
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, left: int, right: int) -> None:
+        self.parent[self.find(left)] = self.find(right)
+
+
+class MinHashIndex:
+    """
+    Подписи MinHash всех промптов в виде матрицы NumPy (n x NUM_PERM).
+    Обновляется по уведомлениям каталога; матрица пересобирается лениво при первом запросе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, CatalogEntry] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._matrix: np.ndarray = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._dirty = False
+
+    def on_catalog_change(self, upserted: List[CatalogEntry], removed: List[CatalogEntry]) -> None:
+        with self._lock:
+            for entry in removed:
+                self._entries.pop(entry.id, None)
+                self._signatures.pop(entry.id, None)
+            for entry in upserted:
+                self._entries[entry.id] = entry
+                self._signatures[entry.id] = _signature_array(entry)
+            self._dirty = True
+
+    def _snapshot(self):
+        with self._lock:
+            if self._dirty:
+                ids = sorted(self._signatures)
+                self._ids = np.array(ids, dtype=np.int64)
+                self._matrix = (
+                    np.stack([self._signatures[prompt_id] for prompt_id in ids])
+                    if ids else np.empty((0, NUM_PERM), dtype=np.uint32)
+                )
+                self._dirty = False
+            return self._ids, self._matrix, self._entries
+
+    def _describe(self, entries: Dict[int, CatalogEntry], prompt_id: int, similarity: float) -> SimilarPrompt:
+        entry = entries[prompt_id]
+        return SimilarPrompt(entry.id, entry.slug, entry.name, entry.folder, round(similarity, 4))
+
+    def similar(self, prompt_id: int, threshold: float = 0.5, limit: int = 10) -> List[SimilarPrompt]:
+        """Промпты с оценкой Jaccard не ниже threshold, по убыванию сходства."""
+        ids, matrix, entries = self._snapshot()
+        positions = np.flatnonzero(ids == prompt_id)
+        if not len(positions):
+            return []
+        # Доля совпавших позиций подписи — несмещённая оценка коэффициента Jaccard
+        scores = (matrix == matrix[positions[0]]).mean(axis=1)
+        scores[positions[0]] = -1.0
+        candidates = np.flatnonzero(scores >= threshold)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")][:limit]
+        return [self._describe(entries, int(ids[i]), float(scores[i])) for i in top]
+
+    def duplicates(self, threshold: float = 0.8) -> List[DuplicateGroup]:
+        """
+        Группы похожих промптов. Кандидаты — пары, совпавшие хотя бы в одной полосе LSH
+        (группировка строк полосы через np.unique и одну сортировку), затем точная проверка
+        по подписям.
+        """
+        ids, matrix, entries = self._snapshot()
+        if len(ids) < 2:
+            return []
+
+        pairs = set()
+        bands = matrix.reshape(len(ids), LSH_BANDS, LSH_ROWS)
+        for band in range(LSH_BANDS):
+            _, inverse, counts = np.unique(bands[:, band, :], axis=0, return_inverse=True, return_counts=True)
+            # Позиции, отсортированные по корзине (stable — внутри корзины по возрастанию),
+            # режутся на корзины по границам counts: O(n log n) на полосу вместо O(n) на корзину
+            order = np.argsort(inverse.ravel(), kind="stable")
+            for members in np.split(order, np.cumsum(counts)[:-1]):
+                if len(members) < 2:
+                    continue
+                pairs.update(
+                    (int(members[i]), int(members[j]))
+                    for i in range(len(members)) for j in range(i + 1, len(members))
+                )
+        if not pairs:
+            return []
+
+        left, right = np.array(sorted(pairs)).T
+        scores = (matrix[left] == matrix[right]).mean(axis=1)
+        keep = scores >= threshold
+
+        groups = _UnionFind()
+        group_scores: Dict[int, float] = {}
+        best: Dict[int, float] = {}
+        for i, j, score in zip(left[keep].tolist(), right[keep].tolist(), scores[keep].tolist()):
+            groups.union(i, j)
+            best[i] = max(best.get(i, 0.0), score)
+            best[j] = max(best.get(j, 0.0), score)
+        for i, score in zip(left[keep].tolist(), scores[keep].tolist()):
+            root = groups.find(i)
+            group_scores[root] = min(group_scores.get(root, 1.0), score)
+
+        members: Dict[int, List[int]] = {}
+        for position in groups.parent:
+            members.setdefault(groups.find(position), []).append(position)
+
+        result = [
+            DuplicateGroup(
+                similarity=round(group_scores[root], 4),
+                prompts=[self._describe(entries, int(ids[p]), best[p]) for p in sorted(positions)],
+            )
+            for root, positions in members.items()
+        ]
+        result.sort(key=lambda group: (-group.similarity, -len(group.prompts)))
+        return result
+
+
+# Глобальный индекс MinHash (один на процесс)
+minhash_index = MinHashIndex()
+prompt_catalog.add_listener(minhash_index.on_catalog_change)
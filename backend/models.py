@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, func, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import relationship
 
 from .db import Base
@@ -8,14 +8,17 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    telegram_id = Column(Integer, unique=True, index=True, nullable=False)
-    username = Column(String(255), nullable=True)
+    # Telegram id не помещаются в 32 бита
+    telegram_id = Column(BigInteger, unique=True, index=True, nullable=False)
+    # Поиск пользователя статического входа (password_auth)
+    username = Column(String(255), nullable=True, index=True)
     first_name = Column(String(255), nullable=True)
     last_name = Column(String(255), nullable=True)
     role = Column(String(50), default="user", nullable=False)  # Оставляем для обратной совместимости
     status = Column(String(50), default="pending", nullable=False)  # pending, active, blocked
     access_level = Column(String(50), default="user", nullable=False)  # admin, tech, user
-    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # Сортировка списка пользователей в админке
+    created_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
     last_login_at = Column(DateTime, nullable=True)
     
     sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan")
@@ -36,14 +39,24 @@ class Session(Base):
 
 class Prompt(Base):
     __tablename__ = "prompts"
+    __table_args__ = (
+        # Фильтр по папке с сортировкой по имени без временного B-дерева
+        Index("ix_prompts_folder_name", "folder", "name"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     slug = Column(String(255), unique=True, index=True, nullable=False)
-    name = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False, index=True)
     text = Column(Text, nullable=False)
     folder = Column(String(255), nullable=True)
     tags = Column(String(512), nullable=True)
     importance = Column(String(50), default="normal", nullable=True)
+    # Счётчик изменений: база для PATCH (оптимистическая блокировка)
+    revision = Column(Integer, default=1, server_default="1", nullable=False)
+    # MinHash-подпись текста для поиска похожих промптов (128 x uint32)
+    minhash = Column(LargeBinary, nullable=True)
+    # SHA-256 текста — ключ в content_stats
+    content_hash = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(
         DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
@@ -52,14 +65,81 @@ class Prompt(Base):
 
 class PromptVersion(Base):
     __tablename__ = "prompt_versions"
+    __table_args__ = (
+        # Покрывает и фильтр по prompt_id, и сортировку/пагинацию по version
+        Index("ix_prompt_versions_prompt_id_version", "prompt_id", "version"),
+        # Чтение «на момент времени»: последняя версия промпта с created_at <= as_of.
+        # id в индексе (в SQLite — неявный rowid) — подзапрос не обращается к таблице
+        Index(
+            "ix_prompt_versions_prompt_id_created_at", "prompt_id", "created_at",
+            postgresql_include=["id"],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    prompt_id = Column(Integer, ForeignKey("prompts.id"), index=True, nullable=False)
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=False)
     version = Column(Integer, nullable=False)  # 1,2,3...
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # Каждое сохранение — своя строка. Сохранения в окне объединения получают тот же номер
+    # версии, предыдущее помечается superseded_at и в истории не показывается
+    superseded_at = Column(DateTime, nullable=True)
     updated_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Метаданные, вычисляемые при записи (чтобы история не загружала тексты)
+    content_length = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    lines_added = Column(Integer, nullable=True)
+    lines_removed = Column(Integer, nullable=True)
+
+
+class PromptSection(Base):
+    """Раздел промпта (Markdown-заголовок) с байтовыми смещениями в UTF-8 тексте."""
+    __tablename__ = "prompt_sections"
+    __table_args__ = (
+        Index("ix_prompt_sections_prompt_id_anchor", "prompt_id", "anchor"),
+        # Оглавление промпта по порядку
+        Index("ix_prompt_sections_prompt_id_position", "prompt_id", "position"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    level = Column(Integer, nullable=False)
+    title = Column(String(512), nullable=False)
+    anchor = Column(String(512), nullable=False)
+    line = Column(Integer, nullable=False)
+    start_byte = Column(Integer, nullable=False)
+    end_byte = Column(Integer, nullable=False)
+
+
+class ContentStats(Base):
+    """Размер текста и приблизительное число токенов; считается один раз на уникальный хэш."""
+    __tablename__ = "content_stats"
+
+    content_hash = Column(String(64), primary_key=True)
+    char_count = Column(Integer, nullable=False)
+    word_count = Column(Integer, nullable=False)
+    token_count = Column(Integer, nullable=False)
+
+
+class CatalogState(Base):
+    """
+    Счётчик поколений каталога промптов (одна строка id=1).
+    Увеличивается при каждой записи в prompts — по нему воркеры узнают об изменениях.
+    """
+    __tablename__ = "prompt_catalog_state"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, default=0, nullable=False)
 
 
+class PromptUsage(Base):
+    """Агрегированные счётчики использования промпта пользователем (пишутся батчами)."""
+    __tablename__ = "prompt_usage"
 
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    prompt_id = Column(Integer, ForeignKey("prompts.id"), primary_key=True, index=True)
+    view_count = Column(Integer, default=0, nullable=False)
+    copy_count = Column(Integer, default=0, nullable=False)
+    last_used_at = Column(DateTime, nullable=True)
@@ -0,0 +1,63 @@
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple
+
+# Markdown-заголовок: от 1 до 6 решёток, пробел, текст (как в editorOutline.js, но до h6)
+_HEADING_RE = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+
+class Section(NamedTuple):
+    position: int
+    level: int
+    title: str
+    anchor: str
+    line: int  # номер строки заголовка (с 0)
+    start_byte: int  # смещение начала заголовка в UTF-8
+    end_byte: int  # смещение начала следующего заголовка того же или более высокого уровня
+
+
+def make_anchor(title: str) -> str:
+    """
+    Якорь заголовка в стиле GitHub: нижний регистр, буквы/цифры (включая кириллицу),
+    пробелы заменяются на дефисы, прочая пунктуация удаляется.
+    """
+    title = unicodedata.normalize("NFC", title).strip().lower()
+    anchor = "".join(ch for ch in title if ch.isalnum() or ch in " -_")
+    anchor = re.sub(r"\s", "-", anchor)
+    return anchor or "section"
+
+
+def extract_outline(text: str) -> List[Section]:
+    """Построить оглавление Markdown-текста с байтовыми смещениями разделов."""
+    headings = []
+    seen: Dict[str, int] = {}
+    offset = 0
+    in_fence = False
+
+    for line_no, line in enumerate(text.splitlines(keepends=True)):
+        stripped = line.rstrip("\r\n")
+        if _FENCE_RE.match(stripped):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = _HEADING_RE.match(stripped)
+            if match:
+                title = match.group(2)
+                anchor = make_anchor(title)
+                # Повторяющиеся заголовки получают суффиксы -1, -2, ...
+                count = seen.get(anchor, 0)
+                seen[anchor] = count + 1
+                if count:
+                    anchor = f"{anchor}-{count}"
+                headings.append((len(match.group(1)), title, anchor, line_no, offset))
+        offset += len(line.encode("utf-8"))
+
+    sections = []
+    for index, (level, title, anchor, line_no, start) in enumerate(headings):
+        end = offset
+        for next_level, _, _, _, next_start in headings[index + 1:]:
+            if next_level <= level:
+                end = next_start
+                break
+        sections.append(Section(index, level, title, anchor, line_no, start, end))
+    return sections
@@ -0,0 +1,256 @@
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from .settings import settings
+
+# Запрос профилируется по заголовку X-Profile: 1 или параметру ?_profile=1 (только для admin)
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_PARAM = "_profile"
+# Значения флага, включающие профилирование (X-Profile: 0 / ?_profile=false — выключено)
+_TRUTHY = {"1", "true", "yes", "on"}
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SITE_MARKERS = (os.sep + "site-packages" + os.sep, os.sep + "dist-packages" + os.sep)
+# Сколько строк попадает в топы функций и аллокаций
+_TOP_N = 30
+# Потоки, в которых Starlette/FastAPI выполняют синхронные эндпоинты и зависимости
+_WORKER_THREAD_PREFIX = "AnyIO worker thread"
+
+# Аллокации самого профайлера в сводку не попадают
+_OWN_ALLOCATIONS = (
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for marker in _SITE_MARKERS:
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        if filename.startswith(_APP_DIR):
+            filename = "backend" + filename[len(_APP_DIR):]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> Tuple[Tuple[str, ...], bool]:
+    """Стек от корня к листу и признак, что в нём есть код приложения."""
+    labels: List[str] = []
+    in_app = False
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(_APP_DIR):
+            in_app = True
+        labels.append(_frame_label(code))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels), in_app
+
+
+class _Sampler(threading.Thread):
+    """
+    Сэмплирующий профайлер: раз в interval снимает стеки потока event loop и
+    рабочих потоков AnyIO, выполняющих код приложения (синхронные эндпоинты и зависимости).
+    Если параллельно выполняются другие синхронные запросы, их стеки тоже попадут в профиль.
+    """
+
+    def __init__(self, interval: float, loop_thread_id: int):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.loop_thread_id = loop_thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            workers = {
+                thread.ident for thread in threading.enumerate()
+                if thread.name.startswith(_WORKER_THREAD_PREFIX)
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.loop_thread_id and thread_id not in workers:
+                    continue
+                stack, in_app = _stack(frame)
+                if thread_id == self.loop_thread_id or in_app:
+                    self.stacks[stack] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfiler:
+    """
+    Профилирование отдельных запросов по запросу администратора.
+    Одновременно профилируется не больше одного запроса; результаты хранятся
+    в кольцевом буфере последних PROFILER_RING_SIZE профилей.
+    """
+
+    def __init__(self, ring_size: int, interval: float):
+        self.interval = interval
+        self._busy = threading.Lock()
+        self._profiles: Deque[dict] = deque(maxlen=ring_size)
+        self._ids = itertools.count(1)
+
+    def try_begin(self) -> Optional[dict]:
+        """Начать профилирование; None, если уже профилируется другой запрос."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(settings.PROFILER_TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.take_snapshot()
+        sampler = _Sampler(self.interval, threading.get_ident())
+        sampler.start()
+        return {
+            "id": next(self._ids),
+            "sampler": sampler,
+            "baseline": baseline,
+            "started_tracing": started_tracing,
+            "started_at": datetime.utcnow(),
+            "started": time.perf_counter(),
+        }
+
+    def finish(self, handle: dict, method: str, path: str, status: Optional[int], user: str) -> dict:
+        duration = time.perf_counter() - handle["started"]
+        sampler: _Sampler = handle["sampler"]
+        try:
+            sampler.stop()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+            current, peak = tracemalloc.get_traced_memory()
+            if handle["started_tracing"]:
+                tracemalloc.stop()
+        finally:
+            self._busy.release()
+
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in sampler.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+
+        allocations = [
+            {
+                "location": str(stat.traceback[0]),
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(handle["baseline"].filter_traces(_OWN_ALLOCATIONS), "lineno")[:_TOP_N]
+            if stat.size_diff
+        ]
+
+        profile = {
+            "id": handle["id"],
+            "method": method,
+            "path": path,
+            "status": status,
+            "user": user,
+            "started_at": handle["started_at"].isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "sample_interval_ms": self.interval * 1000,
+            "samples": sampler.samples,
+            "self": [{"function": label, "samples": count} for label, count in self_counts.most_common(_TOP_N)],
+            "total": [{"function": label, "samples": count} for label, count in total_counts.most_common(_TOP_N)],
+            "stacks": [{"stack": list(stack), "samples": count} for stack, count in sampler.stacks.most_common()],
+            "memory": {
+                "peak_bytes": peak,
+                "current_bytes": current,
+                "top_allocations": allocations,
+            },
+        }
+        self._profiles.append(profile)
+        return profile
+
+    def list(self) -> List[dict]:
+        fields = ("id", "method", "path", "status", "user", "started_at", "duration_ms", "samples")
+        return [{key: profile[key] for key in fields} for profile in reversed(self._profiles)]
+
+    def get(self, profile_id: int) -> Optional[dict]:
+        for profile in self._profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+
+def collapsed_stacks(profile: dict) -> str:
+    """Профиль в формате folded stacks (flamegraph.pl, speedscope)."""
+    return "".join(
+        ";".join(item["stack"]) + f" {item['samples']}\n" for item in profile["stacks"]
+    )
+
+
+# Глобальный профайлер (один на процесс)
+request_profiler = RequestProfiler(
+    ring_size=settings.PROFILER_RING_SIZE,
+    interval=settings.PROFILER_SAMPLE_INTERVAL_SECONDS,
+)
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware профилирования по запросу. Подключается до AuthMiddleware
+    (то есть выполняется внутри неё), чтобы видеть request.state.user.
+
+    Без флага профилирования — только проверка заголовков и query string.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        query_string = scope.get("query_string", b"")
+        # Быстрая проверка подстрокой, разбор query string — только если параметр может быть
+        if PROFILE_QUERY_PARAM.encode("ascii") in query_string:
+            for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+                if name == PROFILE_QUERY_PARAM and value.strip().lower() in _TRUTHY:
+                    return True
+        return any(
+            name == PROFILE_HEADER and value.decode("latin-1").strip().lower() in _TRUTHY
+            for name, value in scope["headers"]
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        user = scope.get("state", {}).get("user")
+        if user is None or user.access_level != "admin":
+            await self.app(scope, receive, send)
+            return
+
+        handle = request_profiler.try_begin()
+        if handle is None:
+            await self.app(scope, receive, send)
+            return
+
+        response_status = None
+
+        async def send_with_profile_id(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(handle["id"]).encode("ascii")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            request_profiler.finish(handle, scope["method"], scope["path"], response_status, user.username)
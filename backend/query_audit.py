@@ -0,0 +1,295 @@
+"""
+Аудит планов запросов к БД.
+
+Поднимает временную SQLite-базу (alembic upgrade head), заполняет её промптами,
+версиями и пользователями, прогоняет через приложение типовые сценарии (роутеры,
+crud.py, auth_crud.py) и перехватывает все SELECT/UPDATE/DELETE. Для каждого
+запроса снимается EXPLAIN QUERY PLAN; полный просмотр таблицы (SCAN без индекса)
+и временное B-дерево для сортировки/группировки (USE TEMP B-TREE) считаются
+регрессией, если запрос не в списке ALLOWED_FULL_SCANS.
+
+CLI (отдельным процессом: настройки читаются из окружения при импорте backend):
+    python -m backend.query_audit [--verbose]
+
+Код возврата 1 — найдены запросы с неподходящим планом.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Сколько данных засеять: на пустых таблицах планировщик SQLite ведёт себя так же,
+# но с данными сценарии проходят по реальным веткам (пагинация, поиск, дубликаты)
+SEED_PROMPTS = 120
+SEED_FOLDERS = 8
+SEED_USERS = 40
+
+# Запросы, которым полный просмотр нужен по смыслу: origin -> причина
+ALLOWED_FULL_SCANS = {
+    "backend/main.py:_migrate_existing_users": "однократная миграция данных пользователей при старте",
+    "backend/catalog.py:PromptCatalog._reload": "каталог сверяет с БД штампы всех промптов",
+    "backend/session_tokens.py:SessionRevocationRegistry.refresh": "реестр загружает всех пользователей в память",
+    "backend/version_retention.py:compact_prompt_versions": "фоновое прореживание истории раз в час",
+}
+
+_PLAN_SCAN = "SCAN "
+_PLAN_TEMP_BTREE = "USE TEMP B-TREE"
+_AUDITED_PREFIXES = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+class CapturedQuery:
+    __slots__ = ("statement", "parameters", "origins")
+
+    def __init__(self, statement: str, parameters):
+        self.statement = statement
+        self.parameters = parameters
+        self.origins: List[str] = []
+
+
+class QueryRecorder:
+    """Слушатель before_cursor_execute: уникальные запросы и места в коде, откуда они пришли."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries: Dict[str, CapturedQuery] = {}
+
+    @staticmethod
+    def _origin() -> str:
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(str(BACKEND_DIR)) and filename not in (__file__, str(BACKEND_DIR / "db.py")):
+                relative = Path(filename).relative_to(BACKEND_DIR.parent).as_posix()
+                # Генераторы и comprehension приписываются объемлющей функции
+                qualname = frame.f_code.co_qualname.split(".<locals>", 1)[0]
+                return f"{relative}:{qualname}"
+            frame = frame.f_back
+        return "?"
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(_AUDITED_PREFIXES):
+            return
+        if executemany and parameters:
+            parameters = parameters[0]
+        origin = self._origin()
+        with self._lock:
+            captured = self.queries.get(statement)
+            if captured is None:
+                captured = self.queries[statement] = CapturedQuery(statement, parameters)
+            if origin not in captured.origins:
+                captured.origins.append(origin)
+
+
+def plan_problems(plan: Sequence[str]) -> List[str]:
+    """Строки плана, означающие полный просмотр таблицы или временное B-дерево."""
+    problems = []
+    for detail in plan:
+        if _PLAN_TEMP_BTREE in detail:
+            problems.append(detail)
+        elif (
+            detail.startswith(_PLAN_SCAN)
+            and " USING " not in detail
+            and not detail.startswith(("SCAN CONSTANT ROW", "SCAN ("))
+        ):
+            problems.append(detail)
+    return problems
+
+
+def _prepare_environment(database_path: str) -> None:
+    """Окружение до импорта backend: временная БД, статический вход, без лимитов и фоновых сторожей."""
+    import bcrypt
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    os.environ["STATIC_LOGIN"] = "audit"
+    os.environ["STATIC_PASSWORD_HASH"] = bcrypt.hashpw(b"audit", bcrypt.gensalt(4)).decode()
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["ADMISSION_CONTROL_ENABLED"] = "false"
+    os.environ["LOOP_WATCHDOG_ENABLED"] = "false"
+    # Чтения as_of разрешены вплоть до текущего момента
+    os.environ["VERSION_COALESCE_SECONDS"] = "0"
+    os.environ["VERSION_AS_OF_SETTLE_SECONDS"] = "0"
+    os.environ["BUNDLE_DIR"] = str(Path(database_path).parent / "bundles")
+
+
+def _migrate() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+
+
+def _seed() -> None:
+    from . import auth_crud, crud
+    from .db import SessionLocal
+    from .schemas import PromptCreate, PromptUpdate
+
+    db = SessionLocal()
+    try:
+        for index in range(SEED_USERS):
+            auth_crud.create_user(db, telegram_id=10_000_000_000 + index, username=f"user{index}")
+        for index in range(SEED_PROMPTS):
+            prompt = crud.create_prompt(db, PromptCreate(
+                name=f"Prompt {index:03d}",
+                text=f"# Prompt {index}\nhello {{{{name}}}} number {index}\n## Details\nbody {index % 7}",
+                folder=f"folder-{index % SEED_FOLDERS}",
+            ))
+            if index % 10 == 0:
+                crud.update_prompt(db, prompt.slug, PromptUpdate(text=prompt.text + "\nupdated"))
+    finally:
+        db.close()
+
+
+def _run_scenarios() -> None:
+    """Запросы так, как их выполняет приложение: HTTP-сценарии и прямые вызовы crud/auth_crud."""
+    from fastapi.testclient import TestClient
+
+    from . import auth_crud, crud
+    from .db import SessionLocal
+    from .main import app
+    from .session_tokens import revocation_registry
+    from .version_retention import compact_prompt_versions
+
+    with TestClient(app) as client:
+        def call(method: str, url: str, **kwargs):
+            # Упавший сценарий не должен молча выпасть из аудита
+            response = client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json() if response.content else None
+
+        token = call("POST", "/api/auth/password", json={"login": "audit", "password": "audit"})["token"]
+        client.cookies.set("session_token", token)
+
+        call("GET", "/api/auth/me")
+        call("GET", "/api/prompts")
+        call("GET", "/api/prompts", params={"folder": "folder-3"})
+        call("GET", "/api/prompts", params={"search": "number 4"})
+        call("GET", "/api/prompts/suggest", params={"q": "prompt 01"})
+        call("GET", "/api/prompts/duplicates")
+        prompt = call("GET", "/api/prompts/prompt-010")
+        call("GET", "/api/prompts/prompt-010/similar")
+        client.get("/api/prompts/prompt-010/raw").raise_for_status()
+        sections = call("GET", "/api/prompts/prompt-010/sections")
+        if sections:
+            client.get(f"/api/prompts/prompt-010/sections/{sections[0]['anchor']}").raise_for_status()
+        call("POST", "/api/prompts/prompt-010/render", json={"variables": {"name": "x"}})
+        call("POST", "/api/prompts/render", json={"items": [{"slug": "prompt-011", "variables": {"name": "x"}}]})
+        call("POST", "/api/prompts/prompt-010/usage", json={"kind": "view"})
+        call("GET", "/api/prompts/prompt-010/usage")
+        as_of = datetime.utcnow().isoformat()
+        call("GET", "/api/prompts/prompt-010", params={"as_of": as_of})
+        call("GET", "/api/prompts/snapshot", params={"as_of": as_of})
+        call("GET", "/api/prompts/snapshot", params={"as_of": as_of, "folder": "folder-3"})
+        call("GET", "/api/prompts/snapshot", params={"as_of": as_of, "slug": ["prompt-001", "prompt-002"]})
+
+        created = call("POST", "/api/prompts", json={"name": "Audit", "text": "audit text", "folder": "folder-1"})
+        updated = call("PUT", f"/api/prompts/{created['slug']}", json={"text": "audit text v2"})
+        call("PATCH", f"/api/prompts/{created['slug']}", json={
+            "base_revision": updated["revision"], "ops": [{"start": 0, "end": 0, "text": "x"}],
+        })
+        versions = call("GET", f"/api/prompts/{prompt['id']}/versions", params={"limit": 1})
+        call("GET", f"/api/prompts/{prompt['id']}/versions", params={"before": 2})
+        if versions:
+            call("GET", f"/api/prompts/{prompt['id']}/versions/{versions[0]['id']}")
+        call("DELETE", f"/api/prompts/{created['slug']}")
+
+        call("GET", "/api/bundle/manifest")
+        users = call("GET", "/api/admin/users")
+        call("PATCH", f"/api/admin/users/{users[-1]['id']}", json={"status": "active"})
+        call("POST", "/api/auth/logout")
+
+    db = SessionLocal()
+    try:
+        crud.list_prompts(db)
+        crud.list_prompts(db, folder="folder-2")
+        crud.list_prompts(db, search="hello")
+        crud.get_prompt_by_slug(db, "prompt-001")
+        auth_crud.get_user_by_telegram_id(db, 10_000_000_001)
+        session = auth_crud.create_session(db, user_id=1)
+        auth_crud.get_session_by_token(db, session.token)
+        auth_crud.revoke_session(db, session.token)
+        compact_prompt_versions(db)
+    finally:
+        db.close()
+    revocation_registry.refresh()
+
+
+def _explain(queries: Dict[str, CapturedQuery]) -> List[Tuple[CapturedQuery, List[str]]]:
+    from .db import engine
+
+    results = []
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for captured in queries.values():
+            cursor.execute("EXPLAIN QUERY PLAN " + captured.statement, captured.parameters or ())
+            results.append((captured, [row[-1] for row in cursor.fetchall()]))
+    finally:
+        connection.close()
+    return results
+
+
+def _allowed_reason(origins: Sequence[str]) -> Optional[str]:
+    reasons = [ALLOWED_FULL_SCANS.get(origin) for origin in origins]
+    if reasons and all(reasons):
+        return "; ".join(dict.fromkeys(reasons))
+    return None
+
+
+def audit(verbose: bool = False) -> int:
+    """Прогнать аудит; возвращает число запросов с неподходящим планом."""
+    with tempfile.TemporaryDirectory(prefix="query-audit-") as tmp_dir:
+        _prepare_environment(os.path.join(tmp_dir, "audit.db"))
+        _migrate()
+        _seed()
+
+        from sqlalchemy import event
+
+        from .db import engine, read_engine, writer_engine
+
+        # Чтения, запись писателем и остальные сессии идут через разные движки
+        engines = list(dict.fromkeys((engine, read_engine, writer_engine)))
+        recorder = QueryRecorder()
+        for audited in engines:
+            event.listen(audited, "before_cursor_execute", recorder)
+        try:
+            _run_scenarios()
+        finally:
+            for audited in engines:
+                event.remove(audited, "before_cursor_execute", recorder)
+
+        failures = 0
+        for captured, plan in _explain(recorder.queries):
+            problems = plan_problems(plan)
+            reason = _allowed_reason(captured.origins) if problems else None
+            failed = bool(problems) and reason is None
+            failures += failed
+            if not (failed or verbose):
+                continue
+            status = "FAIL" if failed else ("ALLOWED" if problems else "OK")
+            print(f"[{status}] {', '.join(captured.origins)}")
+            print("    " + " ".join(captured.statement.split()))
+            for detail in plan:
+                print(f"      {detail}")
+            if reason:
+                print(f"    допустимо: {reason}")
+        print(f"Запросов: {len(recorder.queries)}, с неподходящим планом: {failures}")
+        return failures
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Проверить планы запросов приложения (EXPLAIN QUERY PLAN)")
+    parser.add_argument("--verbose", action="store_true", help="печатать планы всех запросов")
+    args = parser.parse_args(argv)
+    sys.exit(1 if audit(verbose=args.verbose) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,37 @@
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..db import get_db
+from ..admission import admission_controller
+from ..backup import (
+    BackupNotSupported,
+    create_snapshot,
+    gzip_chunks,
+    iter_incremental_export,
+    iter_snapshot_file,
+    snapshot_timestamp,
+)
+from ..db import get_read_db
+from ..db_writer import db_writer
 from ..dependencies import get_admin_user
+from ..loop_watchdog import loop_watchdog
 from ..models import User
+from ..profiler import collapsed_stacks, request_profiler
 from ..schemas import UserOut, UserUpdate
+from ..session_tokens import revocation_registry
+from ..single_flight import read_flight
+from ..task_queue import task_queue
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
 @router.get("/users", response_model=List[UserOut])
 def list_users(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     admin_user: User = Depends(get_admin_user),
 ):
     """
@@ -23,16 +41,8 @@ def list_users(
     return users
 
 
-@router.patch("/users/{user_id}", response_model=UserOut)
-def update_user(
-    user_id: int,
-    user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    admin_user: User = Depends(get_admin_user),
-):
-    """
-    Обновить статус или уровень доступа пользователя. Только для администраторов.
-    """
+def _apply_user_update(db: Session, user_id: int, user_update: UserUpdate) -> User:
+    """Изменить статус/уровень доступа; выполняется писателем БД."""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(
@@ -65,3 +75,127 @@ def update_user(
     db.commit()
     db.refresh(user)
     return user
+
+
+@router.patch("/users/{user_id}", response_model=UserOut)
+def update_user(
+    user_id: int,
+    user_update: UserUpdate,
+    admin_user: User = Depends(get_admin_user),
+):
+    """
+    Обновить статус или уровень доступа пользователя. Только для администраторов.
+    """
+    user = db_writer.call(_apply_user_update, user_id, user_update)
+    # Подписанные токены проверяются по снимку пользователей — обновляем его
+    revocation_registry.invalidate_users()
+    return user
+
+
+@router.get("/backup")
+async def backup_database(
+    since: Optional[datetime] = None,
+    admin_user: User = Depends(get_admin_user),
+):
+    """
+    Скачать бэкап базы (gzip). Только для администраторов.
+
+    Без since — полный снимок SQLite через online backup API (не блокирует чтение и запись).
+    С since — инкрементальная выгрузка NDJSON: промпты и версии, изменённые с этого момента.
+    Заголовок X-Snapshot-At — значение since для следующего инкрементального бэкапа.
+    """
+    snapshot_at = snapshot_timestamp()
+    stamp = snapshot_at.strftime("%Y%m%dT%H%M%S")
+    headers = {"X-Snapshot-At": snapshot_at.isoformat()}
+
+    if since is not None:
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        headers["Content-Disposition"] = f'attachment; filename="prompts-{stamp}.ndjson.gz"'
+        return StreamingResponse(
+            gzip_chunks(iter_incremental_export(since, snapshot_at)),
+            media_type="application/gzip",
+            headers=headers,
+        )
+
+    try:
+        snapshot_path = await run_in_threadpool(create_snapshot)
+    except BackupNotSupported as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    headers["Content-Disposition"] = f'attachment; filename="prompts-{stamp}.db.gz"'
+    return StreamingResponse(
+        gzip_chunks(iter_snapshot_file(snapshot_path)),
+        media_type="application/gzip",
+        headers=headers,
+    )
+
+
+@router.get("/admission")
+def get_admission_stats(admin_user: User = Depends(get_admin_user)):
+    """
+    Состояние admission control по классам маршрутов: активные запросы, глубина очереди,
+    число отклонённых (очередь полна / истёк срок ожидания). Только для администраторов.
+    """
+    return admission_controller.stats()
+
+
+@router.get("/writer")
+def get_db_writer_stats(admin_user: User = Depends(get_admin_user)):
+    """Статистика писателя БД: пачки, заданий в пачке, ошибки. Только для администраторов."""
+    return db_writer.stats()
+
+
+@router.get("/single-flight")
+def get_single_flight_stats(admin_user: User = Depends(get_admin_user)):
+    """Схлопывание одинаковых чтений промптов: вычислений и присоединившихся к ним запросов."""
+    return read_flight.stats()
+
+
+@router.get("/tasks")
+def get_task_queue_stats(admin_user: User = Depends(get_admin_user)):
+    """
+    Состояние очереди фоновых задач; recent_failures — задачи, упавшие после всех повторов,
+    с key (для diffstat версий — id промпта). Только для администраторов.
+    """
+    return task_queue.stats()
+
+
+@router.get("/profiles")
+def list_profiles(admin_user: User = Depends(get_admin_user)):
+    """
+    Последние профили запросов (кольцевой буфер). Только для администраторов.
+    Запрос профилируется, если администратор передал заголовок X-Profile: 1 или ?_profile=1.
+    """
+    return request_profiler.list()
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: int,
+    format: str = "json",
+    admin_user: User = Depends(get_admin_user),
+):
+    """Профиль запроса: JSON или folded stacks для flamegraph (format=collapsed)."""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(collapsed_stacks(profile))
+    return profile
+
+
+@router.get("/loop-lag")
+def get_loop_lag(
+    top: int = 20,
+    admin_user: User = Depends(get_admin_user),
+):
+    """
+    Гистограмма задержки event loop и стеки блокирующего кода. Только для администраторов.
+    """
+    return loop_watchdog.report(top=top)
+
+
+@router.delete("/loop-lag", status_code=status.HTTP_204_NO_CONTENT)
+def reset_loop_lag(admin_user: User = Depends(get_admin_user)):
+    """Сбросить накопленную статистику задержки event loop."""
+    loop_watchdog.reset()
@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response, status
@@ -10,7 +12,7 @@ from ..auth_crud import (
     revoke_session,
     update_user_login_time,
 )
-from ..db import get_db
+from ..db_writer import db_writer
 from ..dependencies import get_current_user
 from ..schemas import TelegramAuthData, UserOut, AuthResponse, PasswordLoginRequest
 from ..models import User
@@ -21,6 +23,105 @@ import bcrypt
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+# Отдельный ограниченный пул для bcrypt: проверка пароля занимает ~250 мс CPU
+# и не должна блокировать event loop или занимать весь общий threadpool
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.AUTH_HASH_WORKERS,
+    thread_name_prefix="auth-hash",
+)
+
+STATIC_USERNAME = "root_static_admin"
+
+
+def _auth_payload(user: User, session) -> dict:
+    """Сформировать тело ответа авторизации."""
+    return {
+        "token": session.token,
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "role": user.role,
+            "status": user.status,
+            "access_level": user.access_level,
+        }
+    }
+
+
+def _set_session_cookie(response: Response, token: str) -> None:
+    """Установить cookie с токеном сессии."""
+    response.set_cookie(
+        key=settings.SESSION_COOKIE_NAME,
+        value=token,
+        httponly=settings.cookie_httponly,
+        secure=settings.cookie_secure,
+        samesite=settings.cookie_samesite,
+        max_age=settings.SESSION_EXPIRES_DAYS * 24 * 60 * 60,  # в секундах
+        path="/",
+    )
+
+
+def _login_telegram_user(db: Session, data: TelegramAuthData) -> dict:
+    """
+    Создать/обновить пользователя Telegram и выдать сессию одной транзакцией.
+    Синхронная функция: выполняется писателем БД (db_writer).
+    """
+    user = get_user_by_telegram_id(db, telegram_id=data.id)
+    
+    if not user:
+        # Новый пользователь: создаём со status="pending", access_level="user"
+        user = create_user(
+            db,
+            telegram_id=data.id,
+            username=data.username,
+            first_name=data.first_name,
+            last_name=data.last_name,
+            commit=False,
+        )
+    else:
+        # Существующий пользователь: обновляем только данные профиля, НЕ меняем status и access_level
+        if data.username and data.username != user.username:
+            user.username = data.username
+        if data.first_name and data.first_name != user.first_name:
+            user.first_name = data.first_name
+        if data.last_name and data.last_name != user.last_name:
+            user.last_name = data.last_name
+    
+    update_user_login_time(db, user)
+    session = create_session(db, user_id=user.id, commit=False)
+    db.commit()
+    return _auth_payload(user, session)
+
+
+def _login_static_admin(db: Session) -> dict:
+    """
+    Найти или создать пользователя статического входа и выдать сессию одной транзакцией.
+    Синхронная функция: выполняется писателем БД (db_writer).
+    """
+    user = db.query(User).filter(User.username == STATIC_USERNAME).first()
+
+    if not user:
+        # Создаём пользователя с максимальными правами
+        user = create_user(
+            db,
+            telegram_id=0,
+            username=STATIC_USERNAME,
+            first_name=None,
+            last_name=None,
+            commit=False,
+        )
+    # Гарантируем, что у пользователя максимальные права
+    if user.status != "active":
+        user.status = "active"
+    if getattr(user, "role", None) != "admin":
+        user.role = "admin"
+    if user.access_level != "admin":
+        user.access_level = "admin"
+
+    update_user_login_time(db, user)
+    session = create_session(db, user_id=user.id, commit=False)
+    db.commit()
+    return _auth_payload(user, session)
+
 
 @router.get("/me", response_model=UserOut)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
@@ -34,7 +135,6 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def telegram_auth(
     payload: dict = Body(...),
     response: Response = None,
-    db: Session = Depends(get_db),
 ):
     """
     Авторизация через Telegram.
@@ -63,59 +163,15 @@ async def telegram_auth(
             detail="Invalid Telegram payload",
         )
 
-    user = get_user_by_telegram_id(db, telegram_id=data.id)
-    
-    if not user:
-        # Новый пользователь: создаём со status="pending", access_level="user"
-        user = create_user(
-            db,
-            telegram_id=data.id,
-            username=data.username,
-            first_name=data.first_name,
-            last_name=data.last_name,
-        )
-    else:
-        # Существующий пользователь: обновляем только данные профиля, НЕ меняем status и access_level
-        if data.username and data.username != user.username:
-            user.username = data.username
-        if data.first_name and data.first_name != user.first_name:
-            user.first_name = data.first_name
-        if data.last_name and data.last_name != user.last_name:
-            user.last_name = data.last_name
-        db.commit()
-        db.refresh(user)
-    
-    user = update_user_login_time(db, user)
-    session = create_session(db, user_id=user.id)
-    
-    # Устанавливаем cookie с токеном
-    response.set_cookie(
-        key=settings.SESSION_COOKIE_NAME,
-        value=session.token,
-        httponly=settings.cookie_httponly,
-        secure=settings.cookie_secure,
-        samesite=settings.cookie_samesite,
-        max_age=settings.SESSION_EXPIRES_DAYS * 24 * 60 * 60,  # в секундах
-        path="/",
-    )
-    
-    return {
-        "token": session.token,
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "role": user.role,
-            "status": user.status,
-            "access_level": user.access_level,
-        }
-    }
+    auth_payload = await db_writer.run(_login_telegram_user, data)
+    _set_session_cookie(response, auth_payload["token"])
+    return auth_payload
 
 
 @router.post("/password", response_model=AuthResponse)
 async def password_auth(
     data: PasswordLoginRequest,
     response: Response,
-    db: Session = Depends(get_db),
 ):
     """
     Авторизация по статическому логину и паролю.
@@ -135,9 +191,12 @@ async def password_auth(
             detail="Invalid login or password",
         )
 
-    # Проверяем пароль через bcrypt
+    # Проверяем пароль через bcrypt (в отдельном пуле, чтобы не блокировать event loop)
+    loop = asyncio.get_running_loop()
     try:
-        password_ok = bcrypt.checkpw(
+        password_ok = await loop.run_in_executor(
+            _hash_executor,
+            bcrypt.checkpw,
             data.password.encode("utf-8"),
             settings.STATIC_PASSWORD_HASH.encode("utf-8"),
         )
@@ -154,70 +213,15 @@ async def password_auth(
         )
 
     # Ищем или создаём пользователя для статического входа
-    static_username = "root_static_admin"
-    user = db.query(User).filter(User.username == static_username).first()
-
-    if not user:
-        # Создаём пользователя с максимальными правами
-        user = create_user(
-            db,
-            telegram_id=0,
-            username=static_username,
-            first_name=None,
-            last_name=None,
-        )
-        user.status = "active"
-        user.role = "admin"
-        user.access_level = "admin"
-        db.commit()
-        db.refresh(user)
-    else:
-        # Гарантируем, что у пользователя максимальные права
-        updated = False
-        if user.status != "active":
-            user.status = "active"
-            updated = True
-        if getattr(user, "role", None) != "admin":
-            user.role = "admin"
-            updated = True
-        if user.access_level != "admin":
-            user.access_level = "admin"
-            updated = True
-        if updated:
-            db.commit()
-            db.refresh(user)
-
-    user = update_user_login_time(db, user)
-    session = create_session(db, user_id=user.id)
-
-    # Устанавливаем cookie с токеном
-    response.set_cookie(
-        key=settings.SESSION_COOKIE_NAME,
-        value=session.token,
-        httponly=settings.cookie_httponly,
-        secure=settings.cookie_secure,
-        samesite=settings.cookie_samesite,
-        max_age=settings.SESSION_EXPIRES_DAYS * 24 * 60 * 60,  # в секундах
-        path="/",
-    )
-
-    return {
-        "token": session.token,
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "role": user.role,
-            "status": user.status,
-            "access_level": user.access_level,
-        }
-    }
+    auth_payload = await db_writer.run(_login_static_admin)
+    _set_session_cookie(response, auth_payload["token"])
+    return auth_payload
 
 
 @router.post("/logout")
 def logout(
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
 ):
     """
     Выход из системы. Отзывает текущую сессию и удаляет cookie.
@@ -226,7 +230,7 @@ def logout(
     session_token = request.cookies.get(settings.SESSION_COOKIE_NAME)
     
     if session_token:
-        revoke_session(db, session_token)
+        db_writer.call(revoke_session, session_token)
     
     # Удаляем cookie
     response.delete_cookie(key=settings.SESSION_COOKIE_NAME, path="/")
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from ..bundle import BUNDLE_MEDIA_TYPE, bundle_publisher
+from ..db import get_read_db
+from ..dependencies import get_active_user
+from ..models import User
+
+router = APIRouter(prefix="/api/bundle", tags=["bundle"])
+
+
+@router.get("/manifest")
+def get_bundle_manifest(
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Манифест текущего бандла: хэш содержимого, размер и SHA-256 файла."""
+    info = bundle_publisher.current(db)
+    response.headers["ETag"] = f'"{info.hash}"'
+    return info.manifest()
+
+
+@router.get("")
+def download_bundle(
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Скачать бандл библиотеки (SQLite). Поддерживает If-None-Match по хэшу манифеста."""
+    info = bundle_publisher.current(db)
+    etag = f'"{info.hash}"'
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return FileResponse(
+        info.path,
+        media_type=BUNDLE_MEDIA_TYPE,
+        filename=f"prompts-{info.hash[:16]}.sqlite",
+        headers={"ETag": etag, "X-Bundle-Hash": info.hash},
+    )
@@ -0,0 +1,116 @@
+import json
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from ..assets import INDEX_NAME, MANIFEST_NAME, STATIC_PREFIX, VERSION_NAME, default_dist_dir
+
+router = APIRouter(tags=["frontend"], include_in_schema=False)
+
+# Имена файлов содержат хэш содержимого — их можно кэшировать навсегда
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# index.html и version.json ссылаются на текущие хэши — всегда перепроверяются (ETag/304)
+REVALIDATE_CACHE = "no-cache"
+
+# Кодировка -> расширение заранее сжатого файла, в порядке предпочтения
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _file_response(request: Request, path: Path, media_type: str, headers: dict) -> Response:
+    """FileResponse с ответом 304 на совпавший If-None-Match."""
+    response = FileResponse(path, media_type=media_type, headers=headers, stat_result=path.stat())
+    etag = response.headers.get("etag")
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={
+            "ETag": etag, "Cache-Control": headers["Cache-Control"], "Vary": "Accept-Encoding",
+        })
+    return response
+
+
+def _serve(request: Request, path: Path, cache_control: str, headers: Optional[dict] = None) -> Response:
+    """Отдать файл, выбрав заранее сжатый вариант по Accept-Encoding."""
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if media_type in ("text/javascript", "application/javascript", "text/css", "text/html"):
+        media_type += "; charset=utf-8"
+    response_headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding", **(headers or {})}
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding, suffix in _PRECOMPRESSED:
+        variant = path.with_name(path.name + suffix)
+        if encoding in accepted and variant.is_file():
+            response_headers["Content-Encoding"] = encoding
+            return _file_response(request, variant, media_type, response_headers)
+    return _file_response(request, path, media_type, response_headers)
+
+
+@lru_cache(maxsize=1)
+def _preload_link(manifest_mtime: float) -> str:
+    """Заголовок Link с подсказками preload для стилей и модулей точки входа."""
+    manifest = json.loads((default_dist_dir() / MANIFEST_NAME).read_text("utf-8"))
+    links = [f"<{STATIC_PREFIX}{path}>; rel=preload; as=style" for path in manifest.get("stylesheets", [])]
+    links += [f"<{STATIC_PREFIX}{path}>; rel=modulepreload" for path in manifest.get("preload", [])]
+    return ", ".join(links)
+
+
+def _dist_file(name: str) -> Path:
+    path = default_dist_dir() / name
+    if not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Frontend is not built, run: python -m backend.assets",
+        )
+    return path
+
+
+@router.get("/")
+@router.get("/index.html")
+def get_index(request: Request):
+    """index.html собранного фронтенда с подсказками preload в заголовке Link."""
+    path = _dist_file(INDEX_NAME)
+    headers = {}
+    manifest = default_dist_dir() / MANIFEST_NAME
+    if manifest.is_file():
+        link = _preload_link(manifest.stat().st_mtime)
+        if link:
+            headers["Link"] = link
+    return _serve(request, path, REVALIDATE_CACHE, headers)
+
+
+@router.get("/version.json")
+def get_version(request: Request):
+    """Версия фронтенда (для старых сборок без meta app-version)."""
+    return _serve(request, _dist_file(VERSION_NAME), REVALIDATE_CACHE)
+
+
+@router.get(STATIC_PREFIX + "{file_path:path}")
+def get_static(file_path: str, request: Request):
+    """Файлы фронтенда с хэшем в имени: кэшируются навсегда (immutable)."""
+    static_dir = (default_dist_dir() / "static").resolve()
+    path = (static_dir / file_path).resolve()
+    # Защита от выхода за пределы каталога (../) и прямых запросов к .gz/.br
+    if (
+        not path.is_relative_to(static_dir)
+        or path.suffix in (".gz", ".br")
+        or not path.is_file()
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return _serve(request, path, IMMUTABLE_CACHE)
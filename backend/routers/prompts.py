@@ -1,80 +1,469 @@
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, defer
 
 from .. import crud
-from ..db import get_db
+from ..catalog import prompt_catalog
+from ..db import get_read_db
+from ..db_writer import db_writer
 from ..dependencies import get_active_user, get_prompt_editor_user
-from ..models import PromptVersion, User
+from ..minhash import minhash_index
+from ..models import Prompt, PromptUsage, PromptVersion, User
 from ..schemas import (
+    PromptAsOfOut,
+    BatchRenderRequest,
+    BatchRenderResult,
+    DuplicateGroupOut,
     PromptCreate,
     PromptOut,
+    PromptPatch,
+    PromptSectionOut,
+    PromptSuggestionOut,
     PromptUpdate,
+    PromptUsageEvent,
+    PromptUsageOut,
     PromptVersionBase,
     PromptVersionDetail,
+    RenderRequest,
+    RenderResponse,
+    SimilarPromptOut,
 )
+from ..settings import settings
+from ..single_flight import read_flight
+from ..suggest import suggest_index
+from ..task_queue import task_queue
+from ..templating import TemplateError, TemplateNotFound, template_cache
+from ..text_patch import PatchError
+from ..write_buffer import write_buffer
 
 router = APIRouter(prefix="/api/prompts", tags=["prompts"])
 
+MARKDOWN_MEDIA_TYPE = "text/markdown; charset=utf-8"
+JSON_MEDIA_TYPE = "application/json"
+
+_prompt_list_adapter = TypeAdapter(List[PromptOut])
+
+
+def _parse_byte_range(header: str, length: int) -> Optional[tuple]:
+    """
+    Разобрать заголовок Range (один диапазон bytes=start-end, start- или -suffix).
+    Возвращает (start, end) с end не включительно; None — если заголовок не поддерживается
+    и нужно отдать весь текст. Неудовлетворимый диапазон — 416.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else length
+        else:
+            start = max(length - int(last), 0)
+            end = length
+    except ValueError:
+        return None
+    end = min(end, length)
+    if start >= length or start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"},
+        )
+    return start, end
+
+
+def _wait_for_task_queue() -> None:
+    """
+    Обратное давление перед записью промпта: запись ставит задачу в очередь (diffstat
+    версии), поэтому при переполненной очереди ждём места до TASK_QUEUE_SUBMIT_TIMEOUT_SECONDS,
+    затем 503 с Retry-After. Промпт при этом не изменяется.
+    """
+    if not task_queue.wait_for_room(settings.TASK_QUEUE_SUBMIT_TIMEOUT_SECONDS):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Background task queue is full, retry later",
+            headers={"Retry-After": str(max(1, round(settings.TASK_QUEUE_SUBMIT_TIMEOUT_SECONDS)))},
+        )
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """Время в том виде, в каком оно хранится в БД: UTC без часового пояса."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _settled_as_of(as_of: datetime) -> datetime:
+    """
+    as_of в UTC без часового пояса. Сохранение получает created_at до COMMIT, поэтому
+    совсем недавняя история ещё может пополниться транзакциями в полёте. as_of позже
+    чем VERSION_AS_OF_SETTLE_SECONDS назад отклоняются (422) — иначе тот же запрос
+    позже вернул бы другой текст.
+    """
+    as_of = _utc_naive(as_of)
+    horizon = datetime.utcnow() - timedelta(seconds=settings.VERSION_AS_OF_SETTLE_SECONDS)
+    if as_of > horizon:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"as_of must not be later than {horizon.isoformat()}: newer history may still change",
+        )
+    return as_of
+
+
+def _as_of_view(prompt: Prompt, version: PromptVersion) -> PromptAsOfOut:
+    return PromptAsOfOut(
+        id=prompt.id,
+        slug=prompt.slug,
+        folder=prompt.folder,
+        name=version.title,
+        text=version.content,
+        version=version.version,
+        version_id=version.id,
+        version_created_at=version.created_at,
+        content_hash=version.content_hash,
+    )
+
+
+def _catalog_view(db: Session, prompt):
+    """Записанный промпт в виде записи каталога (с размером и числом токенов)."""
+    return prompt_catalog.get(db, prompt.slug) or prompt
+
 
 @router.get("", response_model=List[PromptOut])
 def list_prompts(
     folder: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    min_tokens: Optional[int] = Query(None, ge=0),
+    max_tokens: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """
+    Получить список промптов с фильтрацией по папке, поиском и числу токенов
+    (из in-memory каталога). На PostgreSQL поиск — полнотекстовый по GIN-индексу
+    (слова как префиксы), на SQLite — подстрока в памяти.
+
+    Одинаковые одновременные запросы (те же параметры и уровень доступа) выполняются
+    один раз и получают одни и те же сериализованные байты (read_flight).
+    """
+    def load() -> bytes:
+        matched_ids = crud.search_prompt_ids(db, search) if search else None
+        if matched_ids is not None:
+            entries = prompt_catalog.list_prompts(
+                db, folder=folder, min_tokens=min_tokens, max_tokens=max_tokens
+            )
+            entries = [entry for entry in entries if entry.id in matched_ids]
+        else:
+            entries = prompt_catalog.list_prompts(
+                db, folder=folder, search=search, min_tokens=min_tokens, max_tokens=max_tokens
+            )
+        return _prompt_list_adapter.dump_json(
+            _prompt_list_adapter.validate_python(entries, from_attributes=True)
+        )
+
+    key = ("list", folder, search, min_tokens, max_tokens, current_user.access_level)
+    return Response(content=read_flight.do(key, load), media_type=JSON_MEDIA_TYPE)
+
+
+@router.get("/suggest", response_model=List[PromptSuggestionOut])
+def suggest_prompts(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Нечёткие подсказки по названию, slug и папке (опечатки, смешанная кириллица/латиница, раскладка)."""
+    prompt_catalog.sync(db)
+    return [suggestion._asdict() for suggestion in suggest_index.suggest(q, limit=limit)]
+
+
+@router.get("/duplicates", response_model=List[DuplicateGroupOut])
+def find_duplicate_prompts(
+    threshold: float = Query(0.8, ge=0.1, le=1.0),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Отчёт о группах почти одинаковых промптов (MinHash + LSH)."""
+    prompt_catalog.sync(db)
+    return [
+        {"similarity": group.similarity, "prompts": [item._asdict() for item in group.prompts]}
+        for group in minhash_index.duplicates(threshold=threshold)
+    ]
+
+
+@router.get("/snapshot", response_model=List[PromptAsOfOut])
+def get_prompts_snapshot(
+    as_of: datetime,
+    folder: Optional[str] = None,
+    slug: Optional[List[str]] = Query(None, max_length=1000),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """
+    Снимок библиотеки (или промптов из slug=..., папки folder) на момент as_of:
+    для каждого промпта — последняя версия, созданная не позже as_of. Одним запросом
+    по индексу (prompt_id, created_at). Промпты, созданные позже as_of, не попадают в снимок;
+    слишком свежий as_of — 422 (см. _settled_as_of).
+    """
+    rows = crud.list_prompts_as_of(db, _settled_as_of(as_of), folder=folder, slugs=slug)
+    return [_as_of_view(prompt, version) for prompt, version in rows]
+
+
+@router.post("/render", response_model=List[BatchRenderResult])
+def render_prompts_batch(
+    payload: BatchRenderRequest,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_active_user),
 ):
-    """Получить список промптов с фильтрацией по папке и поиском."""
-    return crud.list_prompts(db=db, folder=folder, search=search)
+    """Отрендерить несколько шаблонов за один запрос. Ошибки возвращаются по каждому элементу."""
+    results = []
+    for item in payload.items:
+        try:
+            text = template_cache.render(db, item.slug, item.variables, strict=item.strict)
+        except TemplateError as e:
+            results.append(BatchRenderResult(slug=item.slug, error=str(e)))
+        else:
+            results.append(BatchRenderResult(slug=item.slug, text=text))
+    return results
 
 
-@router.get("/{slug}", response_model=PromptOut)
+@router.get("/{slug}", response_model=Union[PromptOut, PromptAsOfOut])
 def get_prompt(
     slug: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    as_of: Optional[datetime] = Query(None, description="Вернуть версию, действовавшую в этот момент"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """
+    Получить промпт по slug. Поддерживает ETag / If-None-Match.
+    Одинаковые одновременные запросы делят одно чтение и сериализацию (read_flight).
+
+    С as_of — название и текст из последней версии, созданной не позже as_of
+    (PromptAsOfOut). Версия с объединёнными сохранениями отдаёт итог объединения;
+    прореженные ретеншном версии не восстанавливаются. 404 — промпта тогда ещё не было,
+    422 — as_of слишком близко к текущему моменту (см. _settled_as_of).
+    """
+    if as_of is not None:
+        row = crud.get_prompt_as_of(db, slug, _settled_as_of(as_of))
+        if not row:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return Response(content=_as_of_view(*row).model_dump_json(), media_type=JSON_MEDIA_TYPE)
+
+    def load():
+        prompt = prompt_catalog.get(db, slug)
+        if not prompt:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return prompt.id, prompt.etag, PromptOut.model_validate(prompt).model_dump_json().encode()
+
+    prompt_id, etag, body = read_flight.do(("get", slug, current_user.access_level), load)
+    write_buffer.record_usage(current_user.id, prompt_id, "view")
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers={"ETag": etag})
+
+
+@router.get("/{slug}/similar", response_model=List[SimilarPromptOut])
+def get_similar_prompts(
+    slug: str,
+    threshold: float = Query(0.5, ge=0.1, le=1.0),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Похожие промпты по оценке коэффициента Jaccard текстов (MinHash)."""
+    prompt = prompt_catalog.get(db, slug)
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return [item._asdict() for item in minhash_index.similar(prompt.id, threshold=threshold, limit=limit)]
+
+
+@router.get("/{slug}/raw")
+def get_prompt_raw(
+    slug: str,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Текст промпта как text/markdown. Поддерживает HTTP Range (байты UTF-8) и ETag."""
+    prompt = prompt_catalog.get(db, slug)
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    headers = {"ETag": prompt.etag, "Accept-Ranges": "bytes"}
+    if request.headers.get("If-None-Match") == prompt.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    raw = prompt.raw
+    range_header = request.headers.get("Range")
+    # If-Range: диапазон отдаём только для той же версии текста
+    if range_header and request.headers.get("If-Range", prompt.etag) == prompt.etag:
+        byte_range = _parse_byte_range(range_header, len(raw))
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(raw)}"
+            return Response(
+                content=raw[start:end],
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=MARKDOWN_MEDIA_TYPE,
+                headers=headers,
+            )
+    return Response(content=raw, media_type=MARKDOWN_MEDIA_TYPE, headers=headers)
+
+
+@router.get("/{slug}/sections", response_model=List[PromptSectionOut])
+def list_prompt_sections(
+    slug: str,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Оглавление промпта (заголовки Markdown с байтовыми смещениями)."""
+    prompt = prompt_catalog.get(db, slug)
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return crud.get_prompt_sections(db, prompt.id)
+
+
+@router.get("/{slug}/sections/{anchor}")
+def get_prompt_section(
+    slug: str,
+    anchor: str,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Текст одного раздела (от заголовка до следующего заголовка того же или более высокого уровня)."""
+    prompt = prompt_catalog.get(db, slug)
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    section = crud.get_prompt_section(db, prompt.id, anchor)
+    if not section:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Section not found")
+    return Response(
+        content=prompt.raw[section.start_byte:section.end_byte],
+        media_type=MARKDOWN_MEDIA_TYPE,
+        headers={"ETag": prompt.etag},
+    )
+
+
+@router.post("/{slug}/render", response_model=RenderResponse)
+def render_prompt(
+    slug: str,
+    payload: RenderRequest,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Подставить {{переменные}} и {{include:slug}} в промпт."""
+    try:
+        compiled = template_cache.get(db, slug)
+        text = compiled.render(payload.variables, strict=payload.strict)
+    except TemplateNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except TemplateError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return RenderResponse(slug=slug, text=text, variables=sorted(compiled.variables))
+
+
+@router.post("/{slug}/usage", status_code=status.HTTP_202_ACCEPTED)
+def track_prompt_usage(
+    slug: str,
+    payload: PromptUsageEvent,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_active_user),
 ):
-    """Получить промпт по slug."""
+    """Учесть использование промпта (просмотр/копирование). Запись отложенная."""
     prompt = crud.get_prompt_by_slug(db, slug=slug)
     if not prompt:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    return prompt
+    write_buffer.record_usage(current_user.id, prompt.id, payload.kind)
+    return {"detail": "accepted"}
+
+
+@router.get("/{slug}/usage", response_model=PromptUsageOut)
+def get_prompt_usage(
+    slug: str,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_active_user),
+):
+    """Счётчики использования промпта текущим пользователем (с задержкой до одного flush)."""
+    prompt = crud.get_prompt_by_slug(db, slug=slug)
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    usage = db.get(PromptUsage, (current_user.id, prompt.id))
+    if not usage:
+        return PromptUsageOut(prompt_id=prompt.id)
+    return usage
 
 
 @router.post("", response_model=PromptOut, status_code=status.HTTP_201_CREATED)
 def create_prompt(
     payload: PromptCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     editor_user: User = Depends(get_prompt_editor_user),
 ):
     """Создать новый промпт. Требует editor access (admin или tech)."""
-    prompt = crud.create_prompt(db=db, data=payload, user_id=editor_user.id)
-    return prompt
+    _wait_for_task_queue()
+    prompt = db_writer.call(crud.create_prompt, data=payload, user_id=editor_user.id)
+    read_flight.invalidate()
+    return _catalog_view(db, prompt)
 
 
 @router.put("/{slug}", response_model=PromptOut)
 def update_prompt(
     slug: str,
     payload: PromptUpdate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     editor_user: User = Depends(get_prompt_editor_user),
 ):
     """Обновить промпт. Требует editor access (admin или tech)."""
-    prompt = crud.update_prompt(db=db, slug=slug, data=payload, user_id=editor_user.id)
+    _wait_for_task_queue()
+    prompt = db_writer.call(crud.update_prompt, slug=slug, data=payload, user_id=editor_user.id)
+    read_flight.invalidate()
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return _catalog_view(db, prompt)
+
+
+@router.patch("/{slug}", response_model=PromptOut)
+def patch_prompt(
+    slug: str,
+    payload: PromptPatch,
+    db: Session = Depends(get_read_db),
+    editor_user: User = Depends(get_prompt_editor_user),
+):
+    """
+    Частично обновить промпт: операции над текстом или unified diff относительно base_revision.
+    409, если промпт уже изменён; 422, если патч не применяется. Требует editor access.
+    """
+    _wait_for_task_queue()
+    try:
+        prompt = db_writer.call(crud.patch_prompt, slug=slug, data=payload, user_id=editor_user.id)
+    except crud.PromptConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"X-Current-Revision": str(e.current_revision)},
+        )
+    except PatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    read_flight.invalidate()
     if not prompt:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    return prompt
+    return _catalog_view(db, prompt)
 
 
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_prompt(
     slug: str,
-    db: Session = Depends(get_db),
     editor_user: User = Depends(get_prompt_editor_user),
 ):
     """Удалить промпт. Требует editor access (admin или tech)."""
-    deleted = crud.delete_prompt(db=db, slug=slug)
+    deleted = db_writer.call(crud.delete_prompt, slug=slug)
+    read_flight.invalidate()
     if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
     return None
@@ -83,16 +472,27 @@ def delete_prompt(
 @router.get("/{prompt_id}/versions", response_model=List[PromptVersionBase])
 def get_prompt_versions(
     prompt_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[int] = Query(None, description="Курсор: вернуть версии с номером меньше указанного"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_active_user),
 ):
-    """Получить список версий промпта."""
-    versions = (
+    """
+    Получить страницу версий промпта (от новых к старым), без текстов. Сохранения,
+    объединённые в версию, не показываются — только последнее из них.
+    Если есть ещё версии, курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
+    query = (
         db.query(PromptVersion)
-        .filter(PromptVersion.prompt_id == prompt_id)
-        .order_by(PromptVersion.version.desc())
-        .all()
+        .options(defer(PromptVersion.content))
+        .filter(PromptVersion.prompt_id == prompt_id, PromptVersion.superseded_at.is_(None))
     )
+    if before is not None:
+        query = query.filter(PromptVersion.version < before)
+    versions = query.order_by(PromptVersion.version.desc()).limit(limit).all()
+    if len(versions) == limit:
+        response.headers["X-Next-Cursor"] = str(versions[-1].version)
     return versions
 
 
@@ -100,7 +500,7 @@ def get_prompt_versions(
 def get_prompt_version(
     prompt_id: int,
     version_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_active_user),
 ):
     """Получить конкретную версию промпта."""
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class UserBase(BaseModel):
@@ -91,22 +91,79 @@ class PromptUpdate(BaseModel):
     importance: Optional[str] = None
 
 
+class TextOp(BaseModel):
+    # Смещения в единицах UTF-16 (как индексы строк JavaScript) в базовом тексте
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    text: str = ""
+
+
+class PromptPatch(BaseModel):
+    base_revision: int
+    # Изменение текста: либо список операций, либо unified diff
+    ops: Optional[List[TextOp]] = None
+    diff: Optional[str] = None
+    name: Optional[str] = None
+    folder: Optional[str] = None
+    tags: Optional[str] = None
+    importance: Optional[str] = None
+
+
 class PromptOut(PromptBase):
     id: int
     slug: str
+    revision: int = 1
     created_at: datetime
     updated_at: datetime
+    char_count: Optional[int] = None
+    word_count: Optional[int] = None
+    token_count: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class PromptSectionOut(BaseModel):
+    anchor: str
+    title: str
+    level: int
+    line: int
+    start_byte: int
+    end_byte: int
 
     class Config:
         from_attributes = True
 
 
+class PromptSuggestionOut(BaseModel):
+    slug: str
+    name: str
+    folder: Optional[str] = None
+    score: float
+
+
+class SimilarPromptOut(BaseModel):
+    slug: str
+    name: str
+    folder: Optional[str] = None
+    similarity: float
+
+
+class DuplicateGroupOut(BaseModel):
+    similarity: float
+    prompts: List[SimilarPromptOut]
+
+
 class PromptVersionBase(BaseModel):
     id: int
     version: int
     title: str
     created_at: datetime
     updated_by_user_id: int | None
+    content_length: Optional[int] = None
+    content_hash: Optional[str] = None
+    lines_added: Optional[int] = None
+    lines_removed: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -119,4 +176,56 @@ class PromptVersionDetail(PromptVersionBase):
         from_attributes = True
 
 
+class PromptAsOfOut(BaseModel):
+    """
+    Промпт на момент as_of: название и текст — из версии, действовавшей в тот момент;
+    slug и папка — текущие (они не версионируются).
+    """
+    id: int
+    slug: str
+    folder: Optional[str] = None
+    name: str
+    text: str
+    version: int
+    version_id: int
+    version_created_at: datetime
+    content_hash: Optional[str] = None
+
+
+class PromptUsageEvent(BaseModel):
+    kind: Literal["view", "copy"]
+
+
+class PromptUsageOut(BaseModel):
+    prompt_id: int
+    view_count: int = 0
+    copy_count: int = 0
+    last_used_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 
+class RenderRequest(BaseModel):
+    variables: Dict[str, str] = {}
+    strict: bool = True  # Ошибка, если не передана какая-либо переменная
+
+
+class RenderResponse(BaseModel):
+    slug: str
+    text: str
+    variables: List[str]
+
+
+class BatchRenderItem(RenderRequest):
+    slug: str
+
+
+class BatchRenderRequest(BaseModel):
+    items: List[BatchRenderItem] = Field(..., max_length=1000)
+
+
+class BatchRenderResult(BaseModel):
+    slug: str
+    text: Optional[str] = None
+    error: Optional[str] = None
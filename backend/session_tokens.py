@@ -0,0 +1,152 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from .db import ReadSessionLocal
+from .models import Session as SessionModel, User
+from .settings import settings
+
+# Префикс формата подписанных токенов (позволяет отличить их от случайных)
+SIGNED_TOKEN_PREFIX = "v1."
+
+# Минимальное перекрытие инкрементальной загрузки отзывов (секунды): revoked_at ставится
+# до COMMIT, и отзыв может стать видимым позже отзывов с большим revoked_at
+_REVOCATION_OVERLAP_SECONDS = 10.0
+
+
+class SessionClaims(NamedTuple):
+    """Данные, зашитые в подписанный токен сессии."""
+    user_id: int
+    session_id: int
+    expires_at: int  # unix timestamp (UTC)
+
+
+def signed_tokens_enabled() -> bool:
+    """Выдавать ли подписанные токены вместо случайных."""
+    return settings.SESSION_TOKEN_FORMAT == "signed" and bool(settings.SESSION_SIGNING_KEY)
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(SIGNED_TOKEN_PREFIX)
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(
+        settings.SESSION_SIGNING_KEY.encode(),
+        payload.encode(),
+        hashlib.sha256,
+    ).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def encode_session_token(user_id: int, session_id: int, expires_at: datetime) -> str:
+    """
+    Сформировать подписанный токен вида v1.<user_id>.<session_id>.<exp>.<hmac>.
+    expires_at ожидается в UTC (как и всё остальное в auth_crud).
+    """
+    exp = calendar.timegm(expires_at.utctimetuple())
+    payload = f"{SIGNED_TOKEN_PREFIX}{user_id}.{session_id}.{exp}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_session_token(token: str) -> Optional[SessionClaims]:
+    """
+    Проверить подпись и срок действия токена без обращения к БД.
+    Возвращает None, если токен подделан, повреждён или истёк.
+    """
+    if not settings.SESSION_SIGNING_KEY or not is_signed_token(token):
+        return None
+
+    payload, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(_sign(payload), signature):
+        return None
+
+    try:
+        user_id, session_id, exp = (int(part) for part in payload[len(SIGNED_TOKEN_PREFIX):].split("."))
+    except ValueError:
+        return None
+
+    if exp <= time.time():
+        return None
+
+    return SessionClaims(user_id=user_id, session_id=session_id, expires_at=exp)
+
+
+class SessionRevocationRegistry:
+    """
+    In-memory состояние, необходимое для проверки подписанных токенов:
+    - множество отозванных, но ещё не истёкших сессий;
+    - снимок пользователей (для request.state.user и проверки блокировки).
+
+    Обновляется из БД не чаще, чем раз в SESSION_REVOCATION_REFRESH_SECONDS.
+    Отозванные сессии подгружаются инкрементально (по revoked_at) с перекрытием
+    max(SESSION_REVOCATION_REFRESH_SECONDS, _REVOCATION_OVERLAP_SECONDS) назад от
+    максимального виденного revoked_at — чтобы не пропустить поздно закоммиченные отзывы.
+    Таблица users небольшая и перечитывается целиком.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # session_id -> expires_at; истёкшие записи вычищаются при обновлении
+        self._revoked: Dict[int, datetime] = {}
+        self._users: Dict[int, User] = {}
+        self._watermark: Optional[datetime] = None
+        self._next_refresh = 0.0
+
+    def maybe_refresh(self) -> None:
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+
+    def refresh(self) -> None:
+        with self._lock:
+            now = datetime.utcnow()
+            db = ReadSessionLocal()
+            try:
+                query = db.query(SessionModel.id, SessionModel.revoked_at, SessionModel.expires_at).filter(
+                    SessionModel.revoked_at.isnot(None),
+                    SessionModel.expires_at > now,
+                )
+                if self._watermark is not None:
+                    overlap = max(settings.SESSION_REVOCATION_REFRESH_SECONDS, _REVOCATION_OVERLAP_SECONDS)
+                    query = query.filter(SessionModel.revoked_at >= self._watermark - timedelta(seconds=overlap))
+                for session_id, revoked_at, expires_at in query.all():
+                    self._revoked[session_id] = expires_at
+                    if self._watermark is None or revoked_at > self._watermark:
+                        self._watermark = revoked_at
+
+                users = db.query(User).all()
+                db.expunge_all()
+            finally:
+                db.close()
+
+            self._users = {user.id: user for user in users}
+            self._revoked = {
+                session_id: expires_at
+                for session_id, expires_at in self._revoked.items()
+                if expires_at > now
+            }
+            self._next_refresh = time.monotonic() + settings.SESSION_REVOCATION_REFRESH_SECONDS
+
+    def mark_revoked(self, session_id: int, expires_at: datetime) -> None:
+        """Учесть отзыв сессии в текущем процессе сразу, не дожидаясь обновления."""
+        with self._lock:
+            self._revoked[session_id] = expires_at
+
+    def invalidate_users(self) -> None:
+        """Принудительно перечитать пользователей при следующей проверке (например, после блокировки)."""
+        self._next_refresh = 0.0
+
+    def is_revoked(self, session_id: int) -> bool:
+        return session_id in self._revoked
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        return self._users.get(user_id)
+
+
+# Глобальный реестр отзывов (один на процесс)
+revocation_registry = SessionRevocationRegistry()
@@ -8,6 +8,17 @@ class Settings(BaseSettings):
     
     # База данных
     DATABASE_URL: str = "sqlite:////var/www/allpromtsokk/backend/prompts.db"
+    # Пул соединений: PostgreSQL — общий, SQLite — пул read-only соединений для чтения
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # SQLite: ожидание блокировки записи и единственный поток-писатель с групповыми транзакциями
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 5.0
+    SQLITE_SINGLE_WRITER: bool = True
+    DB_WRITER_MAX_BATCH: int = 64
+    DB_WRITER_BATCH_WINDOW_SECONDS: float = 0.0
     
     # Telegram
     TELEGRAM_BOT_NAME: str = "autookk_bot"
@@ -16,10 +27,17 @@ class Settings(BaseSettings):
     # Статический логин/пароль для технического входа
     STATIC_LOGIN: str = ""
     STATIC_PASSWORD_HASH: str = ""
+    # Сколько потоков выделено под bcrypt (ограничивает параллельные проверки пароля)
+    AUTH_HASH_WORKERS: int = 2
     
     # Сессии
     SESSION_COOKIE_NAME: str = "session_token"
     SESSION_EXPIRES_DAYS: int = 30
+    # Формат токена: random (проверка через БД) или signed (HMAC, проверка без БД)
+    SESSION_TOKEN_FORMAT: Literal["random", "signed"] = "random"
+    SESSION_SIGNING_KEY: str = ""  # Секрет для подписи токенов (обязателен для signed)
+    # Как часто обновлять in-memory список отозванных сессий и снимок пользователей
+    SESSION_REVOCATION_REFRESH_SECONDS: float = 5.0
     
     # Окружение
     ENV: Literal["dev", "prod"] = "dev"
@@ -28,6 +46,63 @@ class Settings(BaseSettings):
     # Может быть строкой (через запятую) или списком
     ALLOWED_ORIGINS: Union[str, List[str]] = "https://autookk.ru"
     
+    # Отложенная запись счётчиков (last_login_at, использование промптов)
+    WRITE_BUFFER_FLUSH_SECONDS: float = 5.0
+    
+    # Версии промптов
+    # Сохранения одного пользователя в пределах окна показываются в истории одной версией (0 — выключено)
+    VERSION_COALESCE_SECONDS: int = 60
+    # Чтения as_of: запас на транзакции, ещё не зафиксированные к чтению
+    VERSION_AS_OF_SETTLE_SECONDS: int = 5
+    # Ретеншн: все версии моложе KEEP_ALL_DAYS, затем по одной в день до DAILY_DAYS, дальше по одной в неделю
+    VERSION_RETENTION_KEEP_ALL_DAYS: int = 7
+    VERSION_RETENTION_DAILY_DAYS: int = 90
+    VERSION_COMPACT_INTERVAL_SECONDS: float = 3600.0
+    
+    # Бандлы библиотеки для офлайн-потребителей (/api/bundle)
+    BUNDLE_DIR: str = "bundles"
+    
+    # Онлайн-бэкап SQLite (/api/admin/backup): страниц за шаг и пауза между шагами
+    BACKUP_PAGES_PER_STEP: int = 256
+    BACKUP_STEP_SLEEP_SECONDS: float = 0.005
+    
+    # Профилирование запросов администратором (X-Profile: 1 или ?_profile=1)
+    PROFILER_RING_SIZE: int = 20
+    PROFILER_SAMPLE_INTERVAL_SECONDS: float = 0.002
+    PROFILER_TRACEMALLOC_FRAMES: int = 1
+    
+    # Сторож задержки event loop: период проверки и порог, после которого снимается стек
+    LOOP_WATCHDOG_ENABLED: bool = True
+    LOOP_WATCHDOG_INTERVAL_SECONDS: float = 0.1
+    LOOP_LAG_THRESHOLD_SECONDS: float = 0.1
+    
+    # Admission control: параллельных запросов и мест в очереди по классам маршрутов
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    ADMISSION_AUTH_CONCURRENCY: int = 4
+    ADMISSION_AUTH_QUEUE: int = 32
+    ADMISSION_READ_CONCURRENCY: int = 16
+    ADMISSION_READ_QUEUE: int = 128
+    ADMISSION_WRITE_CONCURRENCY: int = 2
+    ADMISSION_WRITE_QUEUE: int = 32
+    ADMISSION_ADMIN_CONCURRENCY: int = 2
+    ADMISSION_ADMIN_QUEUE: int = 8
+    
+    # Очередь фоновых задач (diffstat версий промптов после записи)
+    TASK_QUEUE_WORKERS: int = 2
+    TASK_QUEUE_MAX_PENDING: int = 1000
+    # Сколько запрос записи ждёт места в переполненной очереди, прежде чем получить 503
+    TASK_QUEUE_SUBMIT_TIMEOUT_SECONDS: float = 5.0
+    TASK_QUEUE_MAX_RETRIES: int = 3
+    TASK_QUEUE_RETRY_DELAY_SECONDS: float = 0.5
+    TASK_QUEUE_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    
+    # Собранный фронтенд (python -m backend.assets); пусто — <корень репозитория>/dist
+    FRONTEND_DIST_DIR: str = ""
+    
+    # Одинаковые одновременные чтения промптов выполняются один раз (single-flight)
+    SINGLE_FLIGHT_ENABLED: bool = True
+    
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_AUTH_PER_MINUTE: int = 10
@@ -0,0 +1,87 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .settings import settings
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых одновременных чтений (single-flight).
+
+    Первый запрос с данным ключом («ведущий») выполняет вычисление; запросы с тем же
+    ключом, пришедшие до его завершения, ждут и получают тот же результат (или ту же
+    ошибку). Результат не кэшируется: как только вычисление закончилось, следующий
+    запрос выполняет его заново. Поэтому разделять стоит неизменяемый результат —
+    уже сериализованные байты ответа.
+
+    invalidate() вызывается после записи: запросы, пришедшие после COMMIT, не
+    присоединяются к вычислению, начатому до него, и видят свою запись.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._epoch = 0
+        self.leaders = 0
+        self.shared = 0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._epoch += 1
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Выполнить func() или дождаться результата уже идущего вызова с тем же ключом."""
+        if not self.enabled:
+            return func()
+        with self._lock:
+            flight_key = (self._epoch, key)
+            call = self._calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._calls[flight_key] = _Call()
+                self.leaders += 1
+            else:
+                call.followers += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(flight_key, None)
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._calls),
+                "waiting": sum(call.followers for call in self._calls.values()),
+                "leaders": self.leaders,
+                "shared": self.shared,
+            }
+
+
+# Глобальное схлопывание чтений промптов (одно на процесс)
+read_flight = SingleFlight(enabled=settings.SINGLE_FLIGHT_ENABLED)
@@ -0,0 +1,151 @@
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .catalog import CatalogEntry, prompt_catalog
+
+# Кириллические буквы, визуально совпадающие с латинскими, приводятся к латинским:
+# «Рrompt» с русской «Р» и «Prompt» дают одинаковые триграммы
+_HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "з": "3", "і": "i", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ј": "j", "ѕ": "s",
+})
+
+# Раскладки клавиатуры: «ghbdtn» -> «привет» и обратно
+_EN_KEYS = "`qwertyuiop[]asdfghjkl;'zxcvbnm,."
+_RU_KEYS = "ёйцукенгшщзхъфывапролджэячсмитьбю"
+_EN_TO_RU = str.maketrans(_EN_KEYS, _RU_KEYS)
+_RU_TO_EN = str.maketrans(_RU_KEYS, _EN_KEYS)
+
+# Поля и их веса при ранжировании
+_FIELDS = (("name", 1.0), ("slug", 0.9), ("folder", 0.6))
+
+
+class Suggestion(NamedTuple):
+    slug: str
+    name: str
+    folder: Optional[str]
+    score: float
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, без диакритики, кириллические омоглифы -> латиница, '-'/'_' -> пробел."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    stripped = stripped.translate(_HOMOGLYPHS)
+    return " ".join(stripped.replace("-", " ").replace("_", " ").replace("/", " ").split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы по словам, с дополнением пробелами как в pg_trgm."""
+    result: Set[str] = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """
+    In-memory триграммный индекс по name, slug и folder промптов для быстрых подсказок.
+    Обновляется инкрементально по уведомлениям каталога.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # триграмма -> множество документов (prompt_id, поле)
+        self._postings: Dict[str, Set[Tuple[int, str]]] = {}
+        # документ -> (нормализованный текст, число триграмм)
+        self._docs: Dict[Tuple[int, str], Tuple[str, int]] = {}
+        self._entries: Dict[int, CatalogEntry] = {}
+
+    def _remove(self, prompt_id: int) -> None:
+        self._entries.pop(prompt_id, None)
+        for field, _ in _FIELDS:
+            doc = self._docs.pop((prompt_id, field), None)
+            if doc is None:
+                continue
+            for gram in trigrams(doc[0]):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard((prompt_id, field))
+                    if not posting:
+                        del self._postings[gram]
+
+    def _add(self, entry: CatalogEntry) -> None:
+        self._entries[entry.id] = entry
+        for field, _ in _FIELDS:
+            value = getattr(entry, field)
+            if not value:
+                continue
+            normalized = normalize(value)
+            grams = trigrams(normalized)
+            self._docs[(entry.id, field)] = (normalized, len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add((entry.id, field))
+
+    def on_catalog_change(self, upserted: List[CatalogEntry], removed: List[CatalogEntry]) -> None:
+        with self._lock:
+            for entry in removed:
+                self._remove(entry.id)
+            for entry in upserted:
+                self._remove(entry.id)
+                self._add(entry)
+
+    def _score(self, query: str) -> Dict[int, float]:
+        query_grams = trigrams(query)
+        if not query_grams:
+            return {}
+        overlaps: Counter = Counter()
+        for gram in query_grams:
+            overlaps.update(self._postings.get(gram, ()))
+
+        weights = dict(_FIELDS)
+        scores: Dict[int, float] = {}
+        for (prompt_id, field), overlap in overlaps.items():
+            normalized, gram_count = self._docs[(prompt_id, field)]
+            # Доля триграмм запроса, найденных в поле, с небольшим штрафом за длину поля
+            score = overlap / len(query_grams) * 0.8 + overlap / (len(query_grams) + gram_count - overlap) * 0.2
+            if normalized.startswith(query):
+                score += 0.5
+            elif query in normalized:
+                score += 0.25
+            score *= weights[field]
+            if score > scores.get(prompt_id, 0.0):
+                scores[prompt_id] = score
+        return scores
+
+    def suggest(self, query: str, limit: int = 10, min_score: float = 0.3) -> List[Suggestion]:
+        # Основной запрос и варианты с исправленной раскладкой клавиатуры
+        raw = query.casefold()
+        variants = {normalize(raw), normalize(raw.translate(_EN_TO_RU)), normalize(raw.translate(_RU_TO_EN))}
+        variants.discard("")
+
+        with self._lock:
+            best: Dict[int, float] = {}
+            for variant in variants:
+                for prompt_id, score in self._score(variant).items():
+                    if score > best.get(prompt_id, 0.0):
+                        best[prompt_id] = score
+            top = heapq.nlargest(
+                limit,
+                ((score, prompt_id) for prompt_id, score in best.items() if score >= min_score),
+                key=lambda item: (item[0], -item[1]),
+            )
+            entries = self._entries
+            return [
+                Suggestion(
+                    slug=entries[prompt_id].slug,
+                    name=entries[prompt_id].name,
+                    folder=entries[prompt_id].folder,
+                    score=round(score, 4),
+                )
+                for score, prompt_id in top
+            ]
+
+
+# Глобальный индекс подсказок (один на процесс)
+suggest_index = TrigramIndex()
+prompt_catalog.add_listener(suggest_index.on_catalog_change)
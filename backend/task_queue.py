@@ -0,0 +1,214 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Hashable, List, Optional
+
+from .db_writer import db_writer
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних окончательно упавших задач показывать в stats()
+_RECENT_FAILURES = 50
+
+
+class _Task:
+    __slots__ = ("name", "func", "args", "key")
+
+    def __init__(self, name: str, func: Callable[..., Any], args: tuple, key: Optional[Hashable]):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.key = key
+
+
+def _with_session(func: Callable[..., Any], *args: Any) -> None:
+    """Выполнить func(db, *args) через писателя БД и дождаться COMMIT."""
+    db_writer.call(func, *args)
+
+
+class TaskQueue:
+    """
+    Очередь фоновых задач в потоках (производная работа после записи: diffstat версий промптов).
+
+    - у каждого воркера своя очередь; задачи с одинаковым key всегда попадают к одному
+      воркеру и выполняются строго по порядку (например, версии одного промпта);
+    - ошибка — до max_retries повторов с экспоненциальной паузой на том же воркере,
+      чтобы не нарушить порядок;
+    - больше max_pending задач в ожидании или очередь не запущена (CLI, миграции) —
+      задача без key выполняется сразу в вызывающем потоке; задача с key, пока воркеры
+      работают, всё равно ставится в очередь своего воркера (сверх лимита и во время
+      drain): выполненная сразу, она обогнала бы ещё не выполненные задачи того же key.
+      submit() никогда не ждёт — задачи ставит и поток писателя БД, которого ждут воркеры.
+      Обратное давление — на потоках запросов: до записи они ждут места через
+      wait_for_room() и при переполнении получают 503, поэтому сверх лимита очередь
+      растёт не больше чем на число записей, уже переданных писателю;
+    - задачи, упавшие после всех повторов, видны в stats() (recent_failures) вместе с key;
+    - drain() при остановке дожидается всех принятых задач.
+    """
+
+    def __init__(self, workers: int, max_pending: int, max_retries: int, retry_delay: float):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._cond = threading.Condition()
+        self._shards: List[Deque[_Task]] = [deque() for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        self._round_robin = itertools.count()
+        self._accepting = False
+        self._stopping = False
+        self._active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.inline = 0
+        self.rejected = 0
+        self._failures: Deque[dict] = deque(maxlen=_RECENT_FAILURES)
+
+    def _pending(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._accepting = True
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._worker, args=(index,), name=f"task-queue-{index}", daemon=True)
+                for index in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name: str, func: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> None:
+        """Поставить задачу func(*args) в очередь."""
+        task = _Task(name, func, args, key)
+        with self._cond:
+            self.submitted += 1
+            has_room = self._accepting and self._pending() < self.max_pending
+            workers_running = bool(self._threads) and not self._stopping
+            if has_room or (key is not None and workers_running):
+                index = hash(key) % self.workers if key is not None else next(self._round_robin) % self.workers
+                self._shards[index].append(task)
+                self._cond.notify_all()
+                return
+            self.inline += 1
+        self._run(task)
+
+    def wait_for_room(self, timeout: float) -> bool:
+        """
+        Дождаться, пока в ожидании меньше max_pending задач (обратное давление для потоков
+        запросов перед записью, которая поставит задачу). False — места не стало за timeout.
+        Очередь не запущена — сразу True: задачи выполнятся в вызывающем потоке.
+        Не вызывать из потока писателя БД: воркеры сами ждут его.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._accepting and self._pending() >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def submit_db(self, name: str, func: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> None:
+        """Поставить в очередь func(db, *args); запись выполняет db_writer."""
+        self.submit(name, _with_session, func, *args, key=key)
+
+    def _worker(self, index: int) -> None:
+        shard = self._shards[index]
+        while True:
+            with self._cond:
+                while not shard and not self._stopping:
+                    self._cond.wait()
+                if not shard:
+                    return
+                task = shard.popleft()
+                self._active += 1
+            try:
+                self._run(task)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def _run(self, task: _Task) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                task.func(*task.args)
+            except Exception as exc:
+                if attempt < self.max_retries:
+                    with self._cond:
+                        self.retried += 1
+                    logger.warning("Задача %s упала, повтор %s", task.name, attempt + 1, exc_info=True)
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    continue
+                with self._cond:
+                    self.failed += 1
+                    self._failures.append({
+                        "name": task.name,
+                        "key": task.key,
+                        "error": repr(exc),
+                        "failed_at": datetime.utcnow().isoformat(),
+                    })
+                logger.exception("Задача %s не выполнена после %s попыток", task.name, attempt + 1)
+                return
+            with self._cond:
+                self.completed += 1
+            return
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Перестать принимать задачи (новые выполняются сразу), дождаться выполнения
+        принятых и остановить воркеры. Возвращает False, если не уложились в timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._accepting = False
+            while self._pending() or self._active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(
+                        "Очередь задач не опустела за %s с: %s в ожидании, %s выполняется",
+                        timeout, self._pending(), self._active,
+                    )
+                    break
+                self._cond.wait(remaining)
+            drained = not self._pending() and not self._active
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return drained
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": len(self._threads),
+                "pending": self._pending(),
+                "active": self._active,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "inline": self.inline,
+                "rejected": self.rejected,
+                "recent_failures": list(self._failures),
+            }
+
+
+# Глобальная очередь задач (одна на процесс)
+task_queue = TaskQueue(
+    workers=settings.TASK_QUEUE_WORKERS,
+    max_pending=settings.TASK_QUEUE_MAX_PENDING,
+    max_retries=settings.TASK_QUEUE_MAX_RETRIES,
+    retry_delay=settings.TASK_QUEUE_RETRY_DELAY_SECONDS,
+)
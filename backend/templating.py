@@ -0,0 +1,151 @@
+import re
+import threading
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Mapping, NamedTuple, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from .catalog import CatalogEntry, prompt_catalog
+
+# {{variable}} или {{include:other-slug}}
+_TOKEN_RE = re.compile(r"\{\{\s*(include:\s*)?([A-Za-z0-9_.\-]+)\s*\}\}")
+
+
+class TemplateError(Exception):
+    """Ошибка подготовки или рендеринга шаблона."""
+
+
+class TemplateNotFound(TemplateError):
+    pass
+
+
+class CompiledTemplate(NamedTuple):
+    """
+    План рендеринга: literals[0] + var(names[0]) + literals[1] + ... + literals[-1].
+    Включения (include) уже развёрнуты, len(literals) == len(names) + 1.
+    """
+    slug: str
+    updated_at: datetime
+    literals: Tuple[str, ...]
+    names: Tuple[str, ...]
+    variables: FrozenSet[str]
+    includes: FrozenSet[str]  # все включённые slug (транзитивно)
+
+    def render(self, values: Mapping[str, str], strict: bool = True) -> str:
+        if strict:
+            missing = self.variables.difference(values)
+            if missing:
+                raise TemplateError(f"Missing variables: {', '.join(sorted(missing))}")
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            value = values.get(name)
+            parts.append("{{" + name + "}}" if value is None else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+
+class TemplateCache:
+    """
+    Кэш скомпилированных шаблонов по slug (с привязкой к updated_at промпта).
+
+    Граф зависимостей хранит, какие шаблоны включают данный slug, поэтому
+    invalidate(slug) сбрасывает и все шаблоны, которые его включают.
+    Сброс вызывается из crud при записи и из каталога при изменениях
+    от других воркеров.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        # slug -> шаблоны, которые включают его (напрямую или транзитивно)
+        self._dependents: Dict[str, Set[str]] = {}
+
+    def invalidate(self, slug: str) -> None:
+        with self._lock:
+            stale = {slug} | self._dependents.pop(slug, set())
+            for stale_slug in stale:
+                compiled = self._compiled.pop(stale_slug, None)
+                if compiled is None:
+                    continue
+                for include in compiled.includes:
+                    dependents = self._dependents.get(include)
+                    if dependents is not None:
+                        dependents.discard(stale_slug)
+
+    def on_catalog_change(self, upserted: List[CatalogEntry], removed: List[CatalogEntry]) -> None:
+        for entry in upserted + removed:
+            self.invalidate(entry.slug)
+
+    def get(self, db: Session, slug: str) -> CompiledTemplate:
+        # sync каталога вызовет on_catalog_change для изменённых промптов
+        prompt_catalog.sync(db)
+        with self._lock:
+            return self._get(slug, ())
+
+    def _get(self, slug: str, stack: Tuple[str, ...]) -> CompiledTemplate:
+        compiled = self._compiled.get(slug)
+        if compiled is not None:
+            return compiled
+
+        if slug in stack:
+            raise TemplateError(f"Include cycle: {' -> '.join(stack + (slug,))}")
+
+        # Без sync: каталог уже синхронизирован в get(), а повторный захват
+        # его блокировки под нашей может привести к взаимной блокировке
+        entry = prompt_catalog.lookup(slug)
+        if entry is None:
+            raise TemplateNotFound(f"Prompt not found: {slug}")
+
+        compiled = self._compile(entry, stack + (slug,))
+        self._compiled[slug] = compiled
+        for include in compiled.includes:
+            self._dependents.setdefault(include, set()).add(slug)
+        return compiled
+
+    def _compile(self, entry: CatalogEntry, stack: Tuple[str, ...]) -> CompiledTemplate:
+        literals: List[str] = []
+        names: List[str] = []
+        includes: Set[str] = set()
+        current = []
+        position = 0
+
+        for match in _TOKEN_RE.finditer(entry.text):
+            current.append(entry.text[position:match.start()])
+            position = match.end()
+            is_include, name = match.group(1), match.group(2)
+            if not is_include:
+                literals.append("".join(current))
+                names.append(name)
+                current = []
+                continue
+
+            child = self._get(name, stack)
+            includes.add(name)
+            includes.update(child.includes)
+            current.append(child.literals[0])
+            for child_name, child_literal in zip(child.names, child.literals[1:]):
+                literals.append("".join(current))
+                names.append(child_name)
+                current = [child_literal]
+
+        current.append(entry.text[position:])
+        literals.append("".join(current))
+
+        return CompiledTemplate(
+            slug=entry.slug,
+            updated_at=entry.updated_at,
+            literals=tuple(literals),
+            names=tuple(names),
+            variables=frozenset(names),
+            includes=frozenset(includes),
+        )
+
+    def render(
+        self, db: Session, slug: str, values: Mapping[str, str], strict: bool = True
+    ) -> str:
+        return self.get(db, slug).render(values, strict=strict)
+
+
+# Глобальный кэш шаблонов (один на процесс)
+template_cache = TemplateCache()
+prompt_catalog.add_listener(template_cache.on_catalog_change)
@@ -0,0 +1,64 @@
+"""
+Общая среда тестов: временная БД (или TEST_DATABASE_URL, например PostgreSQL),
+alembic upgrade head и клиент, вошедший статическим администратором.
+
+    python -m pytest backend/tests
+    TEST_DATABASE_URL=postgresql://... python -m pytest backend/tests
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import bcrypt
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+# Окно объединения сохранений в версию, короткое для тестов as_of
+COALESCE_SECONDS = 2
+
+# Настройки читаются при импорте backend — окружение задаётся до него
+_tmp_dir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.update({
+    "DATABASE_URL": os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{_tmp_dir}/test.db",
+    "STATIC_LOGIN": "tester",
+    "STATIC_PASSWORD_HASH": bcrypt.hashpw(b"tester", bcrypt.gensalt(4)).decode(),
+    "RATE_LIMIT_ENABLED": "false",
+    "ADMISSION_CONTROL_ENABLED": "false",
+    "VERSION_COALESCE_SECONDS": str(COALESCE_SECONDS),
+    "VERSION_AS_OF_SETTLE_SECONDS": "0",
+    "BUNDLE_DIR": f"{_tmp_dir}/bundles",
+})
+
+
+@pytest.fixture(scope="session")
+def client():
+    from alembic import command
+    from alembic.config import Config
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+
+    # Без lifespan: писатель БД и очередь задач не запущены, версии пишутся сразу
+    test_client = TestClient(app)
+    response = test_client.post("/api/auth/password", json={"login": "tester", "password": "tester"})
+    response.raise_for_status()
+    test_client.cookies.set("session_token", response.json()["token"])
+    return test_client
+
+
+@pytest.fixture
+def create_prompt(client):
+    """Создать промпт с уникальным именем (БД из TEST_DATABASE_URL может быть не пустой)."""
+    import uuid
+
+    def create(text: str, **fields) -> dict:
+        payload = {"name": f"Test {uuid.uuid4().hex[:12]}", "text": text, **fields}
+        response = client.post("/api/prompts", json=payload)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    return create
@@ -0,0 +1,33 @@
+"""Удаление промпта с историей версий и статистикой использования (на PostgreSQL FK проверяются)."""
+
+
+def test_delete_prompt_with_versions_and_usage(client, create_prompt):
+    from backend.write_buffer import write_buffer
+
+    prompt = create_prompt("# Title\nbody")
+    slug = prompt["slug"]
+    assert client.put(f"/api/prompts/{slug}", json={"text": "# Title\nbody v2"}).status_code == 200
+    assert client.post(f"/api/prompts/{slug}/usage", json={"kind": "copy"}).status_code == 202
+    assert client.get(f"/api/prompts/{slug}").status_code == 200
+    write_buffer.flush()
+    assert client.get(f"/api/prompts/{slug}/usage").json()["copy_count"] == 1
+
+    assert client.delete(f"/api/prompts/{slug}").status_code == 204
+    assert client.get(f"/api/prompts/{slug}").status_code == 404
+    assert client.get(f"/api/prompts/{prompt['id']}/versions").json() == []
+
+
+def test_usage_of_deleted_prompt_does_not_block_counter_flush(client, create_prompt):
+    from backend.write_buffer import write_buffer
+
+    deleted = create_prompt("deleted")
+    kept = create_prompt("kept")
+    assert client.post(f"/api/prompts/{deleted['slug']}/usage", json={"kind": "copy"}).status_code == 202
+    assert client.delete(f"/api/prompts/{deleted['slug']}").status_code == 204
+    assert client.post(f"/api/prompts/{kept['slug']}/usage", json={"kind": "copy"}).status_code == 202
+
+    # Счётчик удалённого промпта отбрасывается, остальные записываются
+    write_buffer.flush()
+    assert client.get(f"/api/prompts/{kept['slug']}/usage").json()["copy_count"] == 1
+    write_buffer.flush()
+    assert write_buffer._usage == {}
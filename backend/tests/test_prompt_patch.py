@@ -0,0 +1,28 @@
+"""PATCH промпта unified diff: diff без ханков отклоняется (422), а не принимается как пустой."""
+import difflib
+
+import pytest
+
+
+def _patch(client, prompt: dict, diff: str):
+    return client.patch(
+        f"/api/prompts/{prompt['slug']}",
+        json={"base_revision": prompt["revision"], "diff": diff},
+    )
+
+
+def test_unified_diff_is_applied(client, create_prompt):
+    prompt = create_prompt("one\ntwo\n")
+    diff = "".join(difflib.unified_diff(["one\n", "two\n"], ["one\n", "three\n"], "a", "b"))
+    response = _patch(client, prompt, diff)
+    assert response.status_code == 200, response.text
+    assert response.json()["text"] == "one\nthree\n"
+
+
+@pytest.mark.parametrize("diff", ["garbage not a diff", ""])
+def test_diff_without_hunks_is_rejected(client, create_prompt, diff):
+    prompt = create_prompt("one\ntwo\n")
+    response = _patch(client, prompt, diff)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "No hunks in diff"
+    assert client.get(f"/api/prompts/{prompt['slug']}").json()["revision"] == prompt["revision"]
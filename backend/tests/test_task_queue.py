@@ -0,0 +1,49 @@
+"""Очередь фоновых задач: обратное давление при переполнении и учёт упавших задач."""
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def queue():
+    from backend.task_queue import TaskQueue
+
+    task_queue = TaskQueue(workers=1, max_pending=1, max_retries=1, retry_delay=0.0)
+    task_queue.start()
+    yield task_queue
+    task_queue.drain(timeout=5)
+
+
+def test_wait_for_room_times_out_while_queue_is_full(queue):
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    queue.submit("block", block, key=1)
+    assert started.wait(5)
+    # Задача с key ставится и сверх лимита; ждущий места поток запроса получает отказ
+    queue.submit("pending", lambda: None, key=1)
+    queue.submit("over limit", lambda: None, key=1)
+    assert queue.stats()["pending"] == 2
+    assert not queue.wait_for_room(0.05)
+    assert queue.stats()["rejected"] == 1
+
+    release.set()
+    assert queue.wait_for_room(5)
+
+
+def test_failed_task_is_listed_with_its_key(queue):
+    def fail():
+        raise RuntimeError("boom")
+
+    queue.submit("version_diffstat", fail, key=42)
+    queue.drain(timeout=5)
+    stats = queue.stats()
+    assert stats["failed"] == 1
+    assert stats["retried"] == 1
+    [failure] = stats["recent_failures"]
+    assert (failure["name"], failure["key"]) == ("version_diffstat", 42)
+    assert "boom" in failure["error"]
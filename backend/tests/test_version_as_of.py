@@ -0,0 +1,45 @@
+"""
+Чтения as_of возвращают ровно тот текст, что действовал на момент as_of, и не меняются
+после более поздних сохранений — в том числе объединённых в ту же версию истории
+(VERSION_COALESCE_SECONDS).
+"""
+import time
+from datetime import datetime, timedelta
+
+
+def _read_as_of(client, slug: str, as_of: datetime):
+    return client.get(f"/api/prompts/{slug}", params={"as_of": as_of.isoformat()})
+
+
+def test_as_of_is_stable_across_later_coalesced_save(client, create_prompt):
+    from backend.settings import settings
+
+    window = settings.VERSION_COALESCE_SECONDS + 0.2
+    prompt = create_prompt("v1")
+    slug = prompt["slug"]
+    time.sleep(window)
+    assert client.put(f"/api/prompts/{slug}", json={"text": "v2"}).status_code == 200
+    as_of = datetime.utcnow()
+
+    # Ещё не наступивший момент не отдаётся: история до него может пополниться
+    assert _read_as_of(client, slug, as_of + timedelta(hours=1)).status_code == 422
+
+    # Сохранение в окне объединения — та же версия в истории, но v2 не перезаписывается
+    assert client.put(f"/api/prompts/{slug}", json={"text": "v3"}).status_code == 200
+    history = client.get(f"/api/prompts/{prompt['id']}/versions").json()
+    assert [version["version"] for version in history] == [2, 1]
+    first = _read_as_of(client, slug, as_of)
+    assert first.status_code == 200
+    assert first.json()["text"] == "v2"
+
+    # Сохранения после окна — новые версии; ответ на тот же as_of не меняется
+    time.sleep(window)
+    assert client.put(f"/api/prompts/{slug}", json={"text": "v4"}).status_code == 200
+    assert client.put(f"/api/prompts/{slug}", json={"text": "v5"}).status_code == 200
+    second = _read_as_of(client, slug, as_of)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+
+    snapshot = client.get("/api/prompts/snapshot", params={"as_of": as_of.isoformat(), "slug": slug})
+    assert [item["text"] for item in snapshot.json()] == ["v2"]
+    assert client.get(f"/api/prompts/{slug}").json()["text"] == "v5"
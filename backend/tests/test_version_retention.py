@@ -0,0 +1,51 @@
+"""Прореживание истории версий: diffstat оставшихся версий считается от предыдущей оставшейся."""
+from datetime import datetime, timedelta
+
+
+def test_compaction_recomputes_diffstat_after_pruned_versions(client, create_prompt):
+    from backend.db import SessionLocal
+    from backend.models import PromptVersion
+    from backend.version_retention import compact_prompt_versions
+
+    prompt = create_prompt("a\nb\nc\nd")
+    now = datetime.utcnow()
+    old = now - timedelta(days=400)
+    db = SessionLocal()
+    try:
+        # Старая история в пределах одной недели: v1, v2, сохранение, объединённое в v3, и v3
+        db.add_all([
+            PromptVersion(prompt_id=prompt["id"], version=1, title="t", content="a", created_at=old),
+            PromptVersion(
+                prompt_id=prompt["id"], version=2, title="t", content="a\nb",
+                created_at=old + timedelta(hours=1), lines_added=1, lines_removed=0,
+            ),
+            PromptVersion(
+                prompt_id=prompt["id"], version=3, title="t", content="x",
+                created_at=old + timedelta(hours=2), superseded_at=old + timedelta(hours=2, seconds=10),
+            ),
+            PromptVersion(
+                prompt_id=prompt["id"], version=3, title="t", content="a\nb\nc",
+                created_at=old + timedelta(hours=2, seconds=10), lines_added=1, lines_removed=0,
+            ),
+        ])
+        db.query(PromptVersion).filter(
+            PromptVersion.prompt_id == prompt["id"], PromptVersion.created_at >= now - timedelta(minutes=1)
+        ).update({PromptVersion.version: 4}, synchronize_session=False)
+        db.commit()
+
+        compact_prompt_versions(db, now=now)
+
+        rows = (
+            db.query(PromptVersion.version, PromptVersion.content, PromptVersion.lines_added)
+            .filter(PromptVersion.prompt_id == prompt["id"])
+            .order_by(PromptVersion.version)
+            .all()
+        )
+    finally:
+        db.close()
+
+    # v2 и объединённое сохранение удалены; v3 теперь сравнивается с v1
+    assert [(version, content) for version, content, _ in rows] == [
+        (1, "a"), (3, "a\nb\nc"), (4, "a\nb\nc\nd"),
+    ]
+    assert rows[1][2] == 2
@@ -0,0 +1,106 @@
+import re
+from typing import Iterable, List, Tuple
+
+# Заголовок ханка unified diff: @@ -start[,count] +start[,count] @@
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """Патч не может быть применён к тексту."""
+
+
+def apply_text_ops(text: str, ops: Iterable[Tuple[int, int, str]]) -> str:
+    """
+    Применить операции замены (start, end, replacement) к тексту.
+
+    Смещения — в единицах UTF-16 (как индексы строк в JavaScript), относительно
+    исходного текста; диапазоны не должны пересекаться.
+    """
+    ops = sorted(ops, key=lambda op: (op[0], op[1]))
+    data = text.encode("utf-16-le")
+    length = len(data) // 2
+
+    previous_end = 0
+    for start, end, _ in ops:
+        if start > end or end > length:
+            raise PatchError(f"Operation range {start}..{end} is out of bounds (length {length})")
+        if start < previous_end:
+            raise PatchError("Operations overlap")
+        previous_end = end
+
+    parts: List[bytes] = []
+    position = 0
+    for start, end, replacement in ops:
+        parts.append(data[position * 2:start * 2])
+        parts.append(replacement.encode("utf-16-le"))
+        position = end
+    parts.append(data[position * 2:])
+
+    try:
+        return b"".join(parts).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise PatchError("Operation splits a surrogate pair")
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """
+    Применить unified diff (как из difflib.unified_diff / diff -u) к тексту.
+    Контекстные и удаляемые строки сверяются с текстом; при расхождении — PatchError.
+    Diff без единого ханка (@@ ... @@), в том числе пустой, — тоже PatchError.
+    """
+    source = text.splitlines(keepends=True)
+    result: List[str] = []
+    position = 0  # индекс следующей неиспользованной строки source
+
+    lines = diff.splitlines(keepends=True)
+    index = 0
+    hunks = 0
+    while index < len(lines):
+        match = _HUNK_RE.match(lines[index])
+        index += 1
+        if not match:
+            continue  # заголовки ---/+++ и прочий мусор до первого ханка
+        hunks += 1
+
+        old_start = int(match.group(1))
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        # Для пустого диапазона diff указывает строку перед вставкой
+        hunk_start = old_start - 1 if old_count else old_start
+        if hunk_start < position:
+            raise PatchError("Hunks overlap or are out of order")
+        result.extend(source[position:hunk_start])
+        position = hunk_start
+
+        last_tag = None
+        while index < len(lines) and not lines[index].startswith("@@"):
+            line = lines[index]
+            index += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file": у добавленной строки нет перевода строки
+                if last_tag == "+" and result[-1].endswith("\n"):
+                    result[-1] = result[-1][:-1]
+                continue
+            tag, body = line[:1], line[1:]
+            last_tag = tag
+            if tag in (" ", "-"):
+                if position >= len(source) or source[position].rstrip("\r\n") != body.rstrip("\r\n"):
+                    raise PatchError(f"Context mismatch at line {position + 1}")
+                if tag == " ":
+                    result.append(source[position])
+                position += 1
+            elif tag == "+":
+                result.append(body)
+            elif line.strip() == "":
+                # Пустая контекстная строка без пробела (редакторы часто обрезают)
+                if position >= len(source) or source[position].strip() != "":
+                    raise PatchError(f"Context mismatch at line {position + 1}")
+                result.append(source[position])
+                position += 1
+            else:
+                raise PatchError(f"Malformed diff line: {line[:40]!r}")
+
+    if not hunks:
+        raise PatchError("No hunks in diff")
+
+    result.extend(source[position:])
+    return "".join(result)
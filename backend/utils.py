@@ -1,9 +1,11 @@
+import difflib
 import hmac
 import hashlib
 import re
 import time
 import unicodedata
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 
 
 def slugify(name: str) -> str:
@@ -28,6 +30,56 @@ def slugify(name: str) -> str:
     return slug
 
 
+def content_hash(text: str) -> str:
+    """SHA-256 текста промпта (hex)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def text_stats(text: str) -> Dict[str, int]:
+    """
+    Число символов, слов и приблизительное число токенов LLM.
+    Оценка по словам: латиница ~4 символа на токен, прочие алфавиты (кириллица) ~2.5,
+    каждый знак пунктуации — отдельный токен.
+    """
+    words = 0
+    tokens = 0.0
+    for match in _TOKEN_RE.finditer(text):
+        piece = match.group()
+        if piece[0].isalnum() or piece[0] == "_":
+            words += 1
+            tokens += max(1.0, len(piece) / (4 if piece.isascii() else 2.5))
+        else:
+            tokens += 1
+    return {"char_count": len(text), "word_count": words, "token_count": round(tokens)}
+
+
+def diffstat(old: Optional[str], new: str) -> Tuple[int, int]:
+    """
+    Количество добавленных и удалённых строк между двумя текстами (как в git diff --stat).
+    Для первой версии (old is None) все строки считаются добавленными.
+    """
+    new_lines = new.splitlines()
+    if old is None:
+        return len(new_lines), 0
+    old_lines = old.splitlines()
+    added = removed = 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag in ("replace", "delete"):
+            removed += i2 - i1
+        if tag in ("replace", "insert"):
+            added += j2 - j1
+    return added, removed
+
+
+@lru_cache(maxsize=4)
+def _telegram_secret_key(bot_token: str) -> bytes:
+    """Секретный ключ для проверки подписи: SHA256 от bot_token (кэшируется)."""
+    return hashlib.sha256(bot_token.encode()).digest()
+
+
 def verify_telegram_auth(data: Dict[str, Any], bot_token: str) -> bool:
     """
     Проверка подписи Telegram Login Widget.
@@ -72,8 +124,8 @@ def verify_telegram_auth(data: Dict[str, Any], bot_token: str) -> bool:
     # Формируем строку "key=value\nkey2=value2\n..."
     data_check_string = "\n".join(f"{key}={value}" for key, value in sorted_data)
     
-    # Вычисляем секретный ключ: SHA256 от bot_token
-    secret_key = hashlib.sha256(bot_token.encode()).digest()
+    # Секретный ключ: SHA256 от bot_token (вычисляется один раз на токен)
+    secret_key = _telegram_secret_key(bot_token)
     
     # Вычисляем HMAC-SHA256
     calculated_hash = hmac.new(
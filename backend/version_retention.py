@@ -0,0 +1,164 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .models import PromptVersion
+from .settings import settings
+from .utils import diffstat
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки id в DELETE ... WHERE id IN (...)
+_DELETE_CHUNK = 500
+
+
+def select_versions_to_prune(
+    versions: Sequence[Tuple[int, int, datetime, Optional[datetime]]], now: datetime
+) -> List[int]:
+    """
+    Выбрать id версий, которые можно удалить по политике ретеншна.
+
+    versions — (id, version, created_at, superseded_at) одного промпта.
+    Сохраняются: первая и последняя версии истории, все сохранения моложе KEEP_ALL_DAYS,
+    последняя версия каждого дня до DAILY_DAYS и последняя версия каждой недели дальше.
+    Объединённые в версию сохранения (superseded_at) старше KEEP_ALL_DAYS удаляются.
+    """
+    keep_all_cutoff = now - timedelta(days=settings.VERSION_RETENTION_KEEP_ALL_DAYS)
+    daily_cutoff = now - timedelta(days=settings.VERSION_RETENTION_DAILY_DAYS)
+
+    ordered = sorted(versions, key=lambda item: (item[1], item[0]))
+    visible = [item for item in ordered if item[3] is None]
+    keep: Set[int] = {item[0] for item in ordered if item[2] >= keep_all_cutoff}
+    if len(visible) <= 2:
+        keep.update(item[0] for item in visible)
+        return [version_id for version_id, _, _, _ in ordered if version_id not in keep]
+
+    keep.update((visible[0][0], visible[-1][0]))
+    buckets = {}
+    for version_id, _, created_at, _ in visible:
+        if created_at >= keep_all_cutoff:
+            continue
+        if created_at >= daily_cutoff:
+            buckets[("day", created_at.date())] = version_id
+        else:
+            buckets[("week",) + tuple(created_at.isocalendar()[:2])] = version_id
+    # В каждом интервале осталась последняя (по номеру) версия
+    keep.update(buckets.values())
+
+    return [version_id for version_id, _, _, _ in ordered if version_id not in keep]
+
+
+def _refresh_diffstats(
+    db: Session, visible: Sequence[Tuple[int, int, datetime, Optional[datetime]]], pruned: Set[int]
+) -> None:
+    """
+    Пересчитать diffstat оставшихся версий, перед которыми удалены версии:
+    теперь они сравниваются с предыдущей оставшейся. visible — версии истории по порядку.
+    """
+    pairs = []
+    base_id = None
+    previous_pruned = False
+    for version_id, _, _, _ in visible:
+        if version_id in pruned:
+            previous_pruned = True
+            continue
+        if previous_pruned:
+            pairs.append((base_id, version_id))
+        base_id = version_id
+        previous_pruned = False
+    if not pairs:
+        return
+
+    ids = {version_id for pair in pairs for version_id in pair if version_id is not None}
+    contents = dict(db.query(PromptVersion.id, PromptVersion.content).filter(PromptVersion.id.in_(ids)))
+    for base_id, version_id in pairs:
+        lines_added, lines_removed = diffstat(contents.get(base_id), contents[version_id])
+        db.query(PromptVersion).filter(PromptVersion.id == version_id).update(
+            {PromptVersion.lines_added: lines_added, PromptVersion.lines_removed: lines_removed},
+            synchronize_session=False,
+        )
+
+
+def compact_prompt_versions(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Проредить историю всех промптов. Возвращает число удалённых версий.
+    diffstat версий, следующих за удалёнными, пересчитывается в той же транзакции.
+    """
+    now = now or datetime.utcnow()
+    keep_all_cutoff = now - timedelta(days=settings.VERSION_RETENTION_KEEP_ALL_DAYS)
+
+    prompt_ids = [
+        prompt_id
+        for (prompt_id,) in db.query(PromptVersion.prompt_id)
+        .filter(PromptVersion.created_at < keep_all_cutoff)
+        .distinct()
+    ]
+
+    removed = 0
+    for prompt_id in prompt_ids:
+        versions = (
+            db.query(
+                PromptVersion.id, PromptVersion.version, PromptVersion.created_at, PromptVersion.superseded_at
+            )
+            .filter(PromptVersion.prompt_id == prompt_id)
+            .order_by(PromptVersion.version, PromptVersion.id)
+            .all()
+        )
+        prune_ids = select_versions_to_prune(versions, now)
+        for start in range(0, len(prune_ids), _DELETE_CHUNK):
+            chunk = prune_ids[start:start + _DELETE_CHUNK]
+            db.query(PromptVersion).filter(PromptVersion.id.in_(chunk)).delete(synchronize_session=False)
+        if prune_ids:
+            _refresh_diffstats(db, [item for item in versions if item[3] is None], set(prune_ids))
+            # Коммитим по промпту, чтобы не держать блокировку записи долго
+            db.commit()
+            removed += len(prune_ids)
+    return removed
+
+
+class VersionCompactor:
+    """Фоновый поток, периодически прореживающий историю версий."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        db = SessionLocal()
+        try:
+            removed = compact_prompt_versions(db)
+            if removed:
+                logger.info("Удалено версий промптов по политике ретеншна: %s", removed)
+            return removed
+        except Exception:
+            logger.exception("Ошибка прореживания версий промптов")
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="version-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+# Глобальный компактор (один на процесс)
+version_compactor = VersionCompactor(interval=settings.VERSION_COMPACT_INTERVAL_SECONDS)
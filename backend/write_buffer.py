@@ -0,0 +1,160 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .db_writer import db_writer
+from .models import Prompt, PromptUsage, User
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+USAGE_KINDS = ("view", "copy")
+
+
+def _existing_ids(db: Session, column, ids: Set[int]) -> Set[int]:
+    if not ids:
+        return set()
+    return {row[0] for row in db.query(column).filter(column.in_(ids))}
+
+
+def _write_counters(db: Session, logins: Dict[int, datetime], usage: Dict[Tuple[int, int], list]) -> None:
+    """
+    Записать счётчики. Строки удалённых за это время пользователей и промптов отбрасываются:
+    в PostgreSQL внешний ключ на них провалил бы всю пачку, и она возвращалась бы в буфер
+    при каждом flush, блокируя остальные счётчики.
+    """
+    user_ids = _existing_ids(db, User.id, set(logins) | {user_id for user_id, _ in usage})
+    prompt_ids = _existing_ids(db, Prompt.id, {prompt_id for _, prompt_id in usage})
+    dropped = len(logins) + len(usage)
+    logins = {user_id: at for user_id, at in logins.items() if user_id in user_ids}
+    usage = {
+        key: counters for key, counters in usage.items()
+        if key[0] in user_ids and key[1] in prompt_ids
+    }
+    dropped -= len(logins) + len(usage)
+    if dropped:
+        logger.info("Буфер счётчиков: отброшено %s записей удалённых пользователей или промптов", dropped)
+
+    if logins:
+        db.execute(
+            update(User),
+            [{"id": user_id, "last_login_at": at} for user_id, at in logins.items()],
+        )
+    if usage:
+        insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+        stmt = insert(PromptUsage).values([
+            {
+                "user_id": user_id,
+                "prompt_id": prompt_id,
+                "view_count": views,
+                "copy_count": copies,
+                "last_used_at": last_used_at,
+            }
+            for (user_id, prompt_id), (views, copies, last_used_at) in usage.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PromptUsage.user_id, PromptUsage.prompt_id],
+            set_={
+                "view_count": PromptUsage.view_count + stmt.excluded.view_count,
+                "copy_count": PromptUsage.copy_count + stmt.excluded.copy_count,
+                "last_used_at": stmt.excluded.last_used_at,
+            },
+        )
+        db.execute(stmt)
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи для «шумных» счётчиков:
+    время последнего входа пользователей и просмотры/копирования промптов.
+
+    record_* только обновляют словари в памяти (никогда не ждут БД).
+    Фоновый поток раз в WRITE_BUFFER_FLUSH_SECONDS забирает накопленное
+    и записывает одной транзакцией; при остановке делается финальный flush.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # user_id -> время последнего входа
+        self._logins: Dict[int, datetime] = {}
+        # (user_id, prompt_id) -> [views, copies, last_used_at]
+        self._usage: Dict[Tuple[int, int], list] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record_login(self, user_id: int, at: Optional[datetime] = None) -> None:
+        at = at or datetime.utcnow()
+        with self._lock:
+            previous = self._logins.get(user_id)
+            if previous is None or at > previous:
+                self._logins[user_id] = at
+
+    def record_usage(self, user_id: int, prompt_id: int, kind: str) -> None:
+        if kind not in USAGE_KINDS:
+            raise ValueError(f"Unknown usage kind: {kind}")
+        now = datetime.utcnow()
+        with self._lock:
+            counters = self._usage.get((user_id, prompt_id))
+            if counters is None:
+                counters = self._usage[(user_id, prompt_id)] = [0, 0, now]
+            counters[USAGE_KINDS.index(kind)] += 1
+            counters[2] = now
+
+    def _merge_back(self, logins: Dict[int, datetime], usage: Dict[Tuple[int, int], list]) -> None:
+        """Вернуть несохранённые данные в буфер, чтобы не потерять их при ошибке."""
+        with self._lock:
+            for user_id, at in logins.items():
+                previous = self._logins.get(user_id)
+                if previous is None or at > previous:
+                    self._logins[user_id] = at
+            for key, (views, copies, last_used_at) in usage.items():
+                counters = self._usage.setdefault(key, [0, 0, last_used_at])
+                counters[0] += views
+                counters[1] += copies
+                counters[2] = max(counters[2], last_used_at)
+
+    def flush(self) -> None:
+        """Записать накопленное в БД одной транзакцией (через писателя БД)."""
+        with self._lock:
+            logins, self._logins = self._logins, {}
+            usage, self._usage = self._usage, {}
+        if not logins and not usage:
+            return
+
+        try:
+            db_writer.call(_write_counters, logins, usage)
+        except Exception:
+            # Ошибка БД (недоступна, блокировка) — повторим со следующим flush; строки
+            # удалённых пользователей и промптов отбросит следующая попытка записи
+            logger.exception("Не удалось записать буфер счётчиков, повторим позже")
+            self._merge_back(logins, usage)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановить фоновый поток и записать остаток."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+# Глобальный буфер (один на процесс)
+write_buffer = WriteBehindBuffer(flush_interval=settings.WRITE_BUFFER_FLUSH_SECONDS)
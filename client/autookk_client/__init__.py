@@ -0,0 +1,6 @@
+"""Python-клиент API промптов autookk."""
+
+from .bundle import PromptBundle
+from .client import PromptClient, PromptClientError
+
+__all__ = ["PromptBundle", "PromptClient", "PromptClientError"]
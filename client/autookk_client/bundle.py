@@ -0,0 +1,69 @@
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional
+
+# Файл бандла отображается в память целиком: чтение страниц без копирования в буферы SQLite
+_MMAP_SIZE = 1 << 30
+
+_COLUMNS = (
+    "id", "slug", "name", "folder", "tags", "importance",
+    "revision", "updated_at", "content_hash", "token_count", "text",
+)
+
+
+class PromptBundle:
+    """
+    Read-only бандл библиотеки промптов (файл SQLite из /api/bundle или python -m backend.bundle).
+
+    Открывается в режиме immutable: без блокировок и журналов, поиск по slug — по
+    уникальному индексу, страницы читаются через mmap.
+
+    Пример:
+        with PromptBundle("prompts.sqlite") as bundle:
+            text = bundle.get("tag-apology-v1")["text"]
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._connection.execute(f"PRAGMA mmap_size = {_MMAP_SIZE}")
+        self.manifest: Dict[str, str] = dict(self._connection.execute("SELECT key, value FROM manifest"))
+
+    @property
+    def hash(self) -> str:
+        return self.manifest["hash"]
+
+    def get(self, slug: str) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM prompts WHERE slug = ?", (slug,)
+        ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def text(self, slug: str) -> Optional[str]:
+        row = self._connection.execute("SELECT text FROM prompts WHERE slug = ?", (slug,)).fetchone()
+        return row[0] if row is not None else None
+
+    def slugs(self, folder: Optional[str] = None) -> List[str]:
+        if folder is None:
+            rows = self._connection.execute("SELECT slug FROM prompts ORDER BY slug")
+        else:
+            rows = self._connection.execute("SELECT slug FROM prompts WHERE folder = ? ORDER BY slug", (folder,))
+        return [slug for (slug,) in rows]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in self._connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM prompts ORDER BY slug"):
+            yield dict(zip(_COLUMNS, row))
+
+    def __contains__(self, slug: str) -> bool:
+        return self._connection.execute("SELECT 1 FROM prompts WHERE slug = ?", (slug,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return int(self.manifest["prompt_count"])
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "PromptBundle":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,322 @@
+import hashlib
+import http.client
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from .bundle import PromptBundle
+
+
+class PromptClientError(Exception):
+    """Ошибка обращения к API промптов."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+class _CachedPrompt:
+    __slots__ = ("prompt", "etag", "validated_at")
+
+    def __init__(self, prompt: Dict[str, Any], etag: Optional[str], validated_at: float):
+        self.prompt = prompt
+        self.etag = etag
+        self.validated_at = validated_at
+
+
+class PromptClient:
+    """
+    Клиент API промптов для сервисов и воркеров.
+
+    - авторизуется через /api/auth/password и переавторизуется при 401;
+    - держит пул keep-alive соединений HTTP/1.1 (http.client, без зависимостей);
+    - кэширует промпты по slug + updated_at: в течение max_age секунд промпт
+      отдаётся из памяти без запросов, затем перепроверяется через If-None-Match;
+    - prefetch() загружает всю библиотеку (или её часть) одним запросом;
+    - закреплённые версии (pins или get(slug, version=N)) неизменяемы
+      и кэшируются навсегда;
+    - sync_bundle() скачивает SQLite-бандл всей библиотеки для работы без сети.
+
+    Пример:
+        client = PromptClient("https://autookk.ru", login="svc", password="...")
+        client.prefetch()
+        text = client.get("tag-apology-v1")["text"]
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        login: str,
+        password: str,
+        pool_size: int = 4,
+        timeout: float = 10.0,
+        max_age: float = 60.0,
+        pins: Optional[Dict[str, int]] = None,
+        cookie_name: str = "session_token",
+    ):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {parts.scheme!r}")
+        self._connection_class = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        self._host = parts.netloc
+        self._base_path = parts.path.rstrip("/")
+        self._timeout = timeout
+        self._login = login
+        self._password = password
+        self._cookie_name = cookie_name
+        self.max_age = max_age
+        self.pins: Dict[str, int] = dict(pins or {})
+
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._token: Optional[str] = None
+        self._auth_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache: Dict[str, _CachedPrompt] = {}
+        # (slug, version) -> промпт; версии неизменяемы
+        self._versions: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    # --- HTTP ---
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connection_class(self._host, timeout=self._timeout)
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _send(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        connection = self._acquire()
+        for attempt in (1, 2):
+            try:
+                connection.request(method, self._base_path + path, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+                response_headers = {key.lower(): value for key, value in response.getheaders()}
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest):
+                # Сервер закрыл keep-alive соединение — пробуем один раз на новом
+                connection.close()
+                if attempt == 2:
+                    raise
+                connection = self._connection_class(self._host, timeout=self._timeout)
+                continue
+            except Exception:
+                connection.close()
+                raise
+            if response_headers.get("connection", "").lower() == "close":
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, response_headers, payload
+        raise AssertionError("unreachable")
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        payload: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        authenticate: bool = True,
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        request_headers = {"Accept": "application/json"}
+        request_headers.update(headers or {})
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            request_headers["Content-Type"] = "application/json"
+
+        if authenticate and self._token is None:
+            self.login()
+
+        for attempt in (1, 2):
+            if authenticate:
+                request_headers["Cookie"] = f"{self._cookie_name}={self._token}"
+            status, response_headers, data = self._send(method, path, body, request_headers)
+            if status == 401 and authenticate and attempt == 1:
+                self.login()
+                continue
+            if status >= 400:
+                raise PromptClientError(status, _error_detail(data))
+            return status, response_headers, data
+        raise AssertionError("unreachable")
+
+    def login(self) -> None:
+        """Получить токен сессии по логину/паролю."""
+        with self._auth_lock:
+            _, _, data = self._request(
+                "POST",
+                "/api/auth/password",
+                {"login": self._login, "password": self._password},
+                authenticate=False,
+            )
+            self._token = json.loads(data)["token"]
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self) -> "PromptClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # --- Промпты ---
+
+    def _store(self, prompt: Dict[str, Any], etag: Optional[str]) -> None:
+        with self._cache_lock:
+            self._cache[prompt["slug"]] = _CachedPrompt(prompt, etag, time.monotonic())
+
+    def prefetch(self, slugs: Optional[Iterable[str]] = None, folder: Optional[str] = None) -> int:
+        """
+        Загрузить промпты одним запросом к /api/prompts и положить в кэш.
+        Возвращает число закэшированных промптов. Закреплённые версии тоже загружаются.
+        """
+        query = f"?folder={quote(folder)}" if folder else ""
+        _, _, data = self._request("GET", f"/api/prompts{query}")
+        wanted = set(slugs) if slugs is not None else None
+        count = 0
+        for prompt in json.loads(data):
+            if wanted is not None and prompt["slug"] not in wanted:
+                continue
+            with self._cache_lock:
+                cached = self._cache.get(prompt["slug"])
+            # Тот же updated_at — сохраняем известный ETag для последующих перепроверок
+            etag = cached.etag if cached and cached.prompt["updated_at"] == prompt["updated_at"] else None
+            self._store(prompt, etag)
+            count += 1
+        for slug, version in self.pins.items():
+            if wanted is None or slug in wanted:
+                self.get_version(slug, version)
+        return count
+
+    def get(self, slug: str, version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Получить промпт. Для закреплённых slug (pins) или явного version
+        возвращается соответствующая версия.
+        """
+        version = version if version is not None else self.pins.get(slug)
+        if version is not None:
+            return self.get_version(slug, version)
+
+        with self._cache_lock:
+            cached = self._cache.get(slug)
+        if cached is not None and time.monotonic() - cached.validated_at < self.max_age:
+            return cached.prompt
+
+        headers = {"If-None-Match": cached.etag} if cached is not None and cached.etag else {}
+        status, response_headers, data = self._request("GET", f"/api/prompts/{quote(slug)}", headers=headers)
+        if status == 304 and cached is not None:
+            cached.validated_at = time.monotonic()
+            return cached.prompt
+        prompt = json.loads(data)
+        self._store(prompt, response_headers.get("etag"))
+        return prompt
+
+    def get_many(self, slugs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Получить несколько промптов; при промахах кэша — один prefetch вместо N запросов."""
+        slugs = list(slugs)
+        now = time.monotonic()
+        with self._cache_lock:
+            missing = [
+                slug for slug in slugs
+                if slug not in self.pins
+                and (slug not in self._cache or now - self._cache[slug].validated_at >= self.max_age)
+            ]
+        if missing:
+            self.prefetch(missing)
+        return {slug: self.get(slug) for slug in slugs}
+
+    def get_version(self, slug: str, version: int) -> Dict[str, Any]:
+        """Получить конкретную версию промпта (кэшируется навсегда)."""
+        key = (slug, version)
+        cached = self._versions.get(key)
+        if cached is not None:
+            return cached
+
+        with self._cache_lock:
+            current = self._cache.get(slug)
+        prompt_id = current.prompt["id"] if current is not None else self.get(slug)["id"]
+
+        # История отдаётся страницами от новых к старым: before=version+1 и limit=1 —
+        # ровно искомая версия (если она есть), без просмотра списка
+        _, _, data = self._request(
+            "GET", f"/api/prompts/{prompt_id}/versions?before={version + 1}&limit=1"
+        )
+        matches = [item for item in json.loads(data) if item["version"] == version]
+        if not matches:
+            raise PromptClientError(404, f"Version {version} of {slug} not found")
+        _, _, data = self._request("GET", f"/api/prompts/{prompt_id}/versions/{matches[0]['id']}")
+        detail = json.loads(data)
+        prompt = {
+            "id": prompt_id,
+            "slug": slug,
+            "name": detail["title"],
+            "text": detail["content"],
+            "version": detail["version"],
+            "created_at": detail["created_at"],
+        }
+        self._versions[key] = prompt
+        return prompt
+
+    def pin(self, slug: str, version: int) -> None:
+        self.pins[slug] = version
+
+    def render(self, slug: str, variables: Optional[Dict[str, str]] = None, strict: bool = True) -> str:
+        """Отрендерить шаблон на сервере (/api/prompts/{slug}/render)."""
+        _, _, data = self._request(
+            "POST",
+            f"/api/prompts/{quote(slug)}/render",
+            {"variables": variables or {}, "strict": strict},
+        )
+        return json.loads(data)["text"]
+
+    def sync_bundle(self, path: str) -> bool:
+        """
+        Обновить локальный бандл библиотеки (см. PromptBundle), если хэш манифеста изменился.
+        Возвращает True, если файл был скачан.
+        """
+        _, _, data = self._request("GET", "/api/bundle/manifest")
+        manifest = json.loads(data)
+        if os.path.exists(path):
+            try:
+                with PromptBundle(path) as bundle:
+                    if bundle.hash == manifest["hash"]:
+                        return False
+            except (sqlite3.Error, KeyError):
+                pass  # повреждённый или чужой файл — перекачиваем
+
+        _, headers, payload = self._request("GET", "/api/bundle")
+        # Если бандл пересобрали между запросами, X-Bundle-Hash отличается от манифеста
+        if headers.get("x-bundle-hash") == manifest["hash"] and hashlib.sha256(payload).hexdigest() != manifest["sha256"]:
+            raise PromptClientError(502, "Bundle checksum mismatch")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(payload)
+        os.replace(tmp_path, path)
+        return True
+
+
+def _error_detail(data: bytes) -> str:
+    try:
+        detail = json.loads(data).get("detail")
+    except (ValueError, AttributeError):
+        return data.decode("utf-8", "replace")[:200]
+    return detail if isinstance(detail, str) else json.dumps(detail)
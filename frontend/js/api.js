@@ -63,6 +63,22 @@ export async function fetchPromptBySlug(slug) {
   }
 }
 
+export async function trackPromptUsage(slug, kind) {
+  // Fire-and-forget: счётчики пишутся на backend отложенно, ответ не нужен
+  try {
+    await fetch(`${API_BASE}/prompts/${slug}/usage`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      credentials: 'include',
+      body: JSON.stringify({ kind }),
+    });
+  } catch (error) {
+    console.error('Ошибка учёта использования промпта:', error);
+  }
+}
+
 export async function createPrompt(data) {
   try {
     const response = await fetch(`${API_BASE}/prompts`, {
@@ -120,6 +136,53 @@ export async function updatePrompt(slug, data) {
   }
 }
 
+/**
+ * Build a single replace operation (UTF-16 offsets) turning oldText into newText
+ */
+export function buildTextOps(oldText, newText) {
+  let start = 0;
+  const maxPrefix = Math.min(oldText.length, newText.length);
+  while (start < maxPrefix && oldText.charCodeAt(start) === newText.charCodeAt(start)) {
+    start++;
+  }
+  let oldEnd = oldText.length;
+  let newEnd = newText.length;
+  while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+    oldEnd--;
+    newEnd--;
+  }
+  if (start === oldEnd && start === newEnd) return [];
+  return [{ start, end: oldEnd, text: newText.slice(start, newEnd) }];
+}
+
+export async function patchPrompt(slug, data) {
+  try {
+    const response = await fetch(`${API_BASE}/prompts/${slug}`, {
+      method: 'PATCH',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      credentials: 'include',
+      body: JSON.stringify(data),
+    });
+    if (!response.ok) {
+      const authError = handleAuthError(response);
+      if (authError) {
+        throw { ...authError, response };
+      }
+      if (response.status === 409) {
+        throw { type: 'conflict', response };
+      }
+      if (response.status === 404) return null;
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Ошибка обновления промпта:', error);
+    throw error;
+  }
+}
+
 export async function deletePrompt(slug) {
   try {
     const response = await fetch(`${API_BASE}/prompts/${slug}`, {
@@ -145,20 +208,32 @@ export async function deletePrompt(slug) {
   }
 }
 
+// Размер страницы истории версий (максимум, который принимает сервер)
+const VERSIONS_PAGE_SIZE = 500;
+
 export async function fetchPromptVersions(promptId) {
   try {
-    const response = await fetch(`${API_BASE}/prompts/${promptId}/versions`, {
-      credentials: 'include',
-    });
-    if (!response.ok) {
-      const authError = handleAuthError(response);
-      if (authError) {
-        throw { ...authError, response };
+    // История отдаётся страницами: курсор следующей — в заголовке X-Next-Cursor
+    const versions = [];
+    let cursor = null;
+    do {
+      const params = new URLSearchParams({ limit: VERSIONS_PAGE_SIZE });
+      if (cursor) params.set('before', cursor);
+      const response = await fetch(`${API_BASE}/prompts/${promptId}/versions?${params}`, {
+        credentials: 'include',
+      });
+      if (!response.ok) {
+        const authError = handleAuthError(response);
+        if (authError) {
+          throw { ...authError, response };
+        }
+        if (response.status === 404) return null;
+        throw new Error(`HTTP error! status: ${response.status}`);
       }
-      if (response.status === 404) return null;
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
-    return await response.json();
+      versions.push(...await response.json());
+      cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return versions;
   } catch (error) {
     console.error('Ошибка загрузки версий:', error);
     throw error;
@@ -112,7 +112,28 @@ export async function handleSavePrompt(slug = null) {
     const isNew = !slug;
     const oldPromptId = isNew ? null : slug; // For new prompts, we'll use null initially
     
-    if (slug) {
+    const basePrompt = state.getCurrentPrompt();
+    if (slug && basePrompt && basePrompt.slug === slug && basePrompt.revision) {
+      // Отправляем только изменённый фрагмент текста относительно загруженной ревизии
+      const { text: _fullText, ...fields } = data;
+      try {
+        savedPrompt = await api.patchPrompt(slug, {
+          ...fields,
+          base_revision: basePrompt.revision,
+          ops: api.buildTextOps(basePrompt.text || '', text),
+        });
+      } catch (error) {
+        if (error && error.type === 'conflict') {
+          alert('Промпт был изменён другим пользователем. Обновите страницу и повторите правку.');
+          return;
+        }
+        throw error;
+      }
+      if (!savedPrompt) {
+        alert('Промпт не найден');
+        return;
+      }
+    } else if (slug) {
       savedPrompt = await api.updatePrompt(slug, data);
       if (!savedPrompt) {
         alert('Промпт не найден');
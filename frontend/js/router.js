@@ -123,6 +123,9 @@ export async function loadPromptVersions(promptId) {
         minute: '2-digit'
       });
       const userId = version.updated_by_user_id ? `ID: ${version.updated_by_user_id}` : 'Неизвестно';
+      const diffStat = version.lines_added != null
+        ? ` · +${version.lines_added} / −${version.lines_removed} · ${version.content_length} симв.`
+        : '';
       
       return `
         <div class="history-item" data-version-id="${version.id}" data-version-number="${version.version}">
@@ -133,7 +136,7 @@ export async function loadPromptVersions(promptId) {
                 <span class="history-version">Версия ${version.version}</span>
                 <span class="history-date">${dateStr}</span>
               </div>
-              <div class="history-item-meta">${userId}</div>
+              <div class="history-item-meta">${userId}${diffStat}</div>
             </div>
           </label>
         </div>
@@ -483,10 +486,16 @@ async function updateUserField(userId, data) {
  * Load version
  */
 export async function loadVersion() {
+  const el = document.getElementById('appVersion');
+  // Сборка (python -m backend.assets) вшивает версию в index.html — без лишнего запроса
+  const meta = document.querySelector('meta[name="app-version"]');
+  if (meta) {
+    if (el) el.textContent = meta.content;
+    return;
+  }
   try {
     const res = await fetch('/version.json');
     const data = await res.json();
-    const el = document.getElementById('appVersion');
     if (el) el.textContent = data.version;
   } catch {}
 }
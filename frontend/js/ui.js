@@ -560,6 +560,7 @@ export function renderViewMode(prompt) {
       try {
         await navigator.clipboard.writeText(prompt.text || '');
         showToast('Скопировано');
+        api.trackPromptUsage(prompt.slug, 'copy');
       } catch (error) {
         console.error('Ошибка копирования:', error);
         const textArea = document.createElement('textarea');